@@ -1,25 +1,36 @@
-from flask import Flask, request, url_for, redirect, render_template, jsonify
+from flask import Flask, request, url_for, redirect, render_template, jsonify, Response, stream_with_context
 import pandas as pd
 import pickle
 from flask_cors import CORS
-from paper_rag import paperRag
+from paper_rag import paperRag, SEARCH_MODES
 import logging
 import os
+import atexit
+import threading
 from werkzeug.utils import secure_filename
-import PyPDF2
-import docx
-import csv
+import json
+import itertools
+import tempfile
+import shutil
+import zipfile
 from io import StringIO
-from paper_aggregator import llm_input_aggregator
+from paper_aggregator import llm_input_aggregator, stream_llm_explanation
 import numpy as np
-import shap
-import yaml
 from pathlib import Path
-from train_model.model import FoetalHealthModel
-from sklearn.mixture import GaussianMixture
+from explanation_engine import ExplanationEngine
+from explanation_jobs import ExplanationJobs
+from jobs import JobManager, FINISHED
+from explanation_cache import build_explanation_cache
+from document_ingest import iter_document_text, ExtractionPool
+from config import (PREDICT_BATCH_SIZE, FOREST_ENGINE,
+                    EXPLANATION_WORKERS, EXPLANATION_QUEUE_SIZE, EXPLANATION_JOB_TTL, EXPLANATION_MAX_WAIT,
+                    EXPLANATION_JOB_STORE_PATH, EXPLANATION_POLL_INTERVAL, EXPLANATION_MAX_WAITERS,
+                    EXPLANATION_CACHE_BACKEND, EXPLANATION_CACHE_PATH, EXPLANATION_CACHE_MAX_ENTRIES,
+                    EXPLANATION_CACHE_TTL, EXPLANATION_CACHE_PROB_BUCKET, RETRIEVAL_CACHE_PREWARM,
+                    BULK_EXTRACT_WORKERS, BULK_EXTRACT_TIMEOUT, BULK_UPLOAD_MAX_FILES, BULK_UPLOAD_MAX_BYTES,
+                    JOB_STORE_PATH, JOB_WORKERS, JOB_QUEUE_SIZE, JOB_TTL, JOB_EVENTS_INTERVAL, SEARCH_MODE)
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
-from PyPDF2.errors import PdfReadError
 from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity
 from datetime import timedelta
 
@@ -27,7 +38,9 @@ from datetime import timedelta
 project_root = Path(__file__).resolve().parent
 model_path = project_root  / "train_model" / "best_random_forest.pkl"
 config_path = project_root / "configs" / "selected_columns.yaml"
-test_data_path = project_root / "data" / "test.csv"
+
+# Bulk upload extraction processes are only started when an upload arrives
+extraction_pool = ExtractionPool(BULK_EXTRACT_WORKERS)
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
@@ -46,10 +59,12 @@ CORS(app, resources={
 })
 
 # === Rate Limiting ===
+# asgi_app.py applies the same limit to the routes it serves natively
+DEFAULT_RATE_LIMIT = "200 per minute"
 limiter = Limiter(
     get_remote_address,
     app=app,
-    default_limits=["200 per minute"]
+    default_limits=[DEFAULT_RATE_LIMIT]
 )
 
 ALLOWED_EXTENSIONS = {'pdf', 'docx', 'doc', 'csv', 'txt'}
@@ -76,90 +91,189 @@ def handle_rate_limit(e):
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def extract_text_from_pdf(file_path):
-    text = ""
+def save_upload(file):
+    """Save an upload under uploads/ with a unique name; returns (file_path, file_ext, filename)"""
+    if not (file and allowed_file(file.filename)):
+        raise ValueError('Invalid file type or empty file')
+
+    filename = secure_filename(file.filename)
+    file_ext = file.filename.rsplit('.', 1)[1].lower()
+    upload_folder = os.path.join(os.path.dirname(__file__), "uploads")
+    os.makedirs(upload_folder, exist_ok=True)
+    # A unique name keeps concurrent uploads of the same file apart
+    fd, file_path = tempfile.mkstemp(suffix=f"-{filename}", dir=upload_folder)
+    os.close(fd)
     try:
-        with open(file_path, 'rb') as file:
-            pdf_reader = PyPDF2.PdfReader(file)
-            for page in pdf_reader.pages:
-                text += page.extract_text() + "\n"
-    except PdfReadError:
-        raise ValueError("Invalid or corrupt PDF file.")
-    return text
-
-def extract_text_from_docx(file_path):
-    doc = docx.Document(file_path)
-    text = ""
-    for paragraph in doc.paragraphs:
-        text += paragraph.text + "\n"
-    return text
-
-def extract_text_from_csv(file_path):
-    text = ""
-    with open(file_path, 'r', encoding='utf-8') as file:
-        csv_reader = csv.reader(file)
-        for row in csv_reader:
-            text += " ".join(row) + "\n"
-    return text
-
-def process_uploaded_file(file):
-    if file and allowed_file(file.filename):
-        filename = secure_filename(file.filename)
-        upload_folder = os.path.join(os.path.dirname(__file__), "uploads")
-        os.makedirs(upload_folder, exist_ok=True)
-        file_path = os.path.join(upload_folder, filename)
         file.save(file_path)
+    except Exception:
+        os.remove(file_path)
+        raise
+    return file_path, file_ext, filename
 
-        try:
-            # Extract text based on file type
-            file_ext = filename.rsplit('.', 1)[1].lower()
-            if file_ext == 'pdf':
-                text = extract_text_from_pdf(file_path)
-            elif file_ext in ['doc', 'docx']:
-                text = extract_text_from_docx(file_path)
-            elif file_ext == 'csv':
-                text = extract_text_from_csv(file_path)
-            elif file_ext == 'txt':
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    text = f.read()
-
-            # Clean up the uploaded file
-            os.remove(file_path)
-            return text
-        except ValueError as ve:
-            logger.warning(f"Invalid file: {filename} - {ve}")
-            if os.path.exists(file_path):
-                os.remove(file_path)
-            raise ve
-        except Exception as e:
-            logger.exception(f"Error processing file: {filename}")
-            if os.path.exists(file_path):
-                os.remove(file_path)
-            raise e
-    return None
+def _remove_file(file_path):
+    if os.path.exists(file_path):
+        os.remove(file_path)
 
-def generate_synthetic_data(df, n_samples=100):
-    # Ensure no NaNs
-    df_clean = df.dropna().copy()
+def ingest_saved_file(file_path, file_ext, filename, title, progress=None):
+    """Stream a saved upload into the store page by page, removing the file afterwards"""
+    def report(stats):
+        logger.info(f"Ingesting {filename}: {stats['chunks']} chunks, "
+                    f"{stats['characters']} characters, {stats['batches']} batches")
+        if progress:
+            progress(stats)
 
-    # Fit GMM on the data
-    gmm = GaussianMixture(n_components=5, covariance_type='full', random_state=42)
-    gmm.fit(df_clean)
+    try:
+        return paper_rag.add_paper_stream(title, lambda: iter_document_text(file_path, file_ext), progress=report)
+    except ValueError as ve:
+        logger.warning(f"Invalid file: {filename} - {ve}")
+        raise
+    except Exception:
+        logger.exception(f"Error processing file: {filename}")
+        raise
+    finally:
+        _remove_file(file_path)
+
+def _bulk_job(work_dir, name):
+    """Reserve a unique path in work_dir for one bulk upload document"""
+    filename = secure_filename(os.path.basename(name)) or "document"
+    fd, file_path = tempfile.mkstemp(suffix=f"-{filename}", dir=work_dir)
+    os.close(fd)
+    return {
+        'file': name,
+        'title': os.path.basename(name),
+        'path': file_path,
+        'ext': name.rsplit('.', 1)[1].lower()
+    }
+
+def collect_bulk_uploads(files, work_dir):
+    """Save uploaded files, and the supported members of uploaded zips, into work_dir
 
-    # Sample synthetic data
-    synthetic_data, _ = gmm.sample(n_samples)
-    synthetic_df = pd.DataFrame(synthetic_data, columns=df_clean.columns)
+    Returns (jobs, rejected); rejected lists names that were not a supported type.
+    """
+    jobs = []
+    rejected = []
+    for file in files:
+        if file.filename.lower().endswith('.zip'):
+            archive_path = os.path.join(work_dir, f"{len(jobs)}-{len(rejected)}.zip")
+            file.save(archive_path)
+            try:
+                with zipfile.ZipFile(archive_path) as archive:
+                    members = [info for info in archive.infolist() if not info.is_dir()]
+                    if sum(info.file_size for info in members) > BULK_UPLOAD_MAX_BYTES:
+                        raise ValueError(f"{file.filename} expands beyond the bulk upload size limit")
+                    for info in members:
+                        if not allowed_file(info.filename):
+                            rejected.append(info.filename)
+                            continue
+                        job = _bulk_job(work_dir, info.filename)
+                        with archive.open(info) as src, open(job['path'], 'wb') as dst:
+                            shutil.copyfileobj(src, dst)
+                        jobs.append(job)
+            except zipfile.BadZipFile:
+                raise ValueError(f"{file.filename} is not a valid zip archive")
+            finally:
+                os.remove(archive_path)
+        elif allowed_file(file.filename):
+            job = _bulk_job(work_dir, file.filename)
+            file.save(job['path'])
+            jobs.append(job)
+        else:
+            rejected.append(file.filename)
+
+        if len(jobs) > BULK_UPLOAD_MAX_FILES:
+            raise ValueError(f"Too many documents. Maximum is {BULK_UPLOAD_MAX_FILES} per upload.")
+    return jobs, rejected
 
-    return synthetic_df
+def ingest_bulk_uploads(jobs, rejected, progress=None):
+    """Extract and split documents across worker processes, then embed everything in one batched insert"""
+    prepared = extraction_pool.prepare(jobs, BULK_EXTRACT_TIMEOUT) if jobs else []
+    failed = [{'file': name, 'error': 'Unsupported file type'} for name in rejected]
+    failed += [{'file': doc['file'], 'error': doc['error']} for doc in prepared if 'error' in doc]
+    for doc in failed:
+        logger.warning(f"Bulk upload skipped {doc['file']}: {doc['error']}")
 
-# === Constants ===
-N_SYNTHETIC_SAMPLES = 100
+    result = paper_rag.add_chunked_papers([doc for doc in prepared if 'error' not in doc], progress=progress)
+    added = [
+        {'file': doc['file'], 'title': doc['title'], 'hash': doc['hash'], 'chunks': len(doc['chunks'])}
+        for doc in result['added']
+    ]
+    return {
+        'status': 'success' if added else 'error',
+        'message': f"Added {len(added)} of {len(jobs) + len(rejected)} documents",
+        'added': added,
+        'duplicates': [{'file': doc['file'], 'title': doc['title']} for doc in result['skipped']],
+        'failed': failed
+    }
 
 # Initialize models
-with open(model_path, "rb") as f:
-    model = pickle.load(f)
+explanation_engine = ExplanationEngine(
+    model_path,
+    config_path,
+    forest_engine=FOREST_ENGINE
+)
 
-paper_rag = paperRag(top_features=["feature1", "feature2", "feature3"])
+paper_rag = paperRag()
+# Flush pending vector store writes when the worker shuts down
+atexit.register(paper_rag.close)
+
+# RAG retrieval and LLM explanations run here, off the request thread, recorded in a local SQLite store
+# so any worker can answer for them
+explanation_jobs = ExplanationJobs(
+    EXPLANATION_JOB_STORE_PATH or os.path.join(os.path.dirname(__file__), 'explanation_jobs.sqlite'),
+    max_workers=EXPLANATION_WORKERS,
+    max_pending=EXPLANATION_QUEUE_SIZE,
+    ttl=EXPLANATION_JOB_TTL,
+    poll_interval=EXPLANATION_POLL_INTERVAL,
+    max_waiters=EXPLANATION_MAX_WAITERS
+)
+atexit.register(explanation_jobs.shutdown)
+
+# Long paper operations (?async=1) run as jobs, one at a time, recorded in a local SQLite store
+paper_jobs = JobManager(
+    JOB_STORE_PATH or os.path.join(os.path.dirname(__file__), 'jobs.sqlite'),
+    max_workers=JOB_WORKERS,
+    max_pending=JOB_QUEUE_SIZE,
+    ttl=JOB_TTL,
+    progress_interval=JOB_EVENTS_INTERVAL
+)
+atexit.register(paper_jobs.shutdown)
+
+def _async_requested():
+    return request.args.get('async', '').lower() in ('1', 'true', 'yes')
+
+def _chunk_progress(job):
+    """Adapt paperRag's {'done', 'total'} batch progress to a job's percent"""
+    def report(stats):
+        job.progress(100.0 * stats['done'] / max(stats['total'], 1),
+                     f"Embedded {stats['done']} of {stats['total']} chunks")
+    return report
+
+def _submit_job(kind, fn, cleanup=None):
+    """Queue a paper job and answer 202 with its id, or 503 when the queue is full"""
+    job_id = paper_jobs.submit(kind, fn, cleanup=cleanup)
+    if job_id is None:
+        if cleanup:
+            cleanup()
+        return jsonify({
+            'status': 'error',
+            'message': 'Too many paper jobs are queued. Please try again shortly.'
+        }), 503
+
+    return jsonify({
+        'status': 'accepted',
+        'job_id': job_id,
+        'status_url': url_for('get_job', job_id=job_id),
+        'events_url': url_for('job_events', job_id=job_id)
+    }), 202
+
+# Explanations are reused across predictions with the same quantized signature
+explanation_cache = build_explanation_cache(
+    EXPLANATION_CACHE_BACKEND,
+    EXPLANATION_CACHE_PATH or os.path.join(os.path.dirname(__file__), 'explanation_cache.sqlite'),
+    max_entries=EXPLANATION_CACHE_MAX_ENTRIES,
+    ttl=EXPLANATION_CACHE_TTL,
+    prob_bucket=EXPLANATION_CACHE_PROB_BUCKET
+)
 
 # Define feature names in order
 FEATURE_NAMES = [
@@ -173,6 +287,47 @@ FEATURE_NAMES = [
     'histogram_median', 'histogram_variance', 'histogram_tendency'
 ]
 
+# Map numerical predictions to labels
+LABEL_MAP = {1: "Normal", 2: "Suspect", 3: "Pathological"}
+
+# Feature names in order (matching the form input order) for single-row predictions
+PREDICT_FEATURES = [
+    'baseline_value',
+    'accelerations',
+    'fetal_movement',
+    'uterine_contractions',
+    # 'light_decelerations',
+    # 'severe_decelerations',
+    'prolongued_decelerations',
+    'abnormal_short_term_variability',
+    # 'mean_value_of_short_term_variability',
+    'percentage_of_time_with_abnormal_long_term_variability',
+    # 'mean_value_of_long_term_variability',
+    # 'histogram_width',
+    # 'histogram_min',
+    'histogram_max',
+    'histogram_number_of_peaks',
+    # 'histogram_number_of_zeroes',
+    'histogram_mode',
+    # 'histogram_mean',
+    # 'histogram_median',
+    'histogram_variance',
+    # 'histogram_tendency'
+]
+
+# Literature retrieval settings for explanations
+RETRIEVAL_TOP_K = 10
+RETRIEVAL_MIN_SCORE = 0.7
+
+if RETRIEVAL_CACHE_PREWARM:
+    # Every prediction's query is one of the ordered top-3 feature combinations; search them all up front
+    threading.Thread(
+        target=paper_rag.prewarm_retrieval_cache,
+        args=(PREDICT_FEATURES, RETRIEVAL_TOP_K, RETRIEVAL_MIN_SCORE),
+        name="retrieval-prewarm",
+        daemon=True
+    ).start()
+
 HARDCODED_USER = 'admin'
 HARDCODED_PASS = 'password123'
 
@@ -207,6 +362,51 @@ def get_papers():
             'message': str(e)
         }), 500
 
+@app.route('/papers/catalog', methods=['GET'])
+@jwt_required()
+def get_paper_catalog():
+    """List one summary per paper, paginated with an opaque cursor"""
+    try:
+        limit = min(max(request.args.get('limit', 50, type=int), 1), 500)
+        catalog = paper_rag.get_paper_catalog(cursor=request.args.get('cursor'), limit=limit)
+        return jsonify({
+            'status': 'success',
+            **catalog
+        })
+    except ValueError:
+        return jsonify({
+            'status': 'error',
+            'message': 'Invalid cursor'
+        }), 400
+    except Exception as e:
+        logger.exception("Error getting paper catalog")
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 500
+
+@app.route('/papers/<paper_hash>', methods=['GET'])
+@jwt_required()
+def get_paper(paper_hash):
+    """Get the full content of a single paper"""
+    try:
+        paper = paper_rag.get_paper(paper_hash)
+        if paper is None:
+            return jsonify({
+                'status': 'error',
+                'message': 'Paper not found in database'
+            }), 404
+        return jsonify({
+            'status': 'success',
+            'paper': paper
+        })
+    except Exception as e:
+        logger.exception("Error getting paper")
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 500
+
 @app.route('/papers/add', methods=['POST'])
 @jwt_required()
 def add_paper():
@@ -233,6 +433,8 @@ def add_paper():
 def refresh_papers():
     """Download new papers and add them to the database"""
     try:
+        if _async_requested():
+            return _submit_job('refresh', lambda job: paper_rag.refresh_papers(progress=_chunk_progress(job)))
         result = paper_rag.refresh_papers()
         return jsonify(result)
     except Exception as e:
@@ -247,6 +449,8 @@ def refresh_papers():
 def remove_duplicate_papers():
     """Remove duplicate papers from the database"""
     try:
+        if _async_requested():
+            return _submit_job('remove-duplicates', lambda job: paper_rag.remove_duplicates())
         result = paper_rag.remove_duplicates()
         return jsonify(result)
     except Exception as e:
@@ -284,7 +488,14 @@ def search_papers():
                 'message': 'Query parameter is required'
             }), 400
             
-        results = paper_rag.search_papers_by_keyword(query)
+        mode = request.args.get('mode', SEARCH_MODE)
+        if mode not in SEARCH_MODES:
+            return jsonify({
+                'status': 'error',
+                'message': f"mode must be one of: {', '.join(SEARCH_MODES)}"
+            }), 400
+
+        results = paper_rag.search_papers_by_keyword(query, mode=mode)
         # Convert float32 to float for JSON serialization
         for result in results:
             if 'similarity' in result:
@@ -313,13 +524,19 @@ def download_papers():
                 'message': 'Query is required'
             }), 400
             
-        result = paper_rag.download_papers_with_options(
-            query=data['query'],
-            max_results=data.get('max_results', 10),
-            start_date=data.get('start_date'),
-            end_date=data.get('end_date'),
-            start_index=data.get('start_index', 0)
-        )
+        def download(progress=None):
+            return paper_rag.download_papers_with_options(
+                query=data['query'],
+                max_results=data.get('max_results', 10),
+                start_date=data.get('start_date'),
+                end_date=data.get('end_date'),
+                start_index=data.get('start_index', 0),
+                progress=progress
+            )
+
+        if _async_requested():
+            return _submit_job('download', lambda job: download(progress=_chunk_progress(job)))
+        result = download()
         return jsonify(result)
     except Exception as e:
         logger.exception("Error downloading papers")
@@ -373,9 +590,19 @@ def upload_paper():
         # Get optional title from form data
         title = request.form.get('title', file.filename)
 
-        # Process the uploaded file
+        # Extract, split and embed the file incrementally
         try:
-            content = process_uploaded_file(file)
+            file_path, file_ext, filename = save_upload(file)
+            if _async_requested():
+                return _submit_job(
+                    'upload',
+                    lambda job: ingest_saved_file(
+                        file_path, file_ext, filename, title,
+                        progress=lambda stats: job.progress(message=f"Indexed {stats['chunks']} chunks")
+                    ),
+                    cleanup=lambda: _remove_file(file_path)
+                )
+            result = ingest_saved_file(file_path, file_ext, filename, title)
         except ValueError as ve:
             return jsonify({
                 'status': 'error',
@@ -387,53 +614,208 @@ def upload_paper():
                 'message': 'Failed to process file.'
             }), 500
 
-        if not content:
+        return jsonify(result)
+
+    except Exception as e:
+        logger.exception("Error uploading paper")
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 500
+
+@app.route('/papers/upload/bulk', methods=['POST'])
+@jwt_required()
+def upload_papers_bulk():
+    """Upload many documents (or zip archives of them) and add them in one batched insert"""
+    work_dir = None
+    try:
+        files = [file for file in request.files.getlist('files') if file.filename]
+        if not files:
             return jsonify({
                 'status': 'error',
-                'message': 'Invalid file type or empty file'
+                'message': 'No files provided'
             }), 400
 
-        # Add the paper to the database
-        result = paper_rag.add_custom_paper(title, content)
-        return jsonify(result)
+        upload_folder = os.path.join(os.path.dirname(__file__), "uploads")
+        os.makedirs(upload_folder, exist_ok=True)
+        work_dir = tempfile.mkdtemp(prefix="bulk-", dir=upload_folder)
+
+        try:
+            jobs, rejected = collect_bulk_uploads(files, work_dir)
+        except ValueError as ve:
+            return jsonify({
+                'status': 'error',
+                'message': str(ve)
+            }), 400
+
+        if _async_requested():
+            cleanup_dir, work_dir = work_dir, None
+            return _submit_job(
+                'upload-bulk',
+                lambda job: ingest_bulk_uploads(jobs, rejected, progress=_chunk_progress(job)),
+                cleanup=lambda: shutil.rmtree(cleanup_dir, ignore_errors=True)
+            )
+
+        return jsonify(ingest_bulk_uploads(jobs, rejected))
 
     except Exception as e:
-        logger.exception("Error uploading paper")
+        logger.exception("Error in bulk upload")
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 500
+    finally:
+        if work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+@app.route('/jobs', methods=['GET'])
+@jwt_required()
+def list_jobs():
+    """List recent paper jobs, newest first"""
+    try:
+        limit = min(int(request.args.get('limit', 50)), 200)
+    except ValueError:
+        return jsonify({
+            'status': 'error',
+            'message': 'Invalid limit'
+        }), 400
+    return jsonify({
+        'status': 'success',
+        'jobs': paper_jobs.store.recent(limit),
+        **paper_jobs.stats()
+    })
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+@jwt_required()
+def get_job(job_id):
+    """Fetch a paper job's status, progress and, once finished, its result"""
+    job = paper_jobs.get(job_id)
+    if job is None:
+        return jsonify({
+            'status': 'error',
+            'message': 'Job not found'
+        }), 404
+    return jsonify(job)
+
+@app.route('/jobs/<job_id>/events', methods=['GET'])
+@jwt_required()
+def job_events(job_id):
+    """Stream a paper job's progress as server-sent events until it finishes"""
+    if paper_jobs.get(job_id) is None:
+        return jsonify({
+            'status': 'error',
+            'message': 'Job not found'
+        }), 404
+
+    def generate():
+        for job in paper_jobs.watch(job_id, poll_interval=JOB_EVENTS_INTERVAL):
+            yield _sse(job['status'] if job['status'] in FINISHED else 'progress', job)
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+@app.route('/model/reload', methods=['POST'])
+@jwt_required()
+def reload_model():
+    """Reload the model pickle and rebuild the resident explainer"""
+    try:
+        explanation_engine.reload()
+        return jsonify({
+            'status': 'success',
+            'message': 'Model reloaded'
+        })
+    except Exception as e:
+        logger.exception("Error reloading model")
         return jsonify({
             'status': 'error',
             'message': str(e)
         }), 500
 
+def _missing_feature(data):
+    """Return the first required feature absent from the request row (a JSON object), if any"""
+    for feature in PREDICT_FEATURES:
+        if feature not in data:
+            return feature
+    return None
+
+def _validate_features(data):
+    """Return the request row as a DataFrame in training column order, or an error response"""
+    if not isinstance(data, dict):
+        return None, (jsonify({
+            'error': 'Invalid request. Expected a JSON object.',
+        }), 400)
+
+    # Ensure all required features are present
+    feature = _missing_feature(data)
+    if feature:
+        return None, (jsonify({
+            'error': f'Missing feature: {feature}',
+            'message': f'Please provide a value for {feature}'
+        }), 400)
+
+    # Reorder columns to match training data
+    return pd.DataFrame([data])[PREDICT_FEATURES], None
+
+def _explain_features(features):
+    """Predict a single row and rank its top SHAP features"""
+
+    # === SHAP Explanation ===
+
+    # Model and explainer are built once at startup
+    explanation_engine.reload_if_changed()
+    model, explainer = explanation_engine.current()
+
+    # Make prediction
+    prediction = model.predict(features)[0]
+    probabilities = model.predict_proba(features)[0]
+
+    # Map numerical predictions to labels
+    predicted_label = LABEL_MAP[prediction]
+    predicted_class = np.where(model.classes_ == prediction)[0][0]
+    predicted_prob = probabilities[predicted_class]
+
+    # Prediction Insights: exact TreeSHAP for the submitted row, predicted class only
+    top_idx, top_values = explainer.top_k(features, predicted_class, k=3)
+    top_features = [features.columns[i] for i in top_idx[0]]
+    top_shap_values = top_values[0].tolist()
+
+    prediction_info = {
+        "predicted_label": predicted_label,
+        "predicted_probability": predicted_prob,
+        "top_features": top_features,
+        "top_shap_values": top_shap_values
+    }
+    logger.debug(f"prediction_info: {prediction_info}")
+    return prediction_info
+
+def _retrieve_chunks(prediction_info):
+    """Retrieve the literature chunks matching the prediction's top features"""
+    logger.debug(f"top_features: {prediction_info['top_features']}")
+    return paper_rag.retrieve_relevant_chunks(
+        top_features=prediction_info['top_features'],
+        top_k=RETRIEVAL_TOP_K,
+        min_score=RETRIEVAL_MIN_SCORE
+    )
+
+def _prediction_payload(prediction_info):
+    """JSON-serializable view of prediction_info"""
+    return {
+        'predicted_label': prediction_info['predicted_label'],
+        'predicted_probability': float(prediction_info['predicted_probability']),
+        'top_features': prediction_info['top_features'],
+        'top_shap_values': [float(v) for v in prediction_info['top_shap_values']]
+    }
+
+def _sse(event, payload):
+    """Format one server-sent event with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
 @app.route('/predict', methods=['POST'])
 @jwt_required()
 def predict():
     try:
-
-        # Define feature names in order (matching the form input order)
-        feature_names = [
-            'baseline_value',
-            'accelerations',
-            'fetal_movement',
-            'uterine_contractions',
-            # 'light_decelerations',
-            # 'severe_decelerations',
-            'prolongued_decelerations',
-            'abnormal_short_term_variability',
-            # 'mean_value_of_short_term_variability',
-            'percentage_of_time_with_abnormal_long_term_variability',
-            # 'mean_value_of_long_term_variability',
-            # 'histogram_width',
-            # 'histogram_min',
-            'histogram_max',
-            'histogram_number_of_peaks',
-            # 'histogram_number_of_zeroes',
-            'histogram_mode',
-            # 'histogram_mean',
-            # 'histogram_median',
-            'histogram_variance',
-            # 'histogram_tendency'
-        ]
-        
         # Get data from request
         if request.is_json:
             data = request.get_json()
@@ -443,80 +825,103 @@ def predict():
             }), 400
 
         logger.debug(f"data: {data}")
-        features = pd.DataFrame([data])
+        features, error = _validate_features(data)
+        if error:
+            return error
+
+        prediction_info = _explain_features(features)
+
+        # Retrieve relevant chunks
+        relevant_chunks = _retrieve_chunks(prediction_info)
+
+        # Get prediction insights
+        llm_output = llm_input_aggregator(prediction_info, relevant_chunks, cache=explanation_cache)
+        llm_explanation = llm_output['explanation']
         
-        # Ensure all required features are present
-        for feature in feature_names:
-            if feature not in features.columns:
-                return jsonify({
-                    'error': f'Missing feature: {feature}',
-                    'message': f'Please provide a value for {feature}'
-                }), 400
+        return llm_explanation
         
-        # Reorder columns to match training data
-        features = features[feature_names]
+    except Exception as e:
+        logger.error(f"Error in prediction: {str(e)}", exc_info=True)
+        return jsonify({
+            'error': 'Prediction failed',
+            'message': str(e)
+        }), 500
+
+@app.route('/predict/stream', methods=['POST'])
+@jwt_required()
+def predict_stream():
+    """Send the prediction as the first server-sent event, then stream the explanation tokens"""
+    try:
+        if request.is_json:
+            data = request.get_json()
+        else:
+            return jsonify({
+                'error': 'Invalid request. Expected JSON format.',
+            }), 400
 
-        # === SHAP Synthetic Data Generation ===
+        features, error = _validate_features(data)
+        if error:
+            return error
 
-        # Load test data and config
-        df_test = pd.read_csv(test_data_path)
-        with open(config_path, "r") as f:
-            selected_features = yaml.safe_load(f)["selected_columns"]
+        prediction_info = _explain_features(features)
+    except Exception as e:
+        logger.error(f"Error in prediction: {str(e)}", exc_info=True)
+        return jsonify({
+            'error': 'Prediction failed',
+            'message': str(e)
+        }), 500
 
-        # Generate and prepare synthetic data
-        synthetic_df = generate_synthetic_data(df_test, n_samples=N_SYNTHETIC_SAMPLES)
-        synthetic_df_selected = synthetic_df[selected_features]
-        X_test = synthetic_df_selected.drop("fetal_health", axis=1)
-        y_test = synthetic_df_selected["fetal_health"]
+    def generate():
+        yield _sse('prediction', _prediction_payload(prediction_info))
+        try:
+            relevant_chunks = _retrieve_chunks(prediction_info)
+            for text in stream_llm_explanation(prediction_info, relevant_chunks, cache=explanation_cache):
+                yield _sse('token', {'text': text})
+            yield _sse('done', {})
+        except Exception as e:
+            logger.error(f"Error streaming explanation: {str(e)}", exc_info=True)
+            yield _sse('error', {'message': str(e)})
 
-        # Load model
-        model_wrapper = FoetalHealthModel()
-        model_wrapper.model = model
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'  # Stop reverse proxies from buffering the stream
+    })
 
-        # SHAP Explanation for a single sample
-        explainer = shap.TreeExplainer(model)
-        sample = X_test.sample(n=1, random_state=np.random.randint(0, N_SYNTHETIC_SAMPLES))
-        sample = sample.reset_index(drop=True)
-        shap_values = explainer.shap_values(sample)
+@app.route('/predict/async', methods=['POST'])
+@jwt_required()
+def predict_async():
+    """Return the prediction immediately and generate the explanation as a background job"""
+    try:
+        if request.is_json:
+            data = request.get_json()
+        else:
+            return jsonify({
+                'error': 'Invalid request. Expected JSON format.',
+            }), 400
 
-        # === SHAP Synthetic Data Generation ===
+        features, error = _validate_features(data)
+        if error:
+            return error
 
-        # Make prediction
-        prediction = model.predict(features)[0]
-        probabilities = model.predict_proba(features)[0]
-        
-        # Map numerical predictions to labels
-        label_map = {1: "Normal", 2: "Suspect", 3: "Pathological"}
-        predicted_label = label_map[prediction]
-        predicted_class = np.where(model.classes_ == prediction)[0][0]
-        predicted_prob = probabilities[predicted_class]
-
-        # Prediction Insights
-        pred_class_shap = shap_values[0, :, predicted_class]
-        feature_shap_pairs = list(zip(features.columns, pred_class_shap))
-        sorted_features = sorted(feature_shap_pairs, key=lambda x: abs(x[1]), reverse=True)
-        top_features = [f for f, _ in sorted_features[:3]]
-        top_shap_values = [v for _, v in sorted_features[:3]]
-
-        prediction_info = {
-            "predicted_label": predicted_label,
-            "predicted_probability": predicted_prob,
-            "top_features": top_features,
-            "top_shap_values": top_shap_values            
-        }
-        logger.debug(f"prediction_info: {prediction_info}")
+        prediction_info = _explain_features(features)
 
-        # Retrieve relevant chunks
-        logger.debug(f"top_features: {top_features}")
-        paper_rag.top_features = top_features
-        relevant_chunks = paper_rag.retrieve_relevant_chunks(top_k=10, min_score=0.7)
+        def explain():
+            relevant_chunks = _retrieve_chunks(prediction_info)
+            return llm_input_aggregator(prediction_info, relevant_chunks, cache=explanation_cache)['explanation']
+
+        job_id = explanation_jobs.submit(explain)
+        if job_id is None:
+            return jsonify({
+                'error': 'Explanation queue is full',
+                'message': 'Too many explanations are being generated. Please try again shortly.'
+            }), 503
+
+        return jsonify({
+            'job_id': job_id,
+            'explanation_url': url_for('get_prediction_explanation', job_id=job_id),
+            **_prediction_payload(prediction_info)
+        }), 202
 
-        # Get prediction insights
-        llm_output = llm_input_aggregator(prediction_info, relevant_chunks)
-        llm_explanation = llm_output['explanation']
-        
-        return llm_explanation
-        
     except Exception as e:
         logger.error(f"Error in prediction: {str(e)}", exc_info=True)
         return jsonify({
@@ -524,5 +929,173 @@ def predict():
             'message': str(e)
         }), 500
 
+@app.route('/predict/<job_id>/explanation', methods=['GET'])
+@jwt_required()
+def get_prediction_explanation(job_id):
+    """Fetch an explanation job; ?wait=<seconds> long-polls until it finishes"""
+    try:
+        wait = min(max(float(request.args.get('wait', 0)), 0.0), EXPLANATION_MAX_WAIT)
+    except ValueError:
+        return jsonify({
+            'error': 'Invalid wait value',
+        }), 400
+
+    job = explanation_jobs.get(job_id, wait=wait)
+    if job is None:
+        return jsonify({
+            'status': 'error',
+            'message': 'Explanation job not found'
+        }), 404
+
+    status_code = 200 if job['status'] in ('done', 'error') else 202
+    return jsonify(job), status_code
+
+@app.route('/explanations/cache/stats', methods=['GET'])
+@jwt_required()
+def explanation_cache_stats():
+    """Report explanation cache hit/miss counts and size"""
+    if explanation_cache is None:
+        return jsonify({
+            'status': 'success',
+            'enabled': False
+        })
+    return jsonify({
+        'status': 'success',
+        'enabled': True,
+        **explanation_cache.stats()
+    })
+
+@app.route('/papers/retrieval-cache/stats', methods=['GET'])
+@jwt_required()
+def retrieval_cache_stats():
+    """Report feature-query retrieval cache hit/miss counts and size"""
+    return jsonify({
+        'status': 'success',
+        **paper_rag.retrieval_cache_stats()
+    })
+
+@app.route('/papers/index', methods=['GET'])
+@jwt_required()
+def vector_index_stats():
+    """Describe the FAISS index backing the paper store"""
+    try:
+        return jsonify({
+            'status': 'success',
+            'index': paper_rag.index_stats()
+        })
+    except Exception as e:
+        logger.exception("Error describing vector index")
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 500
+
+@app.route('/papers/index/rebuild', methods=['POST'])
+@jwt_required()
+def rebuild_vector_index():
+    """Rebuild the FAISS index (optionally as another type) from the stored vectors"""
+    try:
+        data = request.get_json(silent=True) or {}
+        index_type = data.get('type')
+        nlist = data.get('nlist')
+
+        if _async_requested():
+            return _submit_job('rebuild-index', lambda job: paper_rag.rebuild_index(index_type, nlist=nlist))
+        result = paper_rag.rebuild_index(index_type, nlist=nlist)
+        return jsonify(result), 200 if result['status'] == 'success' else 400
+    except Exception as e:
+        logger.exception("Error rebuilding vector index")
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 500
+
+@app.route('/predict/batch', methods=['POST'])
+@jwt_required()
+def predict_batch():
+    """Predict a CSV or JSON array of CTG rows and stream the results back as NDJSON"""
+    try:
+        # Read the rows lazily so large uploads are scored chunk by chunk
+        spool_path = None
+        if 'file' in request.files:
+            # Uploaded files are closed when the view returns, so spool to a file the stream owns
+            with tempfile.NamedTemporaryFile(suffix='.csv', delete=False) as spool:
+                request.files['file'].save(spool)
+                spool_path = spool.name
+            frames = pd.read_csv(spool_path, chunksize=PREDICT_BATCH_SIZE)
+        elif request.mimetype == 'text/csv':
+            frames = pd.read_csv(request.stream, chunksize=PREDICT_BATCH_SIZE)
+        elif request.is_json:
+            rows = request.get_json()
+            if not isinstance(rows, list):
+                return jsonify({
+                    'error': 'Invalid request. Expected a JSON array of rows.',
+                }), 400
+            frames = (
+                pd.DataFrame(rows[i:i + PREDICT_BATCH_SIZE])
+                for i in range(0, len(rows), PREDICT_BATCH_SIZE)
+            )
+        else:
+            return jsonify({
+                'error': 'Invalid request. Expected a CSV file, a text/csv body or a JSON array.',
+            }), 400
+
+        first_frame = next(iter(frames), None)
+        if first_frame is None or first_frame.empty:
+            return jsonify({
+                'error': 'No rows provided',
+            }), 400
+
+        # Ensure all required features are present
+        missing = [f for f in explanation_engine.feature_names if f not in first_frame.columns]
+        if missing:
+            return jsonify({
+                'error': f'Missing features: {", ".join(missing)}',
+                'message': 'Every row must provide a value for each model feature'
+            }), 400
+
+        explanation_engine.reload_if_changed()
+    except Exception as e:
+        logger.error(f"Error reading batch: {str(e)}", exc_info=True)
+        if spool_path and os.path.exists(spool_path):
+            os.remove(spool_path)
+        return jsonify({
+            'error': 'Batch prediction failed',
+            'message': str(e)
+        }), 400
+
+    def generate():
+        offset = 0
+        try:
+            for frame in itertools.chain([first_frame], frames):
+                try:
+                    results = explanation_engine.explain_batch(frame)
+                except Exception as e:
+                    logger.error(f"Error in batch prediction: {str(e)}", exc_info=True)
+                    yield json.dumps({
+                        'rows': [offset, offset + len(frame)],
+                        'error': str(e)
+                    }) + "\n"
+                else:
+                    for i, result in enumerate(results):
+                        yield json.dumps({
+                            'row': offset + i,
+                            'predicted_label': LABEL_MAP[result['predicted_class']],
+                            'predicted_probability': result['predicted_probability'],
+                            'probabilities': {
+                                LABEL_MAP[c]: p for c, p in result['probabilities'].items()
+                            },
+                            'top_features': result['top_features'],
+                            'top_shap_values': result['top_shap_values']
+                        }) + "\n"
+                offset += len(frame)
+        finally:
+            if spool_path and os.path.exists(spool_path):
+                os.remove(spool_path)
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
 if __name__ == '__main__':
+    # Run as a script, this module is the one forkserver workers would re-import, model and all
+    extraction_pool.method = 'fork'
     app.run(host='0.0.0.0', port=5000)
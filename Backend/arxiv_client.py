@@ -0,0 +1,122 @@
+import time
+import threading
+from email.utils import parsedate_to_datetime
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+ATOM = "{http://www.w3.org/2005/Atom}"
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+class _RateLimiter:
+    """Spaces request starts at least `min_interval` seconds apart across threads"""
+
+    def __init__(self, min_interval: float):
+        self.min_interval = min_interval
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.min_interval
+        if slot > now:
+            time.sleep(slot - now)
+
+    def defer(self, delay: float):
+        """Hold every thread's next request back for at least `delay` seconds"""
+        with self._lock:
+            self._next_slot = max(self._next_slot, time.monotonic() + delay)
+
+def _retry_after(response) -> float:
+    """Seconds asked for by a Retry-After header (delta or HTTP date), or None"""
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+class ArxivClient:
+    """arXiv API client over one pooled session
+
+    Requests are rate limited (arXiv asks for one request every three seconds),
+    retried with backoff on 429/5xx, and parsed incrementally as the Atom feed
+    streams in. Retries go back through the rate limiter, and a Retry-After or
+    backoff delay holds back every thread, not just the one that was refused;
+    urllib3 only retries failed connections, which never reached arXiv.
+    `base_url` can point at a local fixture server.
+    """
+
+    def __init__(self, base_url: str, min_interval: float = 3.0, max_workers: int = 4,
+                 timeout: float = 30.0, max_retries: int = 3):
+        self.base_url = base_url
+        self.timeout = timeout
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.backoff_factor = 1.0
+        self._limiter = _RateLimiter(min_interval)
+
+        # Connection retries only; 429/5xx responses come back to search, which retries them
+        retry = Retry(total=max_retries, connect=max_retries, read=0, status=0,
+                      respect_retry_after_header=False, backoff_factor=self.backoff_factor)
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def search(self, query: str, start: int = 0, max_results: int = 10,
+               start_date: str = None, end_date: str = None) -> List[Dict]:
+        """Return the entries of one result page, newest first"""
+        search_query = f"all:{query}"
+        if start_date and end_date:
+            search_query += f" AND submittedDate:[{start_date} TO {end_date}]"
+        params = {
+            "search_query": search_query,
+            "start": start,
+            "max_results": max_results,
+            "sortBy": "submittedDate",
+            "sortOrder": "descending"
+        }
+
+        for attempt in range(self.max_retries + 1):
+            self._limiter.wait()
+            with self.session.get(self.base_url, params=params, timeout=self.timeout, stream=True) as response:
+                if response.status_code in RETRY_STATUSES and attempt < self.max_retries:
+                    delay = _retry_after(response)
+                    self._limiter.defer(self.backoff_factor * 2 ** attempt if delay is None else delay)
+                    continue
+                response.raise_for_status()
+                response.raw.decode_content = True
+                return list(self._parse_entries(response.raw))
+
+    def search_many(self, queries: List[Dict]) -> List[List[Dict]]:
+        """Run several searches concurrently; each item holds `search` keyword arguments"""
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="arxiv") as executor:
+            return list(executor.map(lambda kwargs: self.search(**kwargs), queries))
+
+    def _parse_entries(self, stream) -> Iterator[Dict]:
+        """Yield entries while the feed is still downloading, discarding each once parsed"""
+        for _, element in ET.iterparse(stream, events=("end",)):
+            if element.tag != f"{ATOM}entry":
+                continue
+            yield {
+                "title": (element.findtext(f"{ATOM}title") or "").strip(),
+                "abstract": (element.findtext(f"{ATOM}summary") or "").strip(),
+                "authors": [
+                    (author.findtext(f"{ATOM}name") or "").strip()
+                    for author in element.findall(f"{ATOM}author")
+                ],
+                "published": (element.findtext(f"{ATOM}published") or "").strip(),
+                "link": (element.findtext(f"{ATOM}id") or "").strip()
+            }
+            element.clear()
@@ -0,0 +1,151 @@
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+import jwt
+import pandas as pd
+from limits import parse
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.requests import Request
+from starlette.responses import HTMLResponse, JSONResponse, StreamingResponse
+from starlette.routing import Mount, Route
+import app as backend
+from paper_aggregator import allm_input_aggregator, astream_llm_explanation
+from config import ASGI_CPU_WORKERS, ASGI_WSGI_THREADS
+
+# ASGI entry point: `uvicorn asgi_app:app`. /predict and /predict/stream are served
+# natively on the event loop; every other route is passed through to the Flask app.
+
+logger = logging.getLogger(__name__)
+
+# SHAP and the forest are CPU-bound; keep them off the event loop
+cpu_executor = ThreadPoolExecutor(max_workers=ASGI_CPU_WORKERS, thread_name_prefix="predict-cpu")
+
+# The native routes bypass flask-limiter, so they hit its limiter directly with the same per-client limit
+rate_limit = parse(backend.DEFAULT_RATE_LIMIT)
+
+def _rate_limited(request: Request) -> bool:
+    if not backend.limiter.enabled:
+        return False
+    client = request.client.host if request.client else "127.0.0.1"
+    return not backend.limiter.limiter.hit(rate_limit, "asgi", request.url.path, client)
+
+def _authorized(request: Request) -> bool:
+    """Accept the same Bearer access tokens flask_jwt_extended issues from /login"""
+    header = request.headers.get('Authorization', '')
+    if not header.startswith('Bearer '):
+        return False
+    try:
+        claims = jwt.decode(
+            header[len('Bearer '):],
+            backend.app.config['JWT_SECRET_KEY'],
+            algorithms=[backend.app.config.get('JWT_ALGORITHM', 'HS256')]
+        )
+    except jwt.PyJWTError:
+        return False
+    return claims.get('type') == 'access'
+
+async def _predict_request(request: Request):
+    """Validate the request and run the prediction; returns (prediction_info, error_response)"""
+    if _rate_limited(request):
+        return None, JSONResponse({
+            'status': 'error',
+            'message': 'Rate limit exceeded. Please try again later.'
+        }, status_code=429)
+
+    if not _authorized(request):
+        return None, JSONResponse({'msg': 'Missing or invalid Authorization Header'}, status_code=401)
+
+    try:
+        data = await request.json()
+    except ValueError:
+        return None, JSONResponse({
+            'error': 'Invalid request. Expected JSON format.',
+        }, status_code=400)
+    if not isinstance(data, dict):
+        return None, JSONResponse({
+            'error': 'Invalid request. Expected a JSON object.',
+        }, status_code=400)
+
+    feature = backend._missing_feature(data)
+    if feature:
+        return None, JSONResponse({
+            'error': f'Missing feature: {feature}',
+            'message': f'Please provide a value for {feature}'
+        }, status_code=400)
+
+    features = pd.DataFrame([data])[backend.PREDICT_FEATURES]
+    loop = asyncio.get_running_loop()
+    prediction_info = await loop.run_in_executor(cpu_executor, backend._explain_features, features)
+    return prediction_info, None
+
+async def _retrieve_chunks(prediction_info):
+    return await backend.paper_rag.aretrieve_relevant_chunks(
+        top_features=prediction_info['top_features'],
+        top_k=backend.RETRIEVAL_TOP_K,
+        min_score=backend.RETRIEVAL_MIN_SCORE
+    )
+
+async def predict(request: Request):
+    try:
+        prediction_info, error = await _predict_request(request)
+        if error:
+            return error
+
+        relevant_chunks = await _retrieve_chunks(prediction_info)
+        llm_output = await allm_input_aggregator(prediction_info, relevant_chunks, cache=backend.explanation_cache)
+        return HTMLResponse(llm_output['explanation'])
+
+    except Exception as e:
+        logger.error(f"Error in prediction: {str(e)}", exc_info=True)
+        return JSONResponse({
+            'error': 'Prediction failed',
+            'message': str(e)
+        }, status_code=500)
+
+async def predict_stream(request: Request):
+    try:
+        prediction_info, error = await _predict_request(request)
+        if error:
+            return error
+    except Exception as e:
+        logger.error(f"Error in prediction: {str(e)}", exc_info=True)
+        return JSONResponse({
+            'error': 'Prediction failed',
+            'message': str(e)
+        }, status_code=500)
+
+    async def generate():
+        yield backend._sse('prediction', backend._prediction_payload(prediction_info))
+        try:
+            relevant_chunks = await _retrieve_chunks(prediction_info)
+            async for text in astream_llm_explanation(prediction_info, relevant_chunks,
+                                                      cache=backend.explanation_cache):
+                yield backend._sse('token', {'text': text})
+            yield backend._sse('done', {})
+        except Exception as e:
+            logger.error(f"Error streaming explanation: {str(e)}", exc_info=True)
+            yield backend._sse('error', {'message': str(e)})
+
+    return StreamingResponse(generate(), media_type='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+# Same CORS policy the Flask app applies to the routes it serves
+cors = [Middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_methods=["GET", "POST", "DELETE", "OPTIONS"],
+    allow_headers=["Content-Type", "Authorization"],
+    expose_headers=["Content-Type"],
+    allow_credentials=True
+)]
+
+app = Starlette(routes=[
+    Route('/predict', predict, methods=['POST', 'OPTIONS'], middleware=cors),
+    Route('/predict/stream', predict_stream, methods=['POST', 'OPTIONS'], middleware=cors),
+    Mount('/', app=WSGIMiddleware(backend.app, workers=ASGI_WSGI_THREADS))
+])
@@ -0,0 +1,84 @@
+import sys
+import time
+import argparse
+import statistics
+from pathlib import Path
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import faiss_index
+
+# Recall@k against exact search, per-query latency and index size for each FAISS
+# backend, on synthetic clustered unit vectors shaped like ada-002 embeddings.
+#
+#   python benchmarks/index_benchmark.py --vectors 100000 --dim 1536 --queries 200 --k 10
+
+def _synthetic(n_vectors: int, dim: int, n_clusters: int, rng) -> np.ndarray:
+    centers = rng.standard_normal((n_clusters, dim)).astype(np.float32)
+    assignment = rng.integers(0, n_clusters, n_vectors)
+    vectors = centers[assignment] + 0.6 * rng.standard_normal((n_vectors, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def _measure(index, queries: np.ndarray, truth: np.ndarray, k: int):
+    latencies = []
+    hits = 0
+    for query, expected in zip(queries, truth):
+        start = time.perf_counter()
+        _, labels = faiss_index.search(index, query, k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        hits += len(set(labels.tolist()) & set(expected.tolist()))
+    latencies.sort()
+    return {
+        'recall': hits / (len(queries) * k),
+        'p50_ms': statistics.median(latencies),
+        'p95_ms': latencies[int(0.95 * (len(latencies) - 1))]
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare FAISS index backends for the paper store")
+    parser.add_argument("--vectors", type=int, default=50000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--types", default=",".join(faiss_index.INDEX_TYPES))
+    parser.add_argument("--ef-search", default="16,64,256", help="HNSW efSearch values to sweep")
+    parser.add_argument("--nprobe", default="4,16,64", help="IVF nprobe values to sweep")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    vectors = _synthetic(args.vectors, args.dim, args.clusters, rng)
+    # Queries near stored vectors, like a feature query near the chunks that answer it
+    queries = vectors[rng.integers(0, args.vectors, args.queries)]
+    queries = queries + 0.3 * rng.standard_normal(queries.shape).astype(np.float32) / np.sqrt(args.dim)
+
+    exact = faiss_index.build_from_vectors("flat", vectors)
+    truth = exact.search(queries, args.k)[1]
+
+    print(f"{args.vectors} vectors x {args.dim} dims, {args.queries} queries, recall@{args.k}")
+    print(f"{'index':<8} {'param':<13} {'build s':>8} {'memory MB':>10} {'recall':>7} {'p50 ms':>8} {'p95 ms':>8}")
+    for index_type in args.types.split(","):
+        start = time.perf_counter()
+        index = faiss_index.build_from_vectors(index_type, vectors)
+        build_seconds = time.perf_counter() - start
+        memory_mb = faiss_index.index_memory_bytes(index) / 2 ** 20
+
+        if index_type == "hnsw":
+            settings = [("efSearch", int(value)) for value in args.ef_search.split(",")]
+        elif index_type in ("ivf", "ivfpq"):
+            settings = [("nprobe", int(value)) for value in args.nprobe.split(",")]
+        else:
+            settings = [("-", None)]
+
+        for name, value in settings:
+            if name == "efSearch":
+                index.hnsw.efSearch = value
+            elif name == "nprobe":
+                index.nprobe = min(value, index.nlist)
+            result = _measure(index, queries, truth, args.k)
+            param = "-" if value is None else f"{name}={value}"
+            print(f"{index_type:<8} {param:<13} {build_seconds:>8.1f} {memory_mb:>10.1f} "
+                  f"{result['recall']:>7.3f} {result['p50_ms']:>8.2f} {result['p95_ms']:>8.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+import os
+import gc
+import sys
+import tempfile
+import argparse
+import tracemalloc
+from pathlib import Path
+
+# Checks that streaming a document into the store takes memory bounded by the
+# embedding batch, not by the document. Documents of increasing size (in multiples
+# of INGEST_BATCH_SIZE chunks) are added with fake embeddings; for each, the
+# transient peak is the tracemalloc peak during add_paper_stream minus what the
+# store keeps afterwards. Exits non-zero if it grows with the document.
+#
+#   python benchmarks/ingest_memory_benchmark.py --batches 4 16 --storage faiss
+
+work_dir = tempfile.mkdtemp(prefix="ctg-ingest-bench-")
+os.environ.setdefault("EMBEDDING_BACKEND", "fake")
+os.environ.setdefault("PAPERS_DB_PATH", os.path.join(work_dir, "papers_db"))
+os.environ.setdefault("EMBEDDING_CACHE_PATH", os.path.join(work_dir, "embedding_cache.sqlite"))
+os.environ.setdefault("STORE_FLUSH_INTERVAL", "3600")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+def _document(n_chunks: int, chunk_size: int, seed: int):
+    """Blocks of distinct sentences adding up to about n_chunks chunks"""
+    sentence = "Paper {seed} paragraph {i}: fetal heart rate variability and uterine contractions. "
+    per_chunk = max(1, chunk_size // len(sentence.format(seed=seed, i=0)))
+    for i in range(n_chunks * per_chunk):
+        yield sentence.format(seed=seed, i=i) + ("\n" if i % per_chunk == per_chunk - 1 else "")
+
+def main():
+    parser = argparse.ArgumentParser(description="Check add_paper_stream memory against document size")
+    parser.add_argument("--batches", type=int, nargs="+", default=[4, 16],
+                        help="Document sizes in multiples of INGEST_BATCH_SIZE chunks")
+    parser.add_argument("--storage", default="faiss", help="VECTOR_STORAGE to ingest into")
+    parser.add_argument("--tolerance", type=float, default=2.0,
+                        help="Allowed growth of the transient peak from the smallest document to the largest")
+    args = parser.parse_args()
+    os.environ["VECTOR_STORAGE"] = args.storage
+
+    import paper_rag
+    from config import CHUNK_SIZE, INGEST_BATCH_SIZE
+
+    rag = paper_rag.paperRag()
+    # Load the embedding backend and token counter before anything is measured
+    rag.add_paper_stream("Warm-up", lambda: _document(1, CHUNK_SIZE, -1))
+    print(f"INGEST_BATCH_SIZE {INGEST_BATCH_SIZE}, CHUNK_SIZE {CHUNK_SIZE}, {args.storage} storage")
+    print(f"{'chunks':>8}{'text MB':>10}{'transient MB':>14}{'retained MB':>13}")
+    transients = []
+    for seed, batches in enumerate(args.batches):
+        n_chunks = batches * INGEST_BATCH_SIZE
+        text_bytes = sum(len(block) for block in _document(n_chunks, CHUNK_SIZE, seed))
+        gc.collect()
+        tracemalloc.start()
+        before, _ = tracemalloc.get_traced_memory()
+        result = rag.add_paper_stream(f"Synthetic paper {seed}", lambda: _document(n_chunks, CHUNK_SIZE, seed))
+        gc.collect()
+        after, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        if result['status'] != 'success':
+            raise SystemExit(f"Ingest failed: {result['message']}")
+
+        transient = peak - after
+        transients.append(transient)
+        print(f"{result['chunks']:>8}{text_bytes / 2**20:>10.1f}{transient / 2**20:>14.1f}"
+              f"{(after - before) / 2**20:>13.1f}")
+    rag.close()
+
+    growth = transients[-1] / transients[0]
+    print(f"Transient peak grew {growth:.2f}x for a {args.batches[-1] / args.batches[0]:.0f}x larger document")
+    if growth > args.tolerance:
+        raise SystemExit(f"Ingest memory grows with the document (more than {args.tolerance}x)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+import os
+import sys
+import time
+import random
+import socket
+import asyncio
+import argparse
+import statistics
+import subprocess
+from pathlib import Path
+import httpx
+import pandas as pd
+
+# Compares the sync Flask app under gunicorn sync workers with the ASGI app under
+# uvicorn, both with the same number of worker processes and backed by the stub
+# LLM and fake embeddings.
+#
+#   python benchmarks/serving_benchmark.py --requests 400 --concurrency 100 --latency 0.5
+
+BENCH_DIR = Path(__file__).resolve().parent
+BACKEND_DIR = BENCH_DIR.parent
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def _server_command(mode: str, port: int, workers: int):
+    if mode == "sync":
+        return [sys.executable, "-m", "gunicorn", "-w", str(workers), "-b", f"127.0.0.1:{port}",
+                "--timeout", "300", "--chdir", str(BENCH_DIR), "stub_backend:flask_app"]
+    return [sys.executable, "-m", "uvicorn", "stub_backend:app", "--app-dir", str(BENCH_DIR),
+            "--host", "127.0.0.1", "--port", str(port), "--workers", str(workers), "--log-level", "warning"]
+
+async def _login(base_url: str, timeout: float = 120.0) -> str:
+    deadline = time.time() + timeout
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        while True:
+            try:
+                response = await client.post("/login", json={"username": "admin", "password": "password123"})
+                return response.json()["access_token"]
+            except (httpx.TransportError, KeyError, ValueError):
+                if time.time() > deadline:
+                    raise RuntimeError(f"Server at {base_url} did not come up")
+                await asyncio.sleep(0.5)
+
+async def _load(base_url: str, token: str, rows, n_requests: int, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, errors = [], 0
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=300, limits=limits,
+                                 headers={"Authorization": f"Bearer {token}"}) as client:
+        async def one(i):
+            nonlocal errors
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.post("/predict", json=rows[i % len(rows)])
+                latencies.append(time.perf_counter() - start)
+                if response.status_code != 200:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(n_requests)))
+        elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "throughput": n_requests / elapsed,
+        "p50": statistics.median(latencies),
+        "p95": latencies[int(0.95 * (len(latencies) - 1))],
+        "max": latencies[-1],
+        "errors": errors,
+        "elapsed": elapsed
+    }
+
+def run_mode(mode: str, args, rows, env) -> dict:
+    port = _free_port()
+    server = subprocess.Popen(_server_command(mode, port, args.workers), env=env, cwd=BACKEND_DIR,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        token = asyncio.run(_login(base_url))
+        # Warm up model loading and the retrieval cache outside the measurement
+        asyncio.run(_load(base_url, token, rows, min(20, args.requests), min(4, args.concurrency)))
+        return asyncio.run(_load(base_url, token, rows, args.requests, args.concurrency))
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.5, help="Stub LLM latency in seconds")
+    parser.add_argument("--workers", type=int, default=1, help="Server worker processes, the same for both modes")
+    parser.add_argument("--modes", default="sync,async")
+    args = parser.parse_args()
+
+    env = dict(os.environ, LLM_FAKE_LATENCY=str(args.latency))
+    env.setdefault("BENCH_WORKDIR", str(Path(os.environ.get("TMPDIR", "/tmp")) / f"ctg-bench-{os.getpid()}"))
+    subprocess.run([sys.executable, "-c", "import stub_backend; stub_backend.seed()"],
+                   env=env, cwd=BENCH_DIR, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    features = pd.read_csv(BACKEND_DIR / "data" / "test.csv")
+    rows = features.drop(columns=["fetal_health"], errors="ignore").to_dict(orient="records")
+    random.Random(0).shuffle(rows)
+
+    print(f"{args.requests} requests, concurrency {args.concurrency}, stub LLM latency {args.latency}s, "
+          f"{os.cpu_count()} CPU(s)")
+    print(f"{'mode':<32}{'req/s':>8}{'p50 s':>8}{'p95 s':>8}{'max s':>8}{'errors':>8}")
+    for mode in args.modes.split(","):
+        result = run_mode(mode, args, rows, env)
+        label = f"sync (gunicorn -w {args.workers})" if mode == "sync" else f"async (uvicorn --workers {args.workers})"
+        print(f"{label:<32}{result['throughput']:>8.1f}{result['p50']:>8.2f}{result['p95']:>8.2f}"
+              f"{result['max']:>8.2f}{result['errors']:>8}")
+
+if __name__ == "__main__":
+    main()
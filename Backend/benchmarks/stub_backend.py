@@ -0,0 +1,42 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# Backend wired to local stand-ins for benchmarking: deterministic fake embeddings,
+# the stub chat model and throwaway stores. Import before app/asgi_app.
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+work_dir = os.environ.setdefault("BENCH_WORKDIR", tempfile.mkdtemp(prefix="ctg-bench-"))
+os.makedirs(work_dir, exist_ok=True)
+os.environ.setdefault("OPENAI_API_KEY", "stub")
+os.environ.setdefault("LLM_BACKEND", "fake")
+os.environ.setdefault("LLM_FAKE_LATENCY", "0.5")
+os.environ.setdefault("EXPLANATION_CACHE_BACKEND", "off")
+os.environ.setdefault("PAPERS_DB_PATH", os.path.join(work_dir, "papers_db"))
+os.environ.setdefault("EMBEDDING_CACHE_PATH", os.path.join(work_dir, "embedding_cache.sqlite"))
+os.environ.setdefault("EMBEDDING_BACKEND", "fake")
+os.environ.setdefault("JOB_STORE_PATH", os.path.join(work_dir, "jobs.sqlite"))
+os.environ.setdefault("EXPLANATION_JOB_STORE_PATH", os.path.join(work_dir, "explanation_jobs.sqlite"))
+sys.path.insert(0, str(BACKEND_DIR))
+
+import app as backend
+import asgi_app
+
+# All load comes from one client address, which the per-client rate limit would throttle
+backend.limiter.enabled = False
+
+flask_app = backend.app
+app = asgi_app.app
+
+SEED_TEXT = (
+    "Cardiotocography records the fetal heart rate baseline value, accelerations and "
+    "decelerations alongside uterine contractions. Reduced short term variability and "
+    "prolonged decelerations are associated with fetal compromise. "
+)
+
+def seed(n_papers: int = 20):
+    """Fill the throwaway store with synthetic papers so retrieval has work to do"""
+    for i in range(n_papers):
+        backend.paper_rag.add_custom_paper(f"Synthetic CTG paper {i}", f"{SEED_TEXT * 30} Paper {i}.")
+    backend.paper_rag.close()
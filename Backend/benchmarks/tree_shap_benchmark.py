@@ -0,0 +1,70 @@
+import sys
+import time
+import pickle
+import argparse
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import shap
+import yaml
+
+BACKEND = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND))
+from tree_shap import TreeShap
+
+# Per-row attribution time of the native TreeSHAP against shap.TreeExplainer on
+# the trained forest, with the largest difference between the two as a check.
+# Rows are resampled from data/test.csv.
+#
+#   python benchmarks/tree_shap_benchmark.py --rows 1,100,10000
+
+def _timed(fn, repeats: int):
+    best, result = None, None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare native TreeSHAP with shap.TreeExplainer")
+    parser.add_argument("--model", default=str(BACKEND / "train_model" / "best_random_forest.pkl"))
+    parser.add_argument("--data", default=str(BACKEND / "data" / "test.csv"))
+    parser.add_argument("--rows", default="1,100,10000")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--skip-shap-above", type=int, default=1000,
+                        help="Time shap on a sample of this many rows for larger sizes and extrapolate")
+    args = parser.parse_args()
+
+    with open(args.model, "rb") as f:
+        model = pickle.load(f)
+    with open(BACKEND / "configs" / "selected_columns.yaml") as f:
+        feature_names = [c for c in yaml.safe_load(f)["selected_columns"] if c != "fetal_health"]
+    data = pd.read_csv(args.data)[feature_names].astype(float)
+
+    build_shap, reference = _timed(lambda: shap.TreeExplainer(model), 1)
+    build_native, native = _timed(lambda: TreeShap(model), 1)
+    print(f"{len(model.estimators_)} trees, {model.n_features_in_} features, {len(model.classes_)} classes")
+    print(f"explainer build: shap {build_shap:.2f} s, native {build_native:.2f} s")
+    print(f"{'rows':>6} {'shap ms/row':>12} {'native ms/row':>14} {'top-3 ms/row':>13} {'speedup':>8} {'max |diff|':>11}")
+
+    for n_rows in (int(n) for n in args.rows.split(",")):
+        X = data.sample(n=n_rows, replace=True, random_state=0).reset_index(drop=True)
+        repeats = args.repeats if n_rows <= args.skip_shap_above else 1
+
+        shap_rows = X if n_rows <= args.skip_shap_above else X.iloc[:args.skip_shap_above]
+        shap_time, expected = _timed(lambda: reference.shap_values(shap_rows), repeats)
+        shap_per_row = shap_time / len(shap_rows) * 1000
+
+        native_time, values = _timed(lambda: native.shap_values(X), repeats)
+        class_idx = np.argmax(model.predict_proba(X), axis=1)
+        top_time, _ = _timed(lambda: native.top_k(X, class_idx, k=3), repeats)
+
+        max_diff = np.abs(values[:len(shap_rows)] - expected).max()
+        native_per_row = native_time / n_rows * 1000
+        print(f"{n_rows:>6} {shap_per_row:>12.2f} {native_per_row:>14.2f} {top_time / n_rows * 1000:>13.2f} "
+              f"{shap_per_row / native_per_row:>7.1f}x {max_diff:>11.1e}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+import re
+import math
+import heapq
+from collections import Counter
+from typing import Dict, Iterable, List, Tuple
+
+# Frequent English words that would match nearly every chunk
+STOPWORDS = frozenset("""
+a about above after again against all also am an and any are as at be because been before being below
+between both but by can could did do does doing down during each few for from further had has have
+having he her here hers him his how i if in into is it its itself just may me might more most must my
+no nor not of off on once only or other our ours out over own same she should so some such than that
+the their theirs them then there these they this those through to too under until up upon us very was
+we were what when where which while who whom why will with within without would you your yours
+""".split())
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase alphanumeric terms without stopwords; a trailing plural 's' is dropped"""
+    terms = []
+    for term in _TOKEN.findall(text.lower()):
+        if len(term) < 2 or term in STOPWORDS:
+            continue
+        if len(term) > 3 and term.endswith("s") and not term.endswith("ss"):
+            term = term[:-1]
+        terms.append(term)
+    return terms
+
+class BM25Index:
+    """In-memory BM25 inverted index over chunk text
+
+    Postings map term -> {doc id: term frequency}. Each document's term counts
+    are kept so removal touches only its own postings, and the corpus totals are
+    updated as documents come and go, so nothing is ever rebuilt in bulk. The
+    caller serializes mutations against searches (paperRag holds the store lock).
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, Dict[str, int]] = {}
+        self._doc_terms: Dict[str, Counter] = {}
+        self._doc_lengths: Dict[str, int] = {}
+        self._total_length = 0
+
+    def __len__(self) -> int:
+        return len(self._doc_lengths)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self._doc_lengths
+
+    def add(self, doc_id: str, text: str):
+        """Index a document, replacing any earlier text stored under the same id"""
+        if doc_id in self._doc_lengths:
+            self.remove(doc_id)
+        terms = tokenize(text)
+        counts = Counter(terms)
+        for term, count in counts.items():
+            self._postings.setdefault(term, {})[doc_id] = count
+        self._doc_terms[doc_id] = counts
+        self._doc_lengths[doc_id] = len(terms)
+        self._total_length += len(terms)
+
+    def add_many(self, docs: Iterable[Tuple[str, str]]):
+        for doc_id, text in docs:
+            self.add(doc_id, text)
+
+    def remove(self, doc_id: str):
+        counts = self._doc_terms.pop(doc_id, None)
+        if counts is None:
+            return
+        for term in counts:
+            postings = self._postings[term]
+            del postings[doc_id]
+            if not postings:
+                del self._postings[term]
+        self._total_length -= self._doc_lengths.pop(doc_id)
+
+    def clear(self):
+        self._postings.clear()
+        self._doc_terms.clear()
+        self._doc_lengths.clear()
+        self._total_length = 0
+
+    def search(self, query: str, k: int = 10) -> List[Tuple[str, float]]:
+        """Return up to k (doc id, BM25 score) pairs, best first; only documents sharing a term score"""
+        n_docs = len(self._doc_lengths)
+        if not n_docs:
+            return []
+        avg_length = self._total_length / n_docs or 1.0
+
+        scores: Dict[str, float] = {}
+        for term in set(tokenize(query)):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_id, tf in postings.items():
+                norm = self.k1 * (1 - self.b + self.b * self._doc_lengths[doc_id] / avg_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+    def stats(self) -> Dict:
+        return {
+            'documents': len(self._doc_lengths),
+            'terms': len(self._postings),
+            'average_length': round(self._total_length / len(self._doc_lengths), 1) if self._doc_lengths else 0.0
+        }
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """Fuse ranked id lists by summing 1 / (k + rank); returns (id, fused score), best first"""
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
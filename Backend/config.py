@@ -11,8 +11,91 @@ OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 MODEL_NAME = "gpt-4-turbo-preview"
 TEMPERATURE = 0.5
 MAX_TOKENS = 1000
+LLM_BACKEND = os.getenv("LLM_BACKEND", "openai")  # "openai" or "fake" (local canned stand-in for tests)
+LLM_FAKE_LATENCY = float(os.getenv("LLM_FAKE_LATENCY", "0"))  # Seconds the fake model waits before answering
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))  # Seconds per LLM request, and per wait for a free slot
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))  # Retries with exponential backoff on 429/5xx/connection errors
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))  # In-flight LLM calls per process (also the pool size)
 
 # RAG Settings
 CHUNK_SIZE = 1000
 CHUNK_OVERLAP = 200
-TOP_K_RESULTS = 3 
\ No newline at end of file
+TOP_K_RESULTS = 3
+RETRIEVAL_CACHE_SIZE = 2048  # Cached feature-query retrievals (11 features give 990 ordered top-3 combinations)
+RETRIEVAL_CACHE_PREWARM = os.getenv("RETRIEVAL_CACHE_PREWARM", "false").lower() == "true"  # Fill the cache at startup
+SEARCH_MODE = os.getenv("SEARCH_MODE", "hybrid")  # Default /papers/search ranking: "hybrid", "keyword" (BM25 only) or "vector"
+BM25_K1 = 1.5  # Term-frequency saturation
+BM25_B = 0.75  # Chunk-length normalization
+RRF_K = 60  # Reciprocal rank fusion constant; larger flattens the rank weighting
+
+# Embedding Settings
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "openai")  # "openai", "local" (CPU hashed n-grams, works offline) or "fake"
+EMBEDDING_MODEL = "text-embedding-ada-002"
+EMBEDDING_DIMENSION = 1536  # Vector size of EMBEDDING_MODEL (and of the fake backend)
+LOCAL_EMBEDDING_DIMENSION = int(os.getenv("LOCAL_EMBEDDING_DIMENSION", "1024"))  # Hash buckets for the local backend
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH")  # Defaults to Backend/embedding_cache.sqlite
+EMBEDDING_CACHE_MAX_ENTRIES = 200000
+
+# arXiv Ingestion
+ARXIV_API_URL = os.getenv("ARXIV_API_URL", "http://export.arxiv.org/api/query")  # Point at a fixture server in tests
+ARXIV_MIN_INTERVAL = float(os.getenv("ARXIV_MIN_INTERVAL", "3"))  # Seconds between request starts (arXiv API terms)
+ARXIV_MAX_WORKERS = 4  # Concurrent arXiv queries / pooled connections
+ARXIV_TIMEOUT = 30  # Seconds per arXiv request
+ARXIV_MAX_RETRIES = 3  # Retries with backoff on 429/5xx and connection errors
+INGEST_BATCH_SIZE = 256  # Max texts per embedding request, each committed to FAISS as one insert
+INGEST_BATCH_TOKENS = int(os.getenv("INGEST_BATCH_TOKENS", "100000"))  # Max tokens per embedding request
+INGEST_EMBED_CONCURRENCY = int(os.getenv("INGEST_EMBED_CONCURRENCY", "4"))  # Embedding requests in flight
+INGEST_EMBED_RETRIES = 3  # Retries with backoff for a failed embedding batch
+
+# Bulk Upload (/papers/upload/bulk)
+BULK_EXTRACT_WORKERS = int(os.getenv("BULK_EXTRACT_WORKERS", "2"))  # Extraction processes per bulk upload
+BULK_EXTRACT_TIMEOUT = float(os.getenv("BULK_EXTRACT_TIMEOUT", "120"))  # Seconds allowed per file
+BULK_UPLOAD_MAX_FILES = 1000  # Documents accepted per request, counting zip members
+BULK_UPLOAD_MAX_BYTES = 4 * 1024 * 1024 * 1024  # Total uncompressed size accepted from zip archives
+
+# Paper Jobs (?async=1 on upload, download, refresh and remove-duplicates)
+JOB_STORE_PATH = os.getenv("JOB_STORE_PATH")  # Defaults to Backend/jobs.sqlite
+JOB_WORKERS = 1  # Jobs run one at a time so index mutations never interleave
+JOB_QUEUE_SIZE = 32  # Queued + running jobs per process before submissions get 503
+JOB_TTL = 7 * 86400  # Seconds a finished job stays in the store
+JOB_EVENTS_INTERVAL = 0.5  # Seconds between progress writes and between SSE polls of the store
+
+# Vector Store Persistence
+PAPERS_DB_PATH = os.getenv("PAPERS_DB_PATH")  # Defaults to Backend/papers_db
+STORE_FLUSH_INTERVAL = float(os.getenv("STORE_FLUSH_INTERVAL", "5"))  # Seconds between background snapshot flushes
+STORE_COMPACT_RATIO = float(os.getenv("STORE_COMPACT_RATIO", "0.25"))  # Flushes append segments until they add or remove this fraction of the snapshot's chunks, then rewrite it
+STORE_MAX_SEGMENTS = 32  # Segments on a snapshot before the next flush rewrites it
+
+# Vector Index (rebuild_index.py or POST /papers/index/rebuild switches an existing store)
+FAISS_INDEX_TYPE = os.getenv("FAISS_INDEX_TYPE", "flat")  # "flat", "hnsw", "ivf" or "ivfpq"
+HNSW_M = 32  # Graph neighbours per node
+HNSW_EF_CONSTRUCTION = 200
+HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", "64"))  # Candidate list size per search (recall vs latency)
+IVF_NLIST = int(os.getenv("IVF_NLIST", "0"))  # Inverted lists; 0 picks about 4*sqrt(n) at rebuild
+IVF_NPROBE = int(os.getenv("IVF_NPROBE", "16"))  # Lists scanned per search (recall vs latency)
+PQ_M = 64  # Sub-quantizers per vector; must divide the embedding dimension (1536 for ada-002)
+PQ_NBITS = 8  # Bits per sub-quantizer code
+
+# Vector Storage
+VECTOR_STORAGE = os.getenv("VECTOR_STORAGE", "faiss")  # "faiss" (in-memory FAISS_INDEX_TYPE index) or "mmap" (memory-mapped float32 matrix, exact search)
+MMAP_SEARCH_BLOCK_ROWS = 16384  # Vectors scored per block when searching mmap storage
+
+# Explanation Settings
+PREDICT_BATCH_SIZE = 1000  # Rows scored per predict_proba/TreeSHAP call in /predict/batch
+FOREST_ENGINE = os.getenv("FOREST_ENGINE", "sklearn")  # "sklearn" or "compiled" (flat node arrays, no joblib workers)
+EXPLANATION_WORKERS = int(os.getenv("EXPLANATION_WORKERS", "4"))  # Background threads for /predict/async explanations
+EXPLANATION_QUEUE_SIZE = 64  # Queued + running explanation jobs before /predict/async returns 503
+EXPLANATION_JOB_TTL = 600  # Seconds a finished explanation job stays fetchable
+EXPLANATION_MAX_WAIT = 30  # Longest long-poll allowed on /predict/<job_id>/explanation
+EXPLANATION_JOB_STORE_PATH = os.getenv("EXPLANATION_JOB_STORE_PATH")  # Defaults to Backend/explanation_jobs.sqlite
+EXPLANATION_POLL_INTERVAL = 0.5  # Seconds between store reads while long-polling another worker's job
+EXPLANATION_MAX_WAITERS = 32  # Concurrent long-polls per process; beyond this ?wait= returns at once
+EXPLANATION_CACHE_BACKEND = os.getenv("EXPLANATION_CACHE_BACKEND", "memory")  # "memory", "sqlite" or "off"
+EXPLANATION_CACHE_PATH = os.getenv("EXPLANATION_CACHE_PATH")  # Defaults to Backend/explanation_cache.sqlite
+EXPLANATION_CACHE_MAX_ENTRIES = 10000
+EXPLANATION_CACHE_TTL = 86400  # Seconds a cached explanation stays valid
+EXPLANATION_CACHE_PROB_BUCKET = 0.05  # Width of the probability buckets in the cache key
+
+# ASGI Serving (asgi_app.py)
+ASGI_CPU_WORKERS = int(os.getenv("ASGI_CPU_WORKERS", str(os.cpu_count() or 1)))  # Threads for SHAP/forest work
+ASGI_WSGI_THREADS = int(os.getenv("ASGI_WSGI_THREADS", "10"))  # Threads serving the mounted Flask routes
@@ -0,0 +1,196 @@
+import csv
+import signal
+import hashlib
+import threading
+import multiprocessing
+import docx
+import PyPDF2
+from typing import Dict, Iterable, Iterator, List
+from PyPDF2.errors import PdfReadError
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from config import CHUNK_SIZE, CHUNK_OVERLAP
+
+# Text is produced a page / paragraph / row at a time so no document is ever held
+# in memory whole. Each block keeps the trailing newline the old extractors added,
+# so the concatenated text (and therefore the paper hash) is unchanged.
+
+TEXT_BLOCK_SIZE = 64 * 1024
+
+def iter_pdf_text(file_path: str) -> Iterator[str]:
+    try:
+        with open(file_path, 'rb') as file:
+            pdf_reader = PyPDF2.PdfReader(file)
+            for page in pdf_reader.pages:
+                yield page.extract_text() + "\n"
+    except PdfReadError:
+        raise ValueError("Invalid or corrupt PDF file.")
+
+def iter_docx_text(file_path: str) -> Iterator[str]:
+    doc = docx.Document(file_path)
+    for paragraph in doc.paragraphs:
+        yield paragraph.text + "\n"
+
+def iter_csv_text(file_path: str) -> Iterator[str]:
+    with open(file_path, 'r', encoding='utf-8') as file:
+        csv_reader = csv.reader(file)
+        for row in csv_reader:
+            yield " ".join(row) + "\n"
+
+def iter_txt_text(file_path: str) -> Iterator[str]:
+    with open(file_path, 'r', encoding='utf-8') as file:
+        while True:
+            block = file.read(TEXT_BLOCK_SIZE)
+            if not block:
+                break
+            yield block
+
+def iter_document_text(file_path: str, file_ext: str) -> Iterator[str]:
+    """Yield a document's text incrementally, dispatching on its extension"""
+    if file_ext == 'pdf':
+        return iter_pdf_text(file_path)
+    if file_ext in ['doc', 'docx']:
+        return iter_docx_text(file_path)
+    if file_ext == 'csv':
+        return iter_csv_text(file_path)
+    if file_ext == 'txt':
+        return iter_txt_text(file_path)
+    raise ValueError(f"Unsupported file type: {file_ext}")
+
+def iter_chunks(blocks: Iterable[str], chunk_size: int, chunk_overlap: int,
+                buffer_size: int = None) -> Iterator[str]:
+    """Split a stream of text blocks into chunks, holding at most ~buffer_size characters
+
+    Once the buffer fills it is split and every chunk but the last is emitted; the
+    last one is carried into the next buffer so chunk boundaries still follow the
+    text rather than the block boundaries.
+    """
+    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    buffer_size = buffer_size or chunk_size * 8
+    parts = []
+    size = 0
+
+    for block in blocks:
+        parts.append(block)
+        size += len(block)
+        if size < buffer_size:
+            continue
+
+        chunks = splitter.split_text("".join(parts))
+        yield from chunks[:-1]
+        parts = chunks[-1:]
+        size = sum(len(part) for part in parts)
+
+    tail = "".join(parts)
+    if tail.strip():
+        yield from splitter.split_text(tail)
+
+# === Bulk Extraction ===
+# PyPDF2 is pure Python and holds the GIL, so bulk uploads are extracted and split
+# in worker processes; only the finished chunks come back to the server process.
+
+def _on_timeout(signum, frame):
+    raise TimeoutError("Extraction timed out")
+
+def prepare_document(job: Dict) -> Dict:
+    """Extract, hash and split one file inside a pool worker
+
+    Never raises: failures are returned as {'error': ...} so one bad file cannot
+    fail the batch. The per-file timeout is enforced in the worker with SIGALRM.
+    """
+    result = {'file': job['file'], 'title': job['title']}
+    timer = hasattr(signal, 'setitimer') and job.get('timeout')
+    if timer:
+        signal.signal(signal.SIGALRM, _on_timeout)
+        signal.setitimer(signal.ITIMER_REAL, job['timeout'])
+    try:
+        digest = hashlib.md5(job['title'].encode('utf-8'))
+
+        def hashed(blocks):
+            for block in blocks:
+                digest.update(block.encode('utf-8'))
+                yield block
+
+        chunks = list(iter_chunks(
+            hashed(iter_document_text(job['path'], job['ext'])),
+            job['chunk_size'],
+            job['chunk_overlap']
+        ))
+        if not chunks:
+            raise ValueError("Invalid file type or empty file")
+        result.update(hash=digest.hexdigest(), chunks=chunks)
+    except Exception as e:
+        result['error'] = str(e) or type(e).__name__
+    finally:
+        if timer:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+    return result
+
+def _collect(job: Dict, async_result, timeout: float) -> Dict:
+    try:
+        return async_result.get(timeout=timeout)
+    except multiprocessing.TimeoutError:
+        return {'file': job['file'], 'title': job['title'], 'error': "Extraction timed out"}
+    except Exception as e:
+        return {'file': job['file'], 'title': job['title'], 'error': str(e)}
+
+class ExtractionPool:
+    """Worker processes for bulk upload extraction, started on the first upload
+
+    Workers are forked by a forkserver that has imported only this module, so
+    they are cheap to start from the threaded server and never inherit a lock
+    another server thread held at the moment of the fork. The forkserver
+    re-imports the entry module in each worker, which is harmless under
+    gunicorn and uvicorn; `method='fork'` is for entry modules it is not.
+
+    Each upload gets a pool sized to its files, terminated once it is done. A
+    worker stuck where its alarm cannot reach (in C code) is killed with its
+    pool after a grace period, and the files still waiting are rerun in a
+    fresh one.
+    """
+
+    def __init__(self, workers: int, method: str = None, grace: float = 5.0):
+        self.workers = workers
+        self.method = method or ('forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else None)
+        self.grace = grace
+        self._context = None
+        self._lock = threading.Lock()
+
+    def _get_context(self):
+        with self._lock:
+            if self._context is None:
+                self._context = multiprocessing.get_context(self.method)
+                if self.method == 'forkserver':
+                    self._context.set_forkserver_preload([__name__])
+            return self._context
+
+    def prepare(self, jobs: List[Dict], timeout: float) -> List[Dict]:
+        """Run prepare_document over many files, in submission order
+
+        Each job holds file, title, path and ext. Workers stop themselves after
+        `timeout`; a result that still has not arrived `grace` seconds later is
+        reported as timed out.
+        """
+        for job in jobs:
+            job.update(timeout=timeout, chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+
+        results = {}
+        remaining = list(range(len(jobs)))
+        while remaining:
+            pool = self._get_context().Pool(processes=max(1, min(self.workers, len(remaining))))
+            try:
+                pending = [(i, pool.apply_async(prepare_document, (jobs[i],))) for i in remaining]
+                remaining = []
+                for position, (i, async_result) in enumerate(pending):
+                    results[i] = _collect(jobs[i], async_result, timeout + self.grace)
+                    if results[i].get('error') == "Extraction timed out" and not async_result.ready():
+                        # The worker ignored its alarm; keep what already finished and rerun the rest
+                        for j, later in pending[position + 1:]:
+                            if later.ready():
+                                results[j] = _collect(jobs[j], later, 0)
+                            else:
+                                remaining.append(j)
+                        break
+            finally:
+                pool.terminate()
+                pool.join()
+        return [results[i] for i in range(len(jobs))]
@@ -0,0 +1,112 @@
+import zlib
+import numpy as np
+from typing import Dict, List, Optional
+from langchain_core.embeddings import DeterministicFakeEmbedding, Embeddings
+from langchain_openai import OpenAIEmbeddings
+from bm25_index import tokenize
+from config import (OPENAI_API_KEY, EMBEDDING_BACKEND, EMBEDDING_MODEL, EMBEDDING_DIMENSION,
+                    LOCAL_EMBEDDING_DIMENSION)
+
+# Embedding backends for the paper store:
+#
+#   openai  EMBEDDING_MODEL through the OpenAI API
+#   local   hashed word and character n-grams on the CPU; no network, no fitting
+#   fake    deterministic random vectors, for tests and benchmarks
+#
+# A store is only ever searched with the backend that built it: embedding_signature()
+# is saved beside the index and checked when the store is loaded.
+
+EMBEDDING_BACKENDS = ("openai", "local", "fake")
+
+class HashedNgramEmbeddings(Embeddings):
+    """CPU-only embeddings from signed feature hashing of word and character n-grams
+
+    Each text is tokenized like the BM25 index (lowercased, stopwords dropped).
+    Word unigrams and bigrams, and the character 3-5 grams of every word, are
+    hashed with crc32 into `dimension - 1` buckets with a hash-derived sign,
+    weighted, summed and L2-normalized. Character n-grams let inflections and
+    misspellings ("prolongued", "decelerations") land near their stems. Nothing
+    is fitted, so vectors never go stale as the corpus grows, and a query embeds
+    in well under a millisecond.
+
+    The first component is a constant shared by every text, with weight
+    `shared_weight`, so cosine similarity becomes shared + (1 - shared) * cos.
+    Ranking is unchanged, but scores land on the scale of ada-002 (whose vectors
+    share a large common direction too), which the retrieval and search
+    thresholds were tuned on.
+    """
+
+    MODEL_NAME = "hashed-ngram-v1"
+
+    def __init__(self, dimension: int = 1024, char_ngrams=(3, 5), char_weight: float = 0.25,
+                 shared_weight: float = 0.75):
+        self.dimension = dimension
+        self.char_ngrams = char_ngrams
+        self.char_weight = char_weight
+        self.shared_weight = shared_weight
+
+    def _grams(self, text: str):
+        words = tokenize(text)
+        grams = list(words)
+        grams.extend(f"{a} {b}" for a, b in zip(words, words[1:]))
+        weights = [1.0] * len(grams)
+        low, high = self.char_ngrams
+        for word in words:
+            padded = f"<{word}>"
+            for n in range(low, high + 1):
+                for start in range(len(padded) - n + 1):
+                    grams.append(f"#{padded[start:start + n]}")
+                    weights.append(self.char_weight)
+        return grams, weights
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.dimension)
+        grams, weights = self._grams(text)
+        if grams:
+            hashes = np.fromiter((zlib.crc32(gram.encode('utf-8')) for gram in grams), dtype=np.uint32,
+                                 count=len(grams))
+            # The low bits pick the bucket and the top bit the sign, so collisions cancel out on average
+            signs = np.where(hashes >> 31, 1.0, -1.0)
+            vector[1:] = np.bincount(hashes % (self.dimension - 1), weights=signs * np.asarray(weights),
+                                     minlength=self.dimension - 1)
+        norm = np.linalg.norm(vector)
+        if norm:
+            vector *= np.sqrt(1 - self.shared_weight) / norm
+        vector[0] = np.sqrt(self.shared_weight)
+        return vector.tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+    def lookup_documents(self, texts: List[str]) -> List[Optional[List[float]]]:
+        """Exact vectors for stored texts; recomputing is cheaper than any cache"""
+        return self.embed_documents(texts)
+
+def embedding_signature(backend: str = EMBEDDING_BACKEND) -> Dict:
+    """Identify the vectors a backend produces: {'backend', 'model', 'dimension'}"""
+    if backend == "openai":
+        return {'backend': backend, 'model': EMBEDDING_MODEL, 'dimension': EMBEDDING_DIMENSION}
+    if backend == "local":
+        return {'backend': backend, 'model': HashedNgramEmbeddings.MODEL_NAME, 'dimension': LOCAL_EMBEDDING_DIMENSION}
+    if backend == "fake":
+        return {'backend': backend, 'model': "deterministic-fake", 'dimension': EMBEDDING_DIMENSION}
+    raise ValueError(f"Unknown embedding backend: {backend} (expected one of {', '.join(EMBEDDING_BACKENDS)})")
+
+def build_embeddings(backend: str = EMBEDDING_BACKEND) -> Embeddings:
+    """Build the embeddings client for EMBEDDING_BACKEND"""
+    signature = embedding_signature(backend)
+    if backend == "local":
+        return HashedNgramEmbeddings(dimension=signature['dimension'])
+    if backend == "fake":
+        return DeterministicFakeEmbedding(size=signature['dimension'])
+    return OpenAIEmbeddings(model=EMBEDDING_MODEL, openai_api_key=OPENAI_API_KEY)
+
+def signature_mismatch(stored: Dict, current: Dict) -> Optional[str]:
+    """Describe why a store built with `stored` cannot be searched with `current`, or None"""
+    differing = [key for key in ('backend', 'model', 'dimension') if stored.get(key) != current[key]]
+    if not differing:
+        return None
+    return ", ".join(f"{key} {stored.get(key)!r} (configured {current[key]!r})" for key in differing)
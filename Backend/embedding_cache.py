@@ -0,0 +1,154 @@
+import hashlib
+import sqlite3
+import threading
+import time
+import numpy as np
+from typing import List, Dict, Optional
+from langchain_core.embeddings import Embeddings
+
+class CachedEmbeddings(Embeddings):
+    """Content-addressed embedding cache in front of an embeddings client
+
+    Vectors are stored as float32 blobs in SQLite keyed by sha256(model, text),
+    with least-recently-used eviction once `max_entries` is exceeded. Queries
+    and documents share the key space, so a chunk that was embedded once is
+    never sent to the embedding service again, whether it is re-indexed or
+    searched for.
+
+    Hits only record their recency in memory; the timestamps are written in one
+    batch once `touch_batch_size` keys are pending, `touch_interval` seconds
+    have passed, or before anything is evicted, so lookups stay reads. The async
+    methods are LangChain's defaults, which run the sync ones in an executor.
+    """
+
+    def __init__(self, embeddings: Embeddings, cache_path: str, model_name: str,
+                 max_entries: int = 200000, touch_batch_size: int = 1000, touch_interval: float = 30.0):
+        self.embeddings = embeddings
+        self.cache_path = cache_path
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.touch_batch_size = touch_batch_size
+        self.touch_interval = touch_interval
+        self.hits = 0
+        self.misses = 0
+        # Key -> last hit time, not yet written to the last_used column
+        self._touched: Dict[str, float] = {}
+        self._touched_since = time.monotonic()
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(cache_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_used ON embeddings (last_used)")
+        self._conn.commit()
+        self._count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model_name}\0{text}".encode('utf-8')).hexdigest()
+
+    def _flush_touched(self):
+        """Write pending hit timestamps; the caller holds the lock"""
+        if self._touched:
+            self._conn.executemany(
+                "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                [(last_used, key) for key, last_used in self._touched.items()]
+            )
+            self._conn.commit()
+            self._touched.clear()
+        self._touched_since = time.monotonic()
+
+    def _lookup(self, keys: List[str]) -> Dict[str, List[float]]:
+        found = {}
+        now = time.time()
+        with self._lock:
+            # Stay well under SQLite's bound-parameter limit
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+                    self._touched[key] = now
+            if (len(self._touched) >= self.touch_batch_size
+                    or time.monotonic() - self._touched_since >= self.touch_interval):
+                self._flush_touched()
+        return found
+
+    def _record(self, hits: int, misses: int):
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+
+    def _store(self, items: Dict[str, List[float]]):
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.executemany(
+                "INSERT OR IGNORE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+                [(key, np.asarray(vector, dtype=np.float32).tobytes(), now) for key, vector in items.items()]
+            )
+            self._count += max(cursor.rowcount, 0)
+            if self._count > self.max_entries:
+                # Evict by up-to-date recency
+                self._flush_touched()
+                overflow = self._count - self.max_entries
+                self._conn.execute(
+                    "DELETE FROM embeddings WHERE key IN "
+                    "(SELECT key FROM embeddings ORDER BY last_used ASC LIMIT ?)",
+                    (overflow,)
+                )
+                self._count -= overflow
+            self._conn.commit()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [self._key(text) for text in texts]
+        found = self._lookup(list(set(keys)))
+
+        # Embed each missing text once, even if it repeats within the batch
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in missing:
+                missing[key] = text
+        self._record(len(texts) - len(missing), len(missing))
+
+        if missing:
+            vectors = self.embeddings.embed_documents(list(missing.values()))
+            new_items = dict(zip(missing.keys(), vectors))
+            self._store(new_items)
+            # Serve fresh vectors at the same float32 precision as cached ones
+            for key, vector in new_items.items():
+                found[key] = np.asarray(vector, dtype=np.float32).tolist()
+
+        return [found[key] for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        key = self._key(text)
+        found = self._lookup([key])
+        if key in found:
+            self._record(1, 0)
+            return found[key]
+
+        self._record(0, 1)
+        vector = self.embeddings.embed_query(text)
+        self._store({key: vector})
+        return np.asarray(vector, dtype=np.float32).tolist()
+
+    def lookup_documents(self, texts: List[str]) -> List[Optional[List[float]]]:
+        """Return cached vectors without embedding anything; None where a text is not cached"""
+        keys = [self._key(text) for text in texts]
+        found = self._lookup(list(set(keys)))
+        return [found.get(key) for key in keys]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'entries': self._count,
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses
+            }
@@ -0,0 +1,157 @@
+import json
+import math
+import time
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+class MemoryBackend:
+    """In-process LRU store of (expires_at, value) pairs"""
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str, ttl: float):
+        with self._lock:
+            self._entries[key] = (time.time() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+class SQLiteBackend:
+    """On-disk LRU store shared across workers and restarts"""
+
+    def __init__(self, path: str, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS explanations ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_explanations_last_used ON explanations (last_used)")
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM explanations WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, expires_at = row
+            if expires_at < now:
+                self._conn.execute("DELETE FROM explanations WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute("UPDATE explanations SET last_used = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            return value
+
+    def set(self, key: str, value: str, ttl: float):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO explanations (key, value, expires_at, last_used) VALUES (?, ?, ?, ?)",
+                (key, value, now + ttl, now)
+            )
+            self._conn.execute(
+                "DELETE FROM explanations WHERE key IN (SELECT key FROM explanations "
+                "ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+            self._conn.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM explanations").fetchone()[0]
+
+class ExplanationCache:
+    """Caches generated explanations by a quantized prediction signature
+
+    Two predictions share an entry when they have the same label, the same
+    probability bucket, the same ordered top features with the same SHAP signs,
+    and retrieved the same chunks under the same prompt version.
+    """
+
+    def __init__(self, backend, ttl: float = 86400, prob_bucket: float = 0.05):
+        self.backend = backend
+        self.ttl = ttl
+        self.prob_bucket = prob_bucket
+        self.hits = 0
+        self.misses = 0
+        self._stats_lock = threading.Lock()
+
+    def make_key(self, prediction_info: Dict, retrieved_docs: List, prompt_version: str) -> str:
+        chunk_ids = [
+            getattr(doc, 'id', None) or hashlib.sha256(doc.page_content.encode('utf-8')).hexdigest()
+            for doc in retrieved_docs
+        ]
+        signature = {
+            'label': prediction_info['predicted_label'],
+            'prob_bucket': math.floor(float(prediction_info['predicted_probability']) / self.prob_bucket),
+            'features': list(prediction_info['top_features']),
+            'signs': ['+' if value >= 0 else '-' for value in prediction_info['top_shap_values']],
+            'chunks': chunk_ids,
+            'prompt_version': prompt_version
+        }
+        return hashlib.sha256(json.dumps(signature).encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        value = self.backend.get(key)
+        with self._stats_lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, key: str, value: str):
+        self.backend.set(key, value, self.ttl)
+
+    def stats(self) -> Dict:
+        with self._stats_lock:
+            hits, misses = self.hits, self.misses
+        lookups = hits + misses
+        return {
+            'backend': type(self.backend).__name__,
+            'entries': len(self.backend),
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / lookups if lookups else 0.0,
+            'ttl': self.ttl
+        }
+
+def build_explanation_cache(backend: str, path: str, max_entries: int, ttl: float,
+                            prob_bucket: float) -> Optional[ExplanationCache]:
+    """Build the cache for EXPLANATION_CACHE_BACKEND ("memory", "sqlite" or "off")"""
+    if backend == "off":
+        return None
+    if backend == "sqlite":
+        store = SQLiteBackend(path, max_entries=max_entries)
+    elif backend == "memory":
+        store = MemoryBackend(max_entries=max_entries)
+    else:
+        raise ValueError(f"Unknown explanation cache backend: {backend}")
+    return ExplanationCache(store, ttl=ttl, prob_bucket=prob_bucket)
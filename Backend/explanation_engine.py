@@ -0,0 +1,102 @@
+import os
+import pickle
+import logging
+import threading
+import numpy as np
+import pandas as pd
+import yaml
+from pathlib import Path
+from forest_engine import CompiledForest
+from tree_shap import TreeShap
+from train_model.export_forest import export_forest
+
+logger = logging.getLogger(__name__)
+
+class ExplanationEngine:
+    """Keeps the model and its TreeSHAP explainer resident between requests"""
+
+    def __init__(self, model_path, config_path, forest_engine="sklearn"):
+        if forest_engine not in ("sklearn", "compiled"):
+            raise ValueError(f"Unknown forest engine: {forest_engine}")
+        self.model_path = str(model_path)
+        self.config_path = str(config_path)
+        self.forest_engine = forest_engine
+
+        self.model = None
+        self.predictor = None
+        self.explainer = None
+        self.feature_names = []
+        self._model_mtime = None
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+
+        with open(self.config_path, "r") as f:
+            selected_features = yaml.safe_load(f)["selected_columns"]
+        self.feature_names = [c for c in selected_features if c != "fetal_health"]
+
+        self.reload()
+
+    def _load_compiled_forest(self, model, model_mtime) -> CompiledForest:
+        """Load the exported node arrays, re-exporting when they are older than the pickle"""
+        export_path = Path(self.model_path).with_suffix(".npz")
+        if not export_path.exists() or export_path.stat().st_mtime < model_mtime:
+            export_forest(model, export_path)
+        return CompiledForest(export_path)
+
+    def reload(self):
+        """Reload the model pickle and rebuild the TreeSHAP explainer"""
+        mtime = os.path.getmtime(self.model_path)
+        with open(self.model_path, "rb") as f:
+            model = pickle.load(f)
+        explainer = TreeShap(model)
+        if self.forest_engine == "compiled":
+            predictor = self._load_compiled_forest(model, mtime)
+        else:
+            predictor = model
+
+        with self._lock:
+            self.model = model
+            self.predictor = predictor
+            self.explainer = explainer
+            self._model_mtime = mtime
+        logger.info(f"Loaded model ({self.forest_engine} engine) and TreeSHAP explainer from {self.model_path}")
+
+    def reload_if_changed(self) -> bool:
+        """Reload when the model pickle on disk is newer than the resident one"""
+        try:
+            mtime = os.path.getmtime(self.model_path)
+        except OSError:
+            return False
+        if mtime == self._model_mtime:
+            return False
+        with self._reload_lock:
+            # Another request may have reloaded while we waited
+            if mtime == self._model_mtime:
+                return False
+            self.reload()
+        return True
+
+    def current(self):
+        """Return a consistent (predictor, explainer) pair"""
+        with self._lock:
+            return self.predictor, self.explainer
+
+    def explain_batch(self, X: pd.DataFrame, top_k: int = 3) -> list:
+        """Predict and attribute a whole matrix in one predict_proba and one top-k SHAP call"""
+        model, explainer = self.current()
+
+        X = X[self.feature_names].astype(float)
+        probabilities = model.predict_proba(X)
+        class_idx = np.argmax(probabilities, axis=1)
+        top_idx, top_values = explainer.top_k(X, class_idx, k=top_k)
+
+        results = []
+        for i in range(len(X)):
+            results.append({
+                "predicted_class": model.classes_[class_idx[i]].item(),
+                "predicted_probability": float(probabilities[i, class_idx[i]]),
+                "probabilities": dict(zip(model.classes_.tolist(), probabilities[i].tolist())),
+                "top_features": [self.feature_names[j] for j in top_idx[i]],
+                "top_shap_values": top_values[i].tolist()
+            })
+        return results
@@ -0,0 +1,110 @@
+import os
+import time
+import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+from jobs import FINISHED, JobStore
+
+class ExplanationJobs:
+    """Runs explanation generation on a bounded worker pool, tracked by job id
+
+    Job state is kept in a JobStore, so with several server workers any of them
+    can answer for a job another one is running. At most `max_pending` jobs may
+    be queued or running in this process at once; `submit` returns None beyond
+    that so the caller can shed load instead of growing an unbounded backlog.
+    Finished jobs are kept for `ttl` seconds so clients can fetch them.
+
+    `get` long-polls jobs this process runs on an event, and other workers' jobs
+    by reading the store every `poll_interval` seconds. At most `max_waiters`
+    requests wait at once; beyond that `get` answers with the current state.
+    """
+
+    def __init__(self, store_path: str, max_workers: int = 4, max_pending: int = 64, ttl: float = 600.0,
+                 poll_interval: float = 0.5, max_waiters: int = 32):
+        self.store = JobStore(store_path)
+        self.max_pending = max_pending
+        self.ttl = ttl
+        self.poll_interval = poll_interval
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="explanation")
+        self._pending = 0
+        self._running = {}
+        self._waiters = threading.BoundedSemaphore(max_waiters)
+        self._lock = threading.Lock()
+        self.store.interrupt_orphans()
+
+    def submit(self, fn: Callable[[], str]) -> Optional[str]:
+        """Queue `fn` and return its job id, or None if the queue is full"""
+        with self._lock:
+            if self._pending >= self.max_pending:
+                return None
+            self._pending += 1
+        self.store.expire(time.time() - self.ttl)
+
+        job_id = uuid.uuid4().hex
+        self.store.insert({
+            'id': job_id,
+            'kind': 'explanation',
+            'status': 'pending',
+            'percent': None,
+            'message': None,
+            'pid': os.getpid(),
+            'created_at': time.time()
+        })
+        with self._lock:
+            self._running[job_id] = threading.Event()
+        self._executor.submit(self._run, job_id, fn)
+        return job_id
+
+    def _run(self, job_id: str, fn: Callable[[], str]):
+        self.store.update(job_id, status='running', started_at=time.time())
+        try:
+            self.store.update(job_id, status='done', result=fn(), finished_at=time.time())
+        except Exception as e:
+            self.store.update(job_id, status='failed', error=str(e), finished_at=time.time())
+        finally:
+            with self._lock:
+                self._pending -= 1
+                self._running.pop(job_id).set()
+
+    def get(self, job_id: str, wait: float = 0.0) -> Optional[Dict]:
+        """Return the job's state, waiting up to `wait` seconds for it to finish"""
+        job = self.store.get(job_id)
+        if job is not None and job['status'] not in FINISHED and wait > 0 and self._waiters.acquire(blocking=False):
+            try:
+                job = self._wait(job_id, job, wait)
+            finally:
+                self._waiters.release()
+        if job is None:
+            return None
+        return {
+            'job_id': job_id,
+            # Failed and interrupted jobs are both reported as errors
+            'status': 'error' if job['status'] in ('failed', 'interrupted') else job['status'],
+            'explanation': job['result'],
+            'error': job['error']
+        }
+
+    def _wait(self, job_id: str, job: Dict, wait: float) -> Dict:
+        with self._lock:
+            done = self._running.get(job_id)
+        if done is not None:
+            done.wait(wait)
+            return self.store.get(job_id)
+
+        deadline = time.monotonic() + wait
+        while job is not None and job['status'] not in FINISHED and time.monotonic() < deadline:
+            time.sleep(min(self.poll_interval, max(deadline - time.monotonic(), 0.0)))
+            job = self.store.get(job_id)
+        return job
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'pending': self._pending,
+                'max_pending': self.max_pending
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,143 @@
+import math
+import faiss
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+from config import (HNSW_M, HNSW_EF_CONSTRUCTION, HNSW_EF_SEARCH, IVF_NLIST, IVF_NPROBE, PQ_M, PQ_NBITS)
+
+# FAISS index backends for the paper store. All use L2 distance, so scores keep
+# the meaning `_filter_results` expects whichever backend is configured.
+#
+#   flat   exact brute force; supports removal
+#   hnsw   graph search; FAISS cannot remove from it, so deletions are tombstoned
+#   ivf    inverted lists over full vectors; needs training, supports removal
+#   ivfpq  inverted lists over product-quantized codes; needs training, smallest
+
+INDEX_TYPES = ("flat", "hnsw", "ivf", "ivfpq")
+
+def index_type_of(index: faiss.Index) -> str:
+    """Name the backend of a built or loaded index"""
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(index, faiss.IndexIVFPQ):
+        return "ivfpq"
+    if isinstance(index, faiss.IndexIVF):
+        return "ivf"
+    if isinstance(index, faiss.IndexFlat):
+        return "flat"
+    return type(index).__name__
+
+def default_nlist(n_vectors: int) -> int:
+    """About 4*sqrt(n) lists, with at least 39 training points per list"""
+    return max(1, min(int(4 * math.sqrt(n_vectors)), n_vectors // 39))
+
+def min_training_vectors(index_type: str, nlist: int = None) -> int:
+    if index_type == "ivf":
+        return max(39 * (nlist or 1), 39)
+    if index_type == "ivfpq":
+        return max(39 * (nlist or 1), 2 ** PQ_NBITS)
+    return 0
+
+def build_index(index_type: str, dim: int, n_vectors: int = 0, nlist: int = None) -> faiss.Index:
+    """Create an empty index; IVF types are returned untrained"""
+    if index_type == "flat":
+        return faiss.IndexFlatL2(dim)
+    if index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, HNSW_M)
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        index.hnsw.efSearch = HNSW_EF_SEARCH
+        return index
+    if index_type in ("ivf", "ivfpq"):
+        nlist = nlist or IVF_NLIST or default_nlist(n_vectors)
+        quantizer = faiss.IndexFlatL2(dim)
+        if index_type == "ivf":
+            index = faiss.IndexIVFFlat(quantizer, dim, nlist)
+        else:
+            if dim % PQ_M:
+                raise ValueError(f"PQ_M={PQ_M} must divide the embedding dimension {dim}")
+            index = faiss.IndexIVFPQ(quantizer, dim, nlist, PQ_M, PQ_NBITS)
+        index.nprobe = min(IVF_NPROBE, nlist)
+        return index
+    raise ValueError(f"Unknown FAISS index type: {index_type} (expected one of {', '.join(INDEX_TYPES)})")
+
+def apply_search_params(index: faiss.Index):
+    """Apply the configured search-time parameters to a loaded index"""
+    if isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = HNSW_EF_SEARCH
+    elif isinstance(index, faiss.IndexIVF):
+        index.nprobe = min(IVF_NPROBE, index.nlist)
+
+def supports_removal(index: faiss.Index) -> bool:
+    return not isinstance(index, faiss.IndexHNSW)
+
+def renumbers_on_removal(index: faiss.Index) -> bool:
+    """Flat indexes compact their labels on removal; IVF labels stay as assigned"""
+    return not isinstance(index, faiss.IndexIVF)
+
+def next_label(index: faiss.Index, index_to_docstore_id: Dict[int, str]) -> int:
+    """Label the next added vector will get"""
+    if isinstance(index, faiss.IndexIVF):
+        return max(index_to_docstore_id, default=-1) + 1
+    # Flat and HNSW number vectors by insertion; HNSW tombstones keep their slots
+    return index.ntotal
+
+def add_vectors(index: faiss.Index, vectors: np.ndarray, start_label: int) -> List[int]:
+    """Add vectors, returning the labels they were stored under"""
+    labels = np.arange(start_label, start_label + len(vectors), dtype=np.int64)
+    if isinstance(index, faiss.IndexIVF):
+        index.add_with_ids(vectors, labels)
+    else:
+        index.add(vectors)
+    return labels.tolist()
+
+def search(index: faiss.Index, vector: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Return (distances, labels) for one query; missing results have label -1"""
+    distances, labels = index.search(vector.reshape(1, -1), k)
+    return distances[0], labels[0]
+
+def reconstruct_vectors(index: faiss.Index, labels: List[int]) -> Tuple[np.ndarray, bool]:
+    """Read stored vectors back by label; returns (vectors, exact)
+
+    Exact for flat, HNSW and IVF; product-quantized indexes only hold an approximation.
+    """
+    keys = np.asarray(labels, dtype=np.int64)
+    if isinstance(index, faiss.IndexIVF):
+        # IVF labels need not be sequential, so map them through a temporary hashtable
+        index.set_direct_map_type(faiss.DirectMap.Hashtable)
+        try:
+            vectors = index.reconstruct_batch(keys)
+        finally:
+            index.set_direct_map_type(faiss.DirectMap.NoMap)
+        return vectors, not isinstance(index, faiss.IndexIVFPQ)
+    return index.reconstruct_batch(keys), True
+
+def build_from_vectors(index_type: str, vectors: np.ndarray, nlist: int = None) -> faiss.Index:
+    """Build (and, for IVF types, train) an index holding `vectors` under labels 0..n-1"""
+    n_vectors, dim = vectors.shape
+    index = build_index(index_type, dim, n_vectors=n_vectors, nlist=nlist)
+    if not index.is_trained:
+        needed = min_training_vectors(index_type, index.nlist)
+        if n_vectors < needed:
+            raise ValueError(f"{index_type} needs at least {needed} vectors to train; the store has {n_vectors}")
+        index.train(vectors)
+    if n_vectors:
+        add_vectors(index, vectors, 0)
+    return index
+
+def index_memory_bytes(index: faiss.Index) -> int:
+    """Serialized size of the index, a close proxy for its resident memory"""
+    return int(faiss.serialize_index(index).nbytes)
+
+def describe(index: faiss.Index, live_vectors: Optional[int] = None) -> Dict:
+    info = {
+        'type': index_type_of(index),
+        'dimension': index.d,
+        'vectors': index.ntotal,
+        'trained': bool(index.is_trained)
+    }
+    if live_vectors is not None:
+        info['tombstones'] = max(index.ntotal - live_vectors, 0)
+    if isinstance(index, faiss.IndexHNSW):
+        info.update(m=index.hnsw.nb_neighbors(1), ef_search=index.hnsw.efSearch)
+    elif isinstance(index, faiss.IndexIVF):
+        info.update(nlist=index.nlist, nprobe=index.nprobe)
+    return info
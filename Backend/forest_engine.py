@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+
+class CompiledForest:
+    """Evaluates an exported RandomForest over flat node arrays without joblib workers
+
+    Rows are cast to float32 and split with `x <= threshold` exactly as sklearn's
+    tree code does, and per-tree probabilities are summed in tree order, so
+    results match a sequential sklearn `predict_proba` bit for bit.
+    """
+
+    def __init__(self, export_path, max_batch_size=1024):
+        with np.load(export_path) as data:
+            self.feature = data["feature"]
+            self.threshold = data["threshold"]
+            self.left = data["left"]
+            self.right = data["right"]
+            self.missing_left = data["missing_left"]
+            self.value = data["value"]
+            self.roots = data["roots"]
+            self.classes_ = data["classes"]
+            self.max_depth = int(data["max_depth"])
+            self.n_features_in_ = int(data["n_features"])
+            feature_names = data["feature_names"]
+        self.feature_names_in_ = feature_names if len(feature_names) else None
+        self.n_estimators = len(self.roots)
+        self.max_batch_size = max_batch_size
+
+    def _as_matrix(self, X) -> np.ndarray:
+        if isinstance(X, pd.DataFrame):
+            if self.feature_names_in_ is not None:
+                X = X[list(self.feature_names_in_)]
+            X = X.to_numpy()
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X[np.newaxis, :]
+        if X.shape[1] != self.n_features_in_:
+            raise ValueError(f"X has {X.shape[1]} features, but the forest expects {self.n_features_in_}")
+        # sklearn promotes the float32 inputs to double when comparing against thresholds
+        return X.astype(np.float64)
+
+    def apply(self, X) -> np.ndarray:
+        """Return the leaf index reached in every tree, shape (n_rows, n_trees)"""
+        X = self._as_matrix(X)
+        rows = np.arange(X.shape[0])[:, np.newaxis]
+        nodes = np.broadcast_to(self.roots, (X.shape[0], self.n_estimators))
+        for _ in range(self.max_depth):
+            x = X[rows, self.feature[nodes]]
+            go_left = (x <= self.threshold[nodes]) | (np.isnan(x) & self.missing_left[nodes])
+            next_nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+            if np.array_equal(next_nodes, nodes):
+                break
+            nodes = next_nodes
+        return nodes
+
+    def predict_proba(self, X) -> np.ndarray:
+        X = self._as_matrix(X)
+        out = np.empty((X.shape[0], len(self.classes_)), dtype=np.float64)
+        for start in range(0, X.shape[0], self.max_batch_size):
+            leaves = self.apply(X[start:start + self.max_batch_size])
+            # cumsum is a sequential scan, matching sklearn's tree-by-tree accumulation
+            out[start:start + len(leaves)] = np.cumsum(self.value[leaves], axis=1)[:, -1]
+        out /= self.n_estimators
+        return out
+
+    def predict(self, X) -> np.ndarray:
+        return self.classes_.take(np.argmax(self.predict_proba(X), axis=1), axis=0)
@@ -0,0 +1,179 @@
+import json
+import time
+import tempfile
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Iterator, List, Tuple
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+def load_token_counter(model_name: str = None) -> Callable[[str], int]:
+    """Count tokens with tiktoken's encoding for `model_name`
+
+    Without a model name, or when the encoding cannot be loaded (tiktoken fetches
+    it on first use, which fails offline), estimates 4 characters per token.
+    """
+    if model_name:
+        try:
+            import tiktoken
+            encoding = tiktoken.encoding_for_model(model_name)
+            return lambda text: len(encoding.encode(text, disallowed_special=()))
+        except Exception as e:
+            print(f"No tiktoken encoding for {model_name} ({e}); estimating 4 characters per token")
+    return lambda text: len(text) // 4 + 1
+
+def _throughput(chunks: int, tokens: int, seconds: float) -> Dict:
+    return {
+        'chunks_per_second': round(chunks / seconds, 1) if seconds else 0.0,
+        'tokens_per_second': round(tokens / seconds, 1) if seconds else 0.0
+    }
+
+class IngestEmbedder:
+    """Embeds ingested chunks in token-budgeted batches, several batches in flight
+
+    Texts are packed in order into batches of at most `max_batch_tokens` tokens and
+    `max_batch_texts` texts (a single text over the budget is sent alone). Up to
+    `max_concurrency` batches are embedded at once on a shared pool, so concurrent
+    ingestions together never exceed it either. A failed batch is retried on its
+    own with exponential backoff, up to `max_retries` times, before the error is
+    raised; batches already returned stay committed.
+    """
+
+    def __init__(self, embeddings: Embeddings, count_tokens: Callable[[str], int],
+                 max_batch_tokens: int = 100000, max_batch_texts: int = 256, max_concurrency: int = 4,
+                 max_retries: int = 3, retry_backoff: float = 1.0):
+        self.embeddings = embeddings
+        self.count_tokens = count_tokens
+        self.max_batch_tokens = max_batch_tokens
+        self.max_batch_texts = max_batch_texts
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="ingest-embed")
+        self._lock = threading.Lock()
+        self._totals = {'chunks': 0, 'tokens': 0, 'batches': 0, 'retries': 0, 'seconds': 0.0}
+
+    def _embed_batch(self, texts: List[str]) -> Tuple[List[List[float]], int]:
+        """Embed one batch, retrying it alone on failure; returns (vectors, retries used)"""
+        for attempt in range(self.max_retries + 1):
+            try:
+                return self.embeddings.embed_documents(texts), attempt
+            except Exception as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = self.retry_backoff * 2 ** attempt
+                print(f"Embedding a batch of {len(texts)} chunks failed ({e}); retrying in {delay:.0f}s")
+                time.sleep(delay)
+
+    def _batches(self, texts: Iterable[str]) -> Iterator[Tuple[int, List[str], int]]:
+        """Pack texts, as they arrive, into (start position, texts, tokens) batches"""
+        batch = []
+        tokens = 0
+        start = 0
+        for text in texts:
+            count = self.count_tokens(text)
+            if batch and (tokens + count > self.max_batch_tokens or len(batch) >= self.max_batch_texts):
+                yield start, batch, tokens
+                start += len(batch)
+                batch = []
+                tokens = 0
+            batch.append(text)
+            tokens += count
+        if batch:
+            yield start, batch, tokens
+
+    def iter_batches(self, texts: Iterable[str], stats: Dict = None) -> Iterator[Tuple[int, List[str], List[List[float]]]]:
+        """Embed texts and yield (start position, texts, vectors) per batch, in input order
+
+        `texts` may be a generator; it is consumed only as far as the in-flight
+        window needs, so a streamed document is never held in memory whole. If
+        given, `stats` is updated after every batch with chunks, tokens, batches,
+        retries, seconds and chunks/tokens per second.
+        """
+        stats = stats if stats is not None else {}
+        stats.update(chunks=0, tokens=0, batches=0, retries=0, seconds=0.0,
+                     **_throughput(0, 0, 0.0))
+        started = time.perf_counter()
+        pending = deque()
+        batches = self._batches(texts)
+        exhausted = False
+        try:
+            while True:
+                while not exhausted and len(pending) < self.max_concurrency:
+                    batch = next(batches, None)
+                    if batch is None:
+                        exhausted = True
+                        break
+                    start, batch_texts, tokens = batch
+                    pending.append((start, batch_texts, tokens, self._executor.submit(self._embed_batch, batch_texts)))
+                if not pending:
+                    break
+
+                start, batch_texts, tokens, future = pending.popleft()
+                vectors, retries = future.result()
+                seconds = time.perf_counter() - started
+                stats.update(
+                    chunks=stats['chunks'] + len(batch_texts),
+                    tokens=stats['tokens'] + tokens,
+                    batches=stats['batches'] + 1,
+                    retries=stats['retries'] + retries,
+                    seconds=round(seconds, 3)
+                )
+                stats.update(_throughput(stats['chunks'], stats['tokens'], seconds))
+                with self._lock:
+                    self._totals['chunks'] += len(batch_texts)
+                    self._totals['tokens'] += tokens
+                    self._totals['batches'] += 1
+                    self._totals['retries'] += retries
+                yield start, batch_texts, vectors
+        finally:
+            for _, _, _, future in pending:
+                future.cancel()
+            with self._lock:
+                self._totals['seconds'] += time.perf_counter() - started
+
+    def stats(self) -> Dict:
+        """Totals and average throughput over every ingestion since startup"""
+        with self._lock:
+            totals = dict(self._totals)
+        totals.update(_throughput(totals['chunks'], totals['tokens'], totals['seconds']))
+        totals['seconds'] = round(totals['seconds'], 3)
+        return totals
+
+class EmbeddedSpool:
+    """Embedded batches kept in temporary files until they are committed together
+
+    Vectors are written as float32 and texts as JSON lines, so a whole document's
+    chunks cost disk rather than memory; `batches` reads them back one batch at a time.
+    """
+
+    def __init__(self):
+        self._vectors = tempfile.TemporaryFile()
+        self._texts = tempfile.TemporaryFile()
+        self._sizes = []
+        self.dimension = None
+
+    def __len__(self) -> int:
+        return sum(self._sizes)
+
+    def append(self, texts: List[str], vectors: List[List[float]]):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        self.dimension = vectors.shape[1]
+        self._vectors.write(vectors.tobytes())
+        for text in texts:
+            self._texts.write(json.dumps(text).encode('utf-8') + b"\n")
+        self._sizes.append(len(texts))
+
+    def batches(self) -> Iterator[Tuple[List[str], np.ndarray]]:
+        """(texts, vectors) per appended batch, in order"""
+        self._vectors.seek(0)
+        self._texts.seek(0)
+        for size in self._sizes:
+            data = self._vectors.read(size * self.dimension * 4)
+            vectors = np.frombuffer(data, dtype=np.float32).reshape(size, self.dimension)
+            yield [json.loads(self._texts.readline()) for _ in range(size)], vectors
+
+    def close(self):
+        self._vectors.close()
+        self._texts.close()
@@ -0,0 +1,239 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, List, Optional
+
+FINISHED = ('done', 'failed', 'interrupted')
+
+class JobStore:
+    """SQLite record of paper jobs, readable from every worker process and across restarts"""
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, kind TEXT NOT NULL, status TEXT NOT NULL, percent REAL, message TEXT, "
+            "result TEXT, error TEXT, pid INTEGER, created_at REAL NOT NULL, started_at REAL, finished_at REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_created_at ON jobs (created_at)")
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        if 'owner' not in columns:
+            # Stores created before owners were recorded
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN owner TEXT")
+        self._conn.commit()
+
+    def insert(self, job: Dict):
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, kind, status, percent, message, pid, owner, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (job['id'], job['kind'], job['status'], job['percent'], job['message'], job['pid'],
+                 process_token(job['pid']), job['created_at'])
+            )
+            self._conn.commit()
+
+    def update(self, job_id: str, **fields):
+        if 'result' in fields:
+            fields['result'] = json.dumps(fields['result'])
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._conn.execute(f"UPDATE jobs SET {columns} WHERE id = ?", (*fields.values(), job_id))
+            self._conn.commit()
+
+    def _row(self, cursor, row) -> Dict:
+        job = {column[0]: value for column, value in zip(cursor.description, row)}
+        job['result'] = json.loads(job['result']) if job['result'] else None
+        return job
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            cursor = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,))
+            row = cursor.fetchone()
+            return self._row(cursor, row) if row else None
+
+    def recent(self, limit: int = 50) -> List[Dict]:
+        with self._lock:
+            cursor = self._conn.execute("SELECT * FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,))
+            return [self._row(cursor, row) for row in cursor.fetchall()]
+
+    def unfinished(self) -> List[Dict]:
+        with self._lock:
+            cursor = self._conn.execute(
+                f"SELECT * FROM jobs WHERE status NOT IN ({', '.join('?' * len(FINISHED))})", FINISHED
+            )
+            return [self._row(cursor, row) for row in cursor.fetchall()]
+
+    def interrupt_orphans(self) -> int:
+        """Mark unfinished jobs whose owning process is gone as interrupted; returns how many
+
+        A job's owner is its pid plus that process's start time, so a process that
+        has since reused the pid (pid 1 after a container restart, say) does not
+        keep a dead job alive, and a live owner sharing our pid is left alone.
+        """
+        interrupted = 0
+        for job in self.unfinished():
+            if job['owner'] is None or process_token(job['pid']) != job['owner']:
+                self.update(job['id'], status='interrupted', finished_at=time.time(),
+                            error='Server restarted before the job finished')
+                interrupted += 1
+        return interrupted
+
+    def expire(self, cutoff: float):
+        with self._lock:
+            self._conn.execute(
+                f"DELETE FROM jobs WHERE finished_at < ? AND status IN ({', '.join('?' * len(FINISHED))})",
+                (cutoff, *FINISHED)
+            )
+            self._conn.commit()
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+def process_token(pid: int) -> Optional[str]:
+    """'<pid>:<start time>' for a running process, or None once it has exited
+
+    The start time is read from /proc (clock ticks since boot); where there is no
+    /proc the token falls back to the bare pid.
+    """
+    try:
+        with open(f"/proc/{pid}/stat", 'r') as f:
+            stat = f.read()
+    except FileNotFoundError:
+        if os.path.isdir("/proc/self"):
+            return None
+        return str(pid) if _process_alive(pid) else None
+    # Fields after the parenthesised command name start at field 3; starttime is field 22
+    return f"{pid}:{stat.rsplit(')', 1)[1].split()[19]}"
+
+class JobContext:
+    """Handle a running job uses to report progress"""
+
+    def __init__(self, manager: 'JobManager', job_id: str):
+        self._manager = manager
+        self.job_id = job_id
+        self._last_write = 0.0
+
+    def progress(self, percent: float = None, message: str = None):
+        """Record progress; writes are throttled except for the final 100%"""
+        now = time.monotonic()
+        if percent != 100 and now - self._last_write < self._manager.progress_interval:
+            return
+        self._last_write = now
+        fields = {}
+        if percent is not None:
+            fields['percent'] = round(min(max(percent, 0.0), 100.0), 1)
+        if message is not None:
+            fields['message'] = message
+        if fields:
+            self._manager.store.update(self.job_id, **fields)
+
+class JobManager:
+    """Runs index-mutating paper jobs in the background, tracked in a JobStore
+
+    Jobs run on `max_workers` threads (one by default, so store mutations are
+    applied one at a time in submission order). At most `max_pending` jobs may be
+    queued or running; `submit` returns None beyond that. A job's function gets a
+    JobContext and returns the result dict the synchronous endpoint would have
+    returned; a result with status 'error' marks the job failed.
+    """
+
+    def __init__(self, store_path: str, max_workers: int = 1, max_pending: int = 32,
+                 ttl: float = 7 * 86400, progress_interval: float = 0.5):
+        self.store = JobStore(store_path)
+        self.max_pending = max_pending
+        self.ttl = ttl
+        self.progress_interval = progress_interval
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="paper-job")
+        self._pending = 0
+        self._lock = threading.Lock()
+        self.recover()
+
+    def recover(self) -> int:
+        """Mark jobs whose owning process is gone as interrupted; returns how many"""
+        return self.store.interrupt_orphans()
+
+    def submit(self, kind: str, fn: Callable[[JobContext], Dict], cleanup: Callable[[], None] = None) -> Optional[str]:
+        """Queue `fn` and return its job id, or None if the queue is full
+
+        `cleanup` runs after the job finishes, however it finishes.
+        """
+        with self._lock:
+            if self._pending >= self.max_pending:
+                return None
+            self._pending += 1
+        self.store.expire(time.time() - self.ttl)
+
+        job_id = uuid.uuid4().hex
+        self.store.insert({
+            'id': job_id,
+            'kind': kind,
+            'status': 'queued',
+            'percent': 0.0,
+            'message': 'Waiting for earlier jobs to finish',
+            'pid': os.getpid(),
+            'created_at': time.time()
+        })
+        self._executor.submit(self._run, job_id, fn, cleanup)
+        return job_id
+
+    def _run(self, job_id: str, fn: Callable[[JobContext], Dict], cleanup: Callable[[], None]):
+        self.store.update(job_id, status='running', message='Running', started_at=time.time())
+        try:
+            result = fn(JobContext(self, job_id))
+            if isinstance(result, dict) and result.get('status') == 'error':
+                self.store.update(job_id, status='failed', result=result, error=result.get('message'),
+                                  finished_at=time.time())
+            else:
+                self.store.update(job_id, status='done', percent=100.0, result=result,
+                                  message=(result or {}).get('message', 'Done'), finished_at=time.time())
+        except Exception as e:
+            self.store.update(job_id, status='failed', error=str(e), finished_at=time.time())
+        finally:
+            with self._lock:
+                self._pending -= 1
+            if cleanup:
+                cleanup()
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        return self.store.get(job_id)
+
+    def watch(self, job_id: str, poll_interval: float = 0.5) -> Iterator[Dict]:
+        """Yield the job's state each time it changes, ending once it has finished
+
+        Polls the store rather than in-process state, so it follows jobs running
+        in any worker process.
+        """
+        last = None
+        while True:
+            job = self.store.get(job_id)
+            if job is None:
+                return
+            state = (job['status'], job['percent'], job['message'])
+            if state != last:
+                last = state
+                yield job
+            if job['status'] in FINISHED:
+                return
+            time.sleep(poll_interval)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'pending': self._pending,
+                'max_pending': self.max_pending
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,106 @@
+import asyncio
+import threading
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, Iterator
+import httpx
+from langchain_core.language_models import BaseChatModel
+from langchain_openai import ChatOpenAI
+from stub_llm import StubChatModel
+from config import (OPENAI_API_KEY, MODEL_NAME, TEMPERATURE, MAX_TOKENS, LLM_BACKEND, LLM_FAKE_LATENCY,
+                    LLM_TIMEOUT, LLM_MAX_RETRIES, LLM_MAX_CONCURRENCY)
+
+class LLMClient:
+    """Long-lived chat model shared by every request, with bounded concurrency
+
+    At most `max_concurrency` calls (sync and async counted separately) are in
+    flight at once; callers beyond that wait up to `acquire_timeout` seconds for
+    a slot. Streams hold their slot until the last token has been read.
+    """
+
+    def __init__(self, llm: BaseChatModel, max_concurrency: int = 8, acquire_timeout: float = 60.0):
+        self.llm = llm
+        self.max_concurrency = max_concurrency
+        self.acquire_timeout = acquire_timeout
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._async_slots = None
+
+    @contextmanager
+    def _slot(self):
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            raise TimeoutError(f"No LLM slot free after {self.acquire_timeout}s ({self.max_concurrency} calls in flight)")
+        try:
+            yield
+        finally:
+            self._slots.release()
+
+    @asynccontextmanager
+    async def _async_slot(self):
+        if self._async_slots is None:
+            self._async_slots = asyncio.Semaphore(self.max_concurrency)
+        try:
+            await asyncio.wait_for(self._async_slots.acquire(), self.acquire_timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"No LLM slot free after {self.acquire_timeout}s ({self.max_concurrency} calls in flight)")
+        try:
+            yield
+        finally:
+            self._async_slots.release()
+
+    def invoke(self, prompt) -> str:
+        with self._slot():
+            return self.llm.invoke(prompt).content
+
+    def stream(self, prompt) -> Iterator[str]:
+        with self._slot():
+            for chunk in self.llm.stream(prompt):
+                if chunk.content:
+                    yield chunk.content
+
+    async def ainvoke(self, prompt) -> str:
+        async with self._async_slot():
+            return (await self.llm.ainvoke(prompt)).content
+
+    async def astream(self, prompt) -> AsyncIterator[str]:
+        async with self._async_slot():
+            async for chunk in self.llm.astream(prompt):
+                if chunk.content:
+                    yield chunk.content
+
+def build_chat_model(backend: str = LLM_BACKEND) -> BaseChatModel:
+    """Build the chat model for LLM_BACKEND ("openai" or "fake")"""
+    if backend == "fake":
+        return StubChatModel(latency=LLM_FAKE_LATENCY)
+    if backend != "openai":
+        raise ValueError(f"Unknown LLM backend: {backend}")
+
+    # One keep-alive pool per process; the OpenAI SDK retries 429/5xx/connection errors with exponential backoff
+    limits = httpx.Limits(max_connections=LLM_MAX_CONCURRENCY, max_keepalive_connections=LLM_MAX_CONCURRENCY)
+    return ChatOpenAI(
+        model=MODEL_NAME,
+        temperature=TEMPERATURE,
+        max_tokens=MAX_TOKENS,
+        api_key=OPENAI_API_KEY,
+        timeout=LLM_TIMEOUT,
+        max_retries=LLM_MAX_RETRIES,
+        http_client=httpx.Client(limits=limits, timeout=LLM_TIMEOUT),
+        http_async_client=httpx.AsyncClient(limits=limits, timeout=LLM_TIMEOUT)
+    )
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_llm_client() -> LLMClient:
+    """Return the process-wide client, building it on first use"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = LLMClient(build_chat_model(), max_concurrency=LLM_MAX_CONCURRENCY,
+                                    acquire_timeout=LLM_TIMEOUT)
+    return _client
+
+def set_llm_client(client: LLMClient):
+    """Replace the process-wide client, e.g. with one wrapping StubChatModel in tests"""
+    global _client
+    with _client_lock:
+        _client = client
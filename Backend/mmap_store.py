@@ -0,0 +1,410 @@
+import os
+import json
+import sqlite3
+import threading
+import numpy as np
+from collections.abc import Mapping
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, Union
+from langchain_core.documents import Document
+
+# Memory-mapped storage for the paper store (VECTOR_STORAGE=mmap). A snapshot holds:
+#
+#   vectors.f32    row-major float32 matrix, one row per chunk, in label order
+#   norms.f32      squared L2 norm of every row, so a search reads each vector once
+#   chunks.sqlite  label -> chunk id, text and metadata
+#   vectors.json   {'dimension', 'count'}
+#
+# Opening a snapshot maps the matrix read-only and opens the table without reading
+# either, so startup does not grow with the library, and worker processes serving
+# the same snapshot share its pages through the OS page cache.
+
+VECTOR_STORAGES = ("faiss", "mmap")
+
+VECTORS_FILE = "vectors.f32"
+NORMS_FILE = "norms.f32"
+CHUNKS_FILE = "chunks.sqlite"
+HEADER_FILE = "vectors.json"
+
+def _document(doc_id: str, content: str, metadata: str) -> Document:
+    return Document(page_content=content, metadata=json.loads(metadata), id=doc_id)
+
+def _connect(store_dir: str) -> sqlite3.Connection:
+    # immutable=1: snapshots are never written after publication, so SQLite skips locking
+    path = os.path.abspath(os.path.join(store_dir, CHUNKS_FILE))
+    return sqlite3.connect(f"file:{path}?mode=ro&immutable=1", uri=True, check_same_thread=False)
+
+def _iter_table(conn: sqlite3.Connection, dead: np.ndarray, lock: threading.Lock,
+                page_rows: int = 1000) -> Iterator[Tuple[str, str, str]]:
+    """(id, text, metadata JSON) of every chunk of a snapshot table not marked dead, in label order
+
+    Reads a page at a time under `lock`, so point lookups on the same connection
+    are not held up behind a full scan.
+    """
+    label = -1
+    while len(dead):
+        with lock:
+            rows = conn.execute(
+                "SELECT label, id, content, metadata FROM chunks WHERE label > ? ORDER BY label LIMIT ?",
+                (label, page_rows)
+            ).fetchall()
+        for label, doc_id, content, metadata in rows:
+            if not dead[label]:
+                yield doc_id, content, metadata
+        if len(rows) < page_rows:
+            return
+
+class _ChunkMap(Mapping):
+    """Chunk id -> Document over the snapshot table and the chunks added since it was opened"""
+
+    def __init__(self, store: "MmapVectorStore"):
+        self._store = store
+
+    def __getitem__(self, doc_id: str) -> Document:
+        doc = self._store._added_docs.get(doc_id)
+        if doc is not None:
+            return doc
+        row = self._store._base_row(doc_id)
+        if row is None:
+            raise KeyError(doc_id)
+        _, content, metadata = row
+        return _document(doc_id, content, metadata)
+
+    def __contains__(self, doc_id) -> bool:
+        return doc_id in self._store._added_docs or self._store._base_row(doc_id) is not None
+
+    def __len__(self) -> int:
+        return len(self._store)
+
+    def __iter__(self) -> Iterator[str]:
+        for doc_id, _, _ in self._store._iter_base():
+            yield doc_id
+        yield from list(self._store._added_docs)
+
+    def items(self) -> Iterator[Tuple[str, Document]]:
+        """Stream (id, Document) pairs in label order with one table scan"""
+        for doc_id, content, metadata in self._store._iter_base():
+            yield doc_id, _document(doc_id, content, metadata)
+        yield from list(self._store._added_docs.items())
+
+class _ChunkDocstore:
+    """Exposes the chunks as `docstore._dict`, where paperRag reads LangChain's InMemoryDocstore"""
+
+    def __init__(self, chunks: _ChunkMap):
+        self._dict = chunks
+
+class MmapVectorStore:
+    """Exact L2 search over a read-only memory-mapped snapshot plus in-memory changes
+
+    Labels 0..count-1 are the snapshot's rows. Vectors added since it was opened
+    take the labels after them and live in a growing in-memory matrix; deletions
+    are tombstones. Between snapshots paperRag flushes those changes as segments
+    (see store_persistence) and replays them here on load, so the in-memory part
+    holds at most what the segments may add before compaction. `serialize` then
+    streams the live rows into the next snapshot, and once it is published
+    `rebase` maps it in place of the old one, keeping only the changes made since
+    it was serialized. Search scans the matrix in blocks of `block_rows`, so the
+    working set stays bounded however large the store is. The caller serializes
+    mutations against searches (paperRag holds the store lock).
+    """
+
+    def __init__(self, dimension: int, store_dir: str = None, block_rows: int = 16384):
+        self.dimension = dimension
+        self.block_rows = block_rows
+        self.store_dir = store_dir
+        self._conn = None
+        self._conn_lock = threading.Lock()
+        self._base_count = 0
+        self._vectors = np.zeros((0, dimension), dtype=np.float32)
+        self._norms = np.zeros(0, dtype=np.float32)
+        if store_dir:
+            self._open(store_dir)
+        self._base_dead = np.zeros(self._base_count, dtype=bool)
+        self._base_dead_count = 0
+
+        # Chunks added since the snapshot; capacity doubles as they arrive
+        self._added = np.zeros((0, dimension), dtype=np.float32)
+        self._added_norms = np.zeros(0, dtype=np.float32)
+        self._added_dead = np.zeros(0, dtype=bool)
+        self._added_count = 0
+        self._added_ids: List[str] = []
+        self._added_labels: Dict[str, int] = {}
+        self._added_docs: Dict[str, Document] = {}
+        # (snapshot base rows, added rows, added count) written by the last serialize, for rebase
+        self._serialized = None
+
+        self.docstore = _ChunkDocstore(_ChunkMap(self))
+
+    @staticmethod
+    def exists(store_dir: str) -> bool:
+        return os.path.exists(os.path.join(store_dir, HEADER_FILE))
+
+    @classmethod
+    def load(cls, store_dir: str, block_rows: int = 16384) -> "MmapVectorStore":
+        with open(os.path.join(store_dir, HEADER_FILE), 'r') as f:
+            header = json.load(f)
+        return cls(header['dimension'], store_dir=store_dir, block_rows=block_rows)
+
+    def _open(self, store_dir: str):
+        with open(os.path.join(store_dir, HEADER_FILE), 'r') as f:
+            header = json.load(f)
+        if header['dimension'] != self.dimension:
+            raise ValueError(f"Snapshot holds {header['dimension']}-dimensional vectors, expected {self.dimension}")
+        self._base_count = header['count']
+        if self._base_count:
+            # Zero-length files cannot be mapped, so an empty snapshot keeps the empty arrays
+            self._vectors = np.memmap(os.path.join(store_dir, VECTORS_FILE), dtype=np.float32, mode='r',
+                                      shape=(self._base_count, self.dimension))
+            self._norms = np.memmap(os.path.join(store_dir, NORMS_FILE), dtype=np.float32, mode='r',
+                                    shape=(self._base_count,))
+        self._conn = _connect(store_dir)
+
+    def close(self):
+        with self._conn_lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def __len__(self) -> int:
+        return self._base_count - self._base_dead_count + len(self._added_docs)
+
+    # === Snapshot table ===
+
+    def _base_row(self, doc_id: str) -> Optional[Tuple[int, str, str]]:
+        """(label, text, metadata JSON) of a live snapshot chunk, or None"""
+        if self._conn is None:
+            return None
+        with self._conn_lock:
+            row = self._conn.execute(
+                "SELECT label, content, metadata FROM chunks WHERE id = ?", (doc_id,)
+            ).fetchone()
+        if row is None or self._base_dead[row[0]]:
+            return None
+        return row
+
+    def _iter_base(self, page_rows: int = 1000) -> Iterator[Tuple[str, str, str]]:
+        """(id, text, metadata JSON) of every live snapshot chunk in label order"""
+        return _iter_table(self._conn, self._base_dead, self._conn_lock, page_rows)
+
+    def _base_documents(self, labels: List[int]) -> Dict[int, Tuple[str, Document]]:
+        placeholders = ",".join("?" * len(labels))
+        with self._conn_lock:
+            rows = self._conn.execute(
+                f"SELECT label, id, content, metadata FROM chunks WHERE label IN ({placeholders})", labels
+            ).fetchall()
+        return {label: (doc_id, _document(doc_id, content, metadata)) for label, doc_id, content, metadata in rows}
+
+    # === Mutation ===
+
+    def _reserve(self, count: int):
+        if count <= len(self._added):
+            return
+        capacity = max(count, 2 * len(self._added), 256)
+        added = np.zeros((capacity, self.dimension), dtype=np.float32)
+        added[:self._added_count] = self._added[:self._added_count]
+        self._added = added
+        self._added_norms = np.resize(self._added_norms, capacity)
+        self._added_dead = np.resize(self._added_dead, capacity)
+        self._added_dead[self._added_count:] = False
+
+    def add(self, vectors: np.ndarray, docs: Dict[str, Document]):
+        """Append vectors with their documents; `docs` is keyed by chunk id in row order"""
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dimension)
+        existing = [doc_id for doc_id in docs if doc_id in self.docstore._dict]
+        if existing:
+            raise ValueError(f"Tried to add ids that already exist: {existing}")
+
+        start = self._added_count
+        self._reserve(start + len(vectors))
+        self._added[start:start + len(vectors)] = vectors
+        self._added_norms[start:start + len(vectors)] = np.einsum('ij,ij->i', vectors, vectors)
+        for offset, doc_id in enumerate(docs):
+            self._added_labels[doc_id] = self._base_count + start + offset
+        self._added_ids.extend(docs)
+        self._added_docs.update(docs)
+        self._added_count += len(vectors)
+
+    def delete(self, ids: List[str]):
+        """Tombstone chunks; their rows are dropped from the next snapshot"""
+        base_labels = []
+        for doc_id in ids:
+            if doc_id in self._added_docs:
+                continue
+            row = self._base_row(doc_id)
+            if row is None:
+                raise ValueError(f"Some specified ids do not exist in the current store: {doc_id}")
+            base_labels.append(row[0])
+
+        for doc_id in ids:
+            if doc_id in self._added_docs:
+                del self._added_docs[doc_id]
+                self._added_dead[self._added_labels.pop(doc_id) - self._base_count] = True
+        self._base_dead[base_labels] = True
+        self._base_dead_count = int(self._base_dead.sum())
+
+    # === Search ===
+
+    def _scan(self, vectors: np.ndarray, norms: np.ndarray, dead: np.ndarray, query: np.ndarray, k: int,
+              offset: int, distances: List[np.ndarray], labels: List[np.ndarray], skip_dead: bool):
+        """Keep the k nearest rows of each block, as ||x||^2 - 2 x.q (||q||^2 is added once at the end)"""
+        for start in range(0, len(vectors), self.block_rows):
+            stop = min(start + self.block_rows, len(vectors))
+            block = norms[start:stop] - 2 * (vectors[start:stop] @ query)
+            if skip_dead:
+                block[dead[start:stop]] = np.inf
+            if len(block) > k:
+                keep = np.argpartition(block, k - 1)[:k]
+                block = block[keep]
+            else:
+                keep = np.arange(len(block))
+            distances.append(block)
+            labels.append(keep + offset + start)
+
+    def search(self, query: np.ndarray, k: int) -> List[Tuple[str, Document, float]]:
+        """k nearest live chunks by squared L2 distance, as (id, document, distance), nearest first"""
+        query = np.asarray(query, dtype=np.float32).ravel()
+        if k <= 0 or not len(self):
+            return []
+        distances, labels = [], []
+        self._scan(self._vectors, self._norms, self._base_dead, query, k, 0,
+                   distances, labels, self._base_dead_count > 0)
+        count = self._added_count
+        self._scan(self._added[:count], self._added_norms[:count], self._added_dead[:count], query, k,
+                   self._base_count, distances, labels, len(self._added_docs) < count)
+
+        distances = np.concatenate(distances).astype(np.float64) + float(query @ query)
+        labels = np.concatenate(labels)
+        order = np.argsort(distances, kind='stable')[:k]
+        order = order[np.isfinite(distances[order])]
+
+        base = [int(labels[i]) for i in order if labels[i] < self._base_count]
+        base_docs = self._base_documents(base) if base else {}
+        results = []
+        for i in order:
+            label = int(labels[i])
+            if label < self._base_count:
+                doc_id, doc = base_docs[label]
+            else:
+                doc_id = self._added_ids[label - self._base_count]
+                doc = self._added_docs[doc_id]
+            # The norm expansion can dip just below zero for a vector equal to the query
+            results.append((doc_id, doc, max(float(distances[i]), 0.0)))
+        return results
+
+    # === Persistence ===
+
+    def live_vectors(self) -> np.ndarray:
+        """Live vectors in the order `docstore._dict` iterates its chunks"""
+        base = self._vectors[~self._base_dead] if self._base_dead_count else self._vectors
+        added = self._added[:self._added_count][~self._added_dead[:self._added_count]]
+        return np.concatenate([np.asarray(base), added])
+
+    def serialize(self) -> Dict[str, Union[bytes, Callable[[str], None]]]:
+        """Snapshot files for the live chunks, relabelled 0..n-1
+
+        The vectors, norms and chunk table are returned as writers that stream
+        them to disk a block at a time, from the mapped snapshot and a copy of the
+        tombstones and in-memory rows taken now, so the store can keep changing
+        while they run and the library is never held in memory.
+        """
+        base_dead = self._base_dead.copy()
+        base_rows = np.flatnonzero(~base_dead)
+        added_rows = np.flatnonzero(~self._added_dead[:self._added_count])
+        added = self._added[added_rows]
+        added_norms = self._added_norms[added_rows]
+        added_docs = [(self._added_ids[row], self._added_docs[self._added_ids[row]]) for row in added_rows]
+        base_vectors, base_norms, base_dir = self._vectors, self._norms, self.store_dir
+        block_rows = self.block_rows
+
+        def write_rows(base: np.ndarray, extra: np.ndarray) -> Callable[[str], None]:
+            def write(path: str):
+                with open(path, 'wb') as f:
+                    for start in range(0, len(base), block_rows):
+                        rows = np.asarray(base[start:start + block_rows])
+                        f.write(rows[~base_dead[start:start + block_rows]].tobytes())
+                    f.write(extra.tobytes())
+            return write
+
+        def write_chunks(path: str):
+            conn = sqlite3.connect(path)
+            base = _connect(base_dir) if base_dir and len(base_dead) else None
+            try:
+                conn.execute(
+                    "CREATE TABLE chunks (label INTEGER PRIMARY KEY, id TEXT NOT NULL UNIQUE, "
+                    "content TEXT NOT NULL, metadata TEXT NOT NULL)"
+                )
+                base_chunks = _iter_table(base, base_dead, threading.Lock()) if base else iter(())
+                added_chunks = ((doc_id, doc.page_content, json.dumps(doc.metadata)) for doc_id, doc in added_docs)
+                rows = ((label, *row) for label, row in enumerate(
+                    item for source in (base_chunks, added_chunks) for item in source
+                ))
+                conn.executemany("INSERT INTO chunks VALUES (?, ?, ?, ?)", rows)
+                conn.commit()
+            finally:
+                conn.close()
+                if base is not None:
+                    base.close()
+
+        self._serialized = (base_rows, added_rows, self._added_count)
+        return {
+            VECTORS_FILE: write_rows(base_vectors, added),
+            NORMS_FILE: write_rows(base_norms, added_norms),
+            CHUNKS_FILE: write_chunks,
+            HEADER_FILE: json.dumps({
+                'dimension': self.dimension,
+                'count': len(base_rows) + len(added_rows)
+            }).encode('utf-8')
+        }
+
+    def rebase(self, store_dir: str):
+        """Map the snapshot the last `serialize` wrote, keeping only the changes made since
+
+        Rows of the snapshot deleted after it was serialized become its tombstones;
+        chunks added after it stay in memory under labels following it. The caller
+        holds the write lock.
+        """
+        if self._serialized is None:
+            return
+        base_rows, added_rows, written = self._serialized
+        self._serialized = None
+        dead = np.concatenate([self._base_dead[base_rows], self._added_dead[added_rows]])
+
+        count = self._added_count
+        pending = self._added[written:count].copy()
+        pending_norms = self._added_norms[written:count].copy()
+        pending_dead = self._added_dead[written:count].copy()
+        pending_ids = self._added_ids[written:count]
+        pending_docs = {
+            doc_id: self._added_docs[doc_id] for row, doc_id in enumerate(pending_ids) if not pending_dead[row]
+        }
+
+        self.close()
+        self.store_dir = store_dir
+        self._vectors = np.zeros((0, self.dimension), dtype=np.float32)
+        self._norms = np.zeros(0, dtype=np.float32)
+        self._open(store_dir)
+        if self._base_count != len(dead):
+            raise ValueError(f"Snapshot in {store_dir} holds {self._base_count} rows, serialized {len(dead)}")
+        self._base_dead = dead
+        self._base_dead_count = int(dead.sum())
+
+        self._added = pending
+        self._added_norms = pending_norms
+        self._added_dead = pending_dead
+        self._added_count = len(pending)
+        self._added_ids = list(pending_ids)
+        self._added_labels = {
+            doc_id: self._base_count + row for row, doc_id in enumerate(pending_ids) if not pending_dead[row]
+        }
+        self._added_docs = pending_docs
+
+    def describe(self) -> Dict:
+        return {
+            'type': 'mmap',
+            'dimension': self.dimension,
+            'vectors': self._base_count + self._added_count,
+            'trained': True,
+            'tombstones': self._base_dead_count + self._added_count - len(self._added_docs),
+            'mapped_bytes': int(self._vectors.nbytes + self._norms.nbytes),
+            'memory_bytes': int(self._added.nbytes + self._added_norms.nbytes),
+            'block_rows': self.block_rows
+        }
@@ -1,9 +1,8 @@
 import re
 from datetime import datetime
+from typing import AsyncIterator, Awaitable, Callable, Iterator, Optional, Tuple
 from langchain_core.prompts import PromptTemplate
-from langchain_openai import ChatOpenAI
-from langchain_core.runnables import Runnable
-from config import OPENAI_API_KEY
+from llm_client import LLMClient, get_llm_client
 import os
 import logging
 
@@ -11,7 +10,11 @@ import logging
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
-def llm_input_aggregator(prediction_info, retrieved_docs):
+# Bump whenever the prompt template or its input format changes, so cached explanations are not reused
+PROMPT_VERSION = "1"
+
+def build_llm_input(prediction_info, retrieved_docs) -> str:
+    """Format the prediction summary and retrieved references as the LLM context"""
     logger.debug(f"retrieved_docs: {retrieved_docs}")
     predicted_label = prediction_info['predicted_label']
     predicted_prob = prediction_info['predicted_probability']
@@ -56,21 +59,118 @@ def llm_input_aggregator(prediction_info, retrieved_docs):
             f"Content:\n{content}\n"
         )
 
-    llm_input_str = f"{insights}{sources}"
-    
-    # Generate clinical explanation using LLM
-    explanation = generate_clinical_explanation(llm_input_str)
-    
+    return f"{insights}{sources}"
+
+# === Explanation Cache ===
+# Every entry point looks explanations up and stores them through these helpers,
+# so the key and what gets cached cannot drift between them.
+
+def _cache_key(cache, prediction_info, retrieved_docs) -> Optional[str]:
+    return cache.make_key(prediction_info, retrieved_docs, PROMPT_VERSION) if cache is not None else None
+
+def _cached_explanation(cache, key: str, produce: Callable[[], str]) -> Tuple[str, bool]:
+    """(explanation, cached): the explanation stored under `key`, or produce()'s, which is stored"""
+    if cache is not None:
+        explanation = cache.get(key)
+        if explanation is not None:
+            return explanation, True
+    explanation = produce()
+    if cache is not None:
+        cache.set(key, explanation)
+    return explanation, False
+
+async def _acached_explanation(cache, key: str, produce: Callable[[], Awaitable[str]]) -> Tuple[str, bool]:
+    """Async _cached_explanation"""
+    if cache is not None:
+        explanation = cache.get(key)
+        if explanation is not None:
+            return explanation, True
+    explanation = await produce()
+    if cache is not None:
+        cache.set(key, explanation)
+    return explanation, False
+
+def _cached_stream(cache, key: str, produce: Callable[[], Iterator[str]]) -> Iterator[str]:
+    """Yield the explanation stored under `key` as one fragment, or produce()'s fragments"""
+    if cache is not None:
+        explanation = cache.get(key)
+        if explanation is not None:
+            yield explanation
+            return
+
+    fragments = []
+    for text in produce():
+        fragments.append(text)
+        yield text
+
+    # Only cache explanations that streamed to completion
+    if cache is not None:
+        cache.set(key, "".join(fragments))
+
+async def _acached_stream(cache, key: str, produce: Callable[[], AsyncIterator[str]]) -> AsyncIterator[str]:
+    """Async _cached_stream"""
+    if cache is not None:
+        explanation = cache.get(key)
+        if explanation is not None:
+            yield explanation
+            return
+
+    fragments = []
+    async for text in produce():
+        fragments.append(text)
+        yield text
+
+    if cache is not None:
+        cache.set(key, "".join(fragments))
+
+def llm_input_aggregator(prediction_info, retrieved_docs, cache=None):
+    llm_input_str = build_llm_input(prediction_info, retrieved_docs)
+
+    # Reuse the explanation of an earlier prediction with the same signature
+    explanation, cached = _cached_explanation(
+        cache,
+        _cache_key(cache, prediction_info, retrieved_docs),
+        lambda: generate_clinical_explanation(llm_input_str)
+    )
     return {
         'raw_input': llm_input_str,
-        'explanation': explanation
+        'explanation': explanation,
+        'cached': cached
     }
 
-def generate_clinical_explanation(llm_input: str) -> str:
-    """Generate a clinical explanation using OpenAI's model"""
+def stream_llm_explanation(prediction_info, retrieved_docs, cache=None) -> Iterator[str]:
+    """Streaming counterpart of llm_input_aggregator; a cache hit is yielded as one fragment"""
+    return _cached_stream(
+        cache,
+        _cache_key(cache, prediction_info, retrieved_docs),
+        lambda: stream_clinical_explanation(build_llm_input(prediction_info, retrieved_docs))
+    )
+
+async def allm_input_aggregator(prediction_info, retrieved_docs, cache=None):
+    """Async llm_input_aggregator; the LLM call is awaited instead of blocking a thread"""
+    llm_input_str = build_llm_input(prediction_info, retrieved_docs)
+
+    explanation, cached = await _acached_explanation(
+        cache,
+        _cache_key(cache, prediction_info, retrieved_docs),
+        lambda: agenerate_clinical_explanation(llm_input_str)
+    )
+    return {
+        'raw_input': llm_input_str,
+        'explanation': explanation,
+        'cached': cached
+    }
 
-    # Prompt template for clinical explanation
-    template = """
+def astream_llm_explanation(prediction_info, retrieved_docs, cache=None) -> AsyncIterator[str]:
+    """Async counterpart of stream_llm_explanation"""
+    return _acached_stream(
+        cache,
+        _cache_key(cache, prediction_info, retrieved_docs),
+        lambda: astream_clinical_explanation(build_llm_input(prediction_info, retrieved_docs))
+    )
+
+# Prompt template for clinical explanation
+EXPLANATION_TEMPLATE = """
     You are a clinical AI assistant trained to interpret fetal health predictions using academic literature.
 
     Given the following context:
@@ -106,24 +206,28 @@ def generate_clinical_explanation(llm_input: str) -> str:
     Keep the total explanation under 400 words.
     """
 
-    # Create prompt template
-    prompt = PromptTemplate.from_template(template)
-    
-    # Initialize OpenAI model (using GPT-4 for best results)
-    llm = ChatOpenAI(
-        model="gpt-4-turbo-preview",  # Using GPT-4 for high-quality medical explanations
-        temperature=0.5,
-        max_tokens=1000,
-        api_key=OPENAI_API_KEY
-    )
-    
-    # Create and run the chain
-    chain: Runnable = prompt | llm
-    
-    # Generate explanation
-    response = chain.invoke({"llm_input": llm_input})
-    
-    return response.content
+# Built once; every call only formats it
+EXPLANATION_PROMPT = PromptTemplate.from_template(EXPLANATION_TEMPLATE)
+
+def _explanation_prompt(llm_input: str):
+    return EXPLANATION_PROMPT.invoke({"llm_input": llm_input})
+
+def generate_clinical_explanation(llm_input: str, client: LLMClient = None) -> str:
+    """Generate a clinical explanation using OpenAI's model"""
+    return (client or get_llm_client()).invoke(_explanation_prompt(llm_input))
+
+def stream_clinical_explanation(llm_input: str, client: LLMClient = None) -> Iterator[str]:
+    """Yield the clinical explanation as it is generated, one text fragment at a time"""
+    yield from (client or get_llm_client()).stream(_explanation_prompt(llm_input))
+
+async def agenerate_clinical_explanation(llm_input: str, client: LLMClient = None) -> str:
+    """Async generate_clinical_explanation"""
+    return await (client or get_llm_client()).ainvoke(_explanation_prompt(llm_input))
+
+async def astream_clinical_explanation(llm_input: str, client: LLMClient = None) -> AsyncIterator[str]:
+    """Async stream_clinical_explanation"""
+    async for text in (client or get_llm_client()).astream(_explanation_prompt(llm_input)):
+        yield text
 
 if __name__ == "__main__":
     # Example usage
@@ -1,41 +1,135 @@
 import os
 import shutil
+import pickle
+import asyncio
+import threading
+import time
+import itertools
+import faiss
 import numpy as np
 from sklearn.metrics.pairwise import cosine_similarity
-import requests
-import xmltodict
-from langchain.embeddings import OpenAIEmbeddings
 from langchain_community.vectorstores import FAISS
+from langchain_community.docstore.in_memory import InMemoryDocstore
 from langchain_core.documents import Document
 import json
 from datetime import datetime
-from typing import List, Dict
+from typing import Callable, Dict, Iterable, List, Optional
+from collections import OrderedDict
 from pathlib import Path
 import hashlib
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+import uuid
 import re
-from langchain_openai import ChatOpenAI
 from langchain_core.prompts import PromptTemplate
-from langchain_core.runnables import Runnable
-from config import OPENAI_API_KEY
+from llm_client import get_llm_client
+from config import (OPENAI_API_KEY, EMBEDDING_BACKEND, EMBEDDING_CACHE_PATH, EMBEDDING_CACHE_MAX_ENTRIES,
+                    STORE_FLUSH_INTERVAL, STORE_COMPACT_RATIO, STORE_MAX_SEGMENTS, RETRIEVAL_CACHE_SIZE, PAPERS_DB_PATH, ARXIV_API_URL,
+                    ARXIV_MIN_INTERVAL, ARXIV_MAX_WORKERS, ARXIV_TIMEOUT, ARXIV_MAX_RETRIES, INGEST_BATCH_SIZE,
+                    INGEST_BATCH_TOKENS, INGEST_EMBED_CONCURRENCY, INGEST_EMBED_RETRIES,
+                    CHUNK_SIZE, CHUNK_OVERLAP, FAISS_INDEX_TYPE, SEARCH_MODE, BM25_K1, BM25_B, RRF_K,
+                    VECTOR_STORAGE, MMAP_SEARCH_BLOCK_ROWS)
+from embedding_cache import CachedEmbeddings
+from embedding_backends import build_embeddings, embedding_signature, signature_mismatch
+from ingest_embedder import EmbeddedSpool, IngestEmbedder, load_token_counter
+from store_persistence import FileData, StoreChanges, StorePersister, encode_segment, read_segments
+from rw_lock import ReadWriteLock
+from arxiv_client import ArxivClient
+from document_ingest import iter_chunks
+from bm25_index import BM25Index, reciprocal_rank_fusion
+import faiss_index
+from mmap_store import MmapVectorStore, VECTOR_STORAGES
+
+# Ranking behind search_papers_by_keyword
+SEARCH_MODES = ("hybrid", "keyword", "vector")
 
 class paperRag:
+    # arXiv queries used to seed an empty store and to refresh it
+    DEFAULT_ARXIV_QUERIES = [
+        "fetal health cardiotocography",
+        "CTG analysis machine learning",
+        "fetal monitoring classification",
+        "fetal heart rate variability",
+        "fetal monitoring patterns"
+    ]
+
     def __init__(self, top_features=None):
+        if VECTOR_STORAGE not in VECTOR_STORAGES:
+            raise ValueError(f"Unknown vector storage: {VECTOR_STORAGE} (expected one of {', '.join(VECTOR_STORAGES)})")
+
         # === Project Setup ===
         project_root = Path(__file__).resolve().parent
-        db_path = os.path.join(str(project_root), "papers_db")
+        db_path = PAPERS_DB_PATH or os.path.join(str(project_root), "papers_db")
 
-        # Initialize embeddings
-        self.embeddings = OpenAIEmbeddings(
-            model="text-embedding-ada-002",
-            openai_api_key=os.getenv("OPENAI_API_KEY")
+        # Remote embeddings sit behind a persistent cache so repeated texts are embedded once;
+        # the local backend is cheaper to recompute than to look up
+        self.embedding_signature = embedding_signature(EMBEDDING_BACKEND)
+        self.embeddings = build_embeddings(EMBEDDING_BACKEND)
+        if EMBEDDING_BACKEND != "local":
+            cache_path = EMBEDDING_CACHE_PATH or os.path.join(str(project_root), "embedding_cache.sqlite")
+            self.embeddings = CachedEmbeddings(
+                self.embeddings,
+                cache_path=cache_path,
+                model_name=self.embedding_signature['model'],
+                max_entries=EMBEDDING_CACHE_MAX_ENTRIES
+            )
+        # Ingestion embeds in token-budgeted batches, several in flight; only OpenAI counts real tokens
+        self.ingest_embedder = IngestEmbedder(
+            self.embeddings,
+            load_token_counter(self.embedding_signature['model'] if EMBEDDING_BACKEND == "openai" else None),
+            max_batch_tokens=INGEST_BATCH_TOKENS,
+            max_batch_texts=INGEST_BATCH_SIZE,
+            max_concurrency=INGEST_EMBED_CONCURRENCY,
+            max_retries=INGEST_EMBED_RETRIES
+        )
+        self.arxiv = ArxivClient(
+            ARXIV_API_URL,
+            min_interval=ARXIV_MIN_INTERVAL,
+            max_workers=ARXIV_MAX_WORKERS,
+            timeout=ARXIV_TIMEOUT,
+            max_retries=ARXIV_MAX_RETRIES
         )
         self.papers = []
         self.vectors = None
         self.vector_store = None
         self.db_location = db_path
+        # Default features for retrieve_relevant_chunks calls that do not pass their own
         self.top_features = top_features
+        # Paper hash -> {title, chunk ids}, kept in step with the docstore and saved beside index.faiss
+        self.paper_index = {}
+        self._next_seq = 0
+        # Chunk id -> BM25 postings, built from the docstore on the first keyword search and
+        # updated with every insert and delete, so startup never reads every chunk
+        self.lexical_index = BM25Index(k1=BM25_K1, b=BM25_B)
+        self._lexical_ready = False
+        self._lexical_lock = threading.Lock()
+        # Hashes of documents being embedded by add_paper_stream, so concurrent duplicates are refused
+        self._ingesting = set()
+        self._ingest_lock = threading.Lock()
+
+        # (features, top_k, min_score, index_version) -> retrieved chunks; every mutation bumps index_version
+        self.index_version = 0
+        self._retrieval_cache = OrderedDict()
+        self._retrieval_cache_lock = threading.Lock()
+        self.retrieval_hits = 0
+        self.retrieval_misses = 0
+
+        # Searches share the store; add/remove mutations take it exclusively.
+        # Mutations mark the store dirty; segments and snapshots are written in the background
+        self._store_lock = ReadWriteLock()
+        self._changes = StoreChanges()
+        self._segment_papers = {}
+        self.persister = StorePersister(
+            self.db_location,
+            self._serialize_store,
+            self._store_lock.reader,
+            interval=STORE_FLUSH_INTERVAL,
+            on_publish=self._on_snapshot_published,
+            serialize_segment=self._serialize_segment
+        )
         self.initialize_vector_store()
+        self._apply_segments()
+        self._check_embedding_signature()
+        self._match_storage()
+        self._load_paper_index()
 
     def initialize_vector_store(self):
         """Initialize the vector store with downloaded papers"""
@@ -45,17 +139,27 @@ class paperRag:
             os.chmod(self.db_location, 0o755)  # Set directory permissions to rwxr-xr-x
             
             # Check if we have an existing index file
-            index_path = os.path.join(self.db_location, "index.faiss")
-            if os.path.exists(index_path):
+            store_dir = self.persister.open_snapshot()
+            index_path = os.path.join(store_dir, "index.faiss")
+            if MmapVectorStore.exists(store_dir):
+                # Maps the vectors and opens the chunk table; nothing is read until searched
+                self.vector_store = MmapVectorStore.load(store_dir, block_rows=MMAP_SEARCH_BLOCK_ROWS)
+                if len(self.vector_store.docstore._dict) > 0:
+                    print(f"Mapped existing vector store with {len(self.vector_store.docstore._dict)} documents")
+                    return
+                print("Vector store exists but is empty")
+                self.vector_store.close()
+            elif os.path.exists(index_path):
                 try:
                     # Try to load existing store
                     self.vector_store = FAISS.load_local(
-                        self.db_location,
+                        store_dir,
                         self.embeddings
                     )
                     # Verify the store has documents
                     if len(self.vector_store.docstore._dict) > 0:
                         print(f"Successfully loaded existing vector store with {len(self.vector_store.docstore._dict)} documents")
+                        self._check_index_type()
                         return
                     else:
                         print("Vector store exists but is empty")
@@ -65,12 +169,13 @@ class paperRag:
                     try:
                         # Try to load the store again with a different approach
                         self.vector_store = FAISS.load_local(
-                            self.db_location,
+                            store_dir,
                             self.embeddings,
                             allow_dangerous_deserialization=True
                         )
                         if len(self.vector_store.docstore._dict) > 0:
                             print(f"Recovered existing vector store with {len(self.vector_store.docstore._dict)} documents")
+                            self._check_index_type()
                             return
                     except Exception as recovery_error:
                         print(f"Recovery attempt failed: {recovery_error}")
@@ -80,18 +185,8 @@ class paperRag:
             # Only create a new store if we absolutely have to
             if not self.vector_store or len(self.vector_store.docstore._dict) == 0:
                 print("Creating new vector store")
-                # Create a new store with a minimal document to initialize dimensions
-                self.vector_store = FAISS.from_texts(
-                    ["Initialize vector store dimensions"],  # Minimal document to set up dimensions
-                    self.embeddings
-                )
-                # Remove the initialization document
-                self.vector_store = FAISS.from_texts(
-                    [],  # Now create empty store
-                    self.embeddings,
-                    index=self.vector_store.index  # Reuse the initialized index
-                )
-                self.vector_store.save_local(self.db_location)
+                self.vector_store = self._new_vector_store()
+                self._mark_dirty()
                 print("Created new empty vector store")
                 
         except Exception as e:
@@ -99,62 +194,107 @@ class paperRag:
             # Only create a new store if we have no store at all
             if not self.vector_store:
                 print("Attempting to create new store after critical error")
-                # Create store with minimal document and then remove it
-                temp_store = FAISS.from_texts(
-                    ["Initialize vector store dimensions"],
-                    self.embeddings
-                )
-                self.vector_store = FAISS.from_texts(
-                    [],
-                    self.embeddings,
-                    index=temp_store.index
-                )
-                self.vector_store.save_local(self.db_location)
+                self.vector_store = self._new_vector_store()
+                self._mark_dirty()
                 print("Created new vector store after critical error")
 
+    def _new_vector_store(self):
+        """Create an empty store sized for the configured embedding backend, without embedding anything"""
+        dim = self.embedding_signature['dimension']
+        if VECTOR_STORAGE == "mmap":
+            return MmapVectorStore(dim, block_rows=MMAP_SEARCH_BLOCK_ROWS)
+        return FAISS(self.embeddings, self._empty_index(dim), InMemoryDocstore(), {})
+
+    def _match_storage(self):
+        """Convert a store saved in the other VECTOR_STORAGE format, keeping its vectors
+
+        The converted store is marked dirty, so the next flush saves it in the new format.
+        """
+        store = self.vector_store
+        if VECTOR_STORAGE == "mmap" and not isinstance(store, MmapVectorStore):
+            labels = sorted(store.index_to_docstore_id)
+            if labels:
+                vectors, exact = faiss_index.reconstruct_vectors(store.index, labels)
+            else:
+                vectors, exact = np.zeros((0, store.index.d), dtype=np.float32), True
+            if not exact:
+                print("Converting a product-quantized index keeps its approximate vectors; "
+                      "rebuild it as flat first to keep exact ones")
+            converted = MmapVectorStore(store.index.d, block_rows=MMAP_SEARCH_BLOCK_ROWS)
+            docstore = store.docstore._dict
+            converted.add(vectors, {
+                store.index_to_docstore_id[label]: docstore[store.index_to_docstore_id[label]] for label in labels
+            })
+        elif VECTOR_STORAGE == "faiss" and isinstance(store, MmapVectorStore):
+            docs = dict(store.docstore._dict.items())
+            vectors = store.live_vectors()
+            try:
+                index = faiss_index.build_from_vectors(FAISS_INDEX_TYPE, vectors)
+            except ValueError as e:
+                print(f"{e}; converting to a flat index (run rebuild_index.py later)")
+                index = faiss_index.build_from_vectors("flat", vectors)
+            converted = FAISS(self.embeddings, index, InMemoryDocstore(docs), dict(enumerate(docs)))
+            store.close()
+        else:
+            return
+
+        self.vector_store = converted
+        self._mark_dirty()
+        print(f"Converted the vector store to {VECTOR_STORAGE} storage ({len(converted.docstore._dict)} documents)")
+
+    def _check_embedding_signature(self):
+        """Refuse to use a store whose vectors came from a different embedding backend
+
+        Stores saved before the signature was recorded were all built with the
+        OpenAI backend. Raises RuntimeError rather than letting queries embedded
+        one way search vectors embedded another.
+        """
+        meta_path = os.path.join(self.persister.store_dir, "embedding_meta.json")
+        if isinstance(self.vector_store, MmapVectorStore):
+            dimension = self.vector_store.dimension
+        else:
+            dimension = self.vector_store.index.d
+        if not len(self.vector_store.docstore._dict):
+            stored = None
+        elif os.path.exists(meta_path):
+            with open(meta_path, 'r') as f:
+                stored = json.load(f)
+        else:
+            stored = {'backend': 'openai', 'model': 'text-embedding-ada-002', 'dimension': dimension}
+
+        current = self.embedding_signature
+        reason = signature_mismatch(stored, current) if stored else None
+        if reason is None and dimension != current['dimension']:
+            reason = f"index dimension {dimension} (configured {current['dimension']})"
+        if reason:
+            self.persister.close()
+            raise RuntimeError(
+                f"The vector store in {self.db_location} was built with different embeddings: {reason}. "
+                f"Set EMBEDDING_BACKEND to match, or point PAPERS_DB_PATH at a store for this backend."
+            )
+
+    def _empty_index(self, dim: int):
+        """Empty index of the configured type; IVF types start flat until there is enough data to train"""
+        if FAISS_INDEX_TYPE in ("ivf", "ivfpq"):
+            print(f"{FAISS_INDEX_TYPE} needs training data; starting with a flat index (run rebuild_index.py later)")
+            return faiss_index.build_index("flat", dim)
+        return faiss_index.build_index(FAISS_INDEX_TYPE, dim)
+
+    def _check_index_type(self):
+        """Apply search parameters to a loaded index and point out a pending migration"""
+        index = self.vector_store.index
+        faiss_index.apply_search_params(index)
+        if faiss_index.index_type_of(index) != FAISS_INDEX_TYPE:
+            print(f"Vector store uses a {faiss_index.index_type_of(index)} index but FAISS_INDEX_TYPE is "
+                  f"{FAISS_INDEX_TYPE}; run rebuild_index.py to migrate it")
+
     def initialize_papers(self):
         """Initialize the paper database with ArXiv papers"""
         try:
-            # Fetch papers from ArXiv
-            queries = [
-                "fetal health cardiotocography",
-                "CTG analysis machine learning",
-                "fetal monitoring classification",
-                "fetal heart rate variability",
-                "fetal monitoring patterns"
-            ]
-            
-            all_papers = []
-            for query in queries:
-                print(f"Fetching papers for query: {query}")
-                papers = self._fetch_arxiv_papers(query, max_results=10)  # Increased max results
-                all_papers.extend(papers)
-            
-            if all_papers:
-                # Convert papers to documents
-                documents = []
-                for paper in all_papers:
-                    content = f"""
-                    Title: {paper['title']}
-                    Authors: {paper['authors']}
-                    Published: {paper['published']}
-                    
-                    Abstract:
-                    {paper['abstract']}
-                    """
-                    paper_hash = self._generate_paper_hash(paper['title'], content)
-                    documents.append(Document(
-                        page_content=content,
-                        metadata={
-                            "title": paper['title'],
-                            "hash": paper_hash
-                        }
-                    ))
-                
-                # Add to vector store
-                self.vector_store.add_documents(documents)
-                self.vector_store.save_local(self.db_location)
-                print(f"Added {len(documents)} papers to vector store")
+            papers = self.download_papers()
+            if papers:
+                added_count = self._add_papers_to_store(papers)
+                print(f"Added {added_count} papers to vector store")
             else:
                 print("No papers found to add")
                 
@@ -168,6 +308,474 @@ class paperRag:
         text = (title + content).encode('utf-8')
         return hashlib.md5(text).hexdigest()
 
+    def _paper_hash_for(self, doc: Document) -> str:
+        """Return the paper hash of a chunk, deriving it for chunks stored without one"""
+        if 'hash' in doc.metadata:
+            return doc.metadata['hash']
+        return self._generate_paper_hash(doc.metadata.get('title', 'Unknown'), doc.page_content)
+
+    def _new_index_entry(self, title: str, added_at: str = None) -> Dict:
+        entry = {
+            'title': title,
+            'ids': [],
+            'bytes': 0,
+            'seq': self._next_seq,
+            'added_at': added_at
+        }
+        self._next_seq += 1
+        return entry
+
+    def _rebuild_paper_index(self):
+        """Rebuild the paper hash -> chunk ids index from the docstore"""
+        self.paper_index = {}
+        self._next_seq = 0
+        if not self.vector_store:
+            return
+        for doc_id, doc in self.vector_store.docstore._dict.items():
+            if isinstance(doc, Document):
+                paper_hash = self._paper_hash_for(doc)
+                if paper_hash not in self.paper_index:
+                    self.paper_index[paper_hash] = self._new_index_entry(doc.metadata.get('title', 'Unknown'))
+                entry = self.paper_index[paper_hash]
+                entry['ids'].append(doc_id)
+                entry['bytes'] += len(doc.page_content.encode('utf-8'))
+
+    def _rebuild_lexical_index(self):
+        """Index the text of every stored chunk for keyword search"""
+        self.lexical_index.clear()
+        if self.vector_store:
+            self.lexical_index.add_many(
+                (doc_id, doc.page_content)
+                for doc_id, doc in self.vector_store.docstore._dict.items()
+                if isinstance(doc, Document)
+            )
+        self._lexical_ready = True
+
+    def _ensure_lexical_index(self):
+        """Build the keyword index on first use; the caller holds the store lock"""
+        if self._lexical_ready:
+            return
+        with self._lexical_lock:
+            if not self._lexical_ready:
+                self._rebuild_lexical_index()
+
+    def _load_paper_index(self):
+        """Load the persisted paper index, rebuilding it if it is missing or out of date"""
+        index_path = os.path.join(self.persister.store_dir, "paper_index.json")
+        docstore = self.vector_store.docstore._dict if self.vector_store else {}
+        segment_papers, self._segment_papers = self._segment_papers, {}
+        try:
+            with open(index_path, 'r') as f:
+                paper_index = json.load(f)
+            for paper_hash, entry in segment_papers.items():
+                if entry is None:
+                    paper_index.pop(paper_hash, None)
+                else:
+                    paper_index[paper_hash] = entry
+            indexed_ids = [doc_id for entry in paper_index.values() for doc_id in entry['ids']]
+            # A mapped snapshot's chunk table and segments are written in the same flushes as
+            # the paper index, so while nothing has changed since loading them the count is
+            # checked without looking every chunk up on disk
+            mapped = isinstance(self.vector_store, MmapVectorStore) and not self.persister.dirty
+            if (len(indexed_ids) == len(docstore)
+                    and (mapped or all(doc_id in docstore for doc_id in indexed_ids))
+                    and all('seq' in entry and 'bytes' in entry for entry in paper_index.values())):
+                self.paper_index = paper_index
+                self._next_seq = max((entry['seq'] for entry in paper_index.values()), default=-1) + 1
+                return
+            print("Paper index is out of date, rebuilding")
+        except FileNotFoundError:
+            print("No paper index found, building one")
+        except Exception as e:
+            print(f"Error loading paper index: {e}")
+
+        self._rebuild_paper_index()
+        if self.vector_store:
+            self._mark_dirty()
+
+    def _apply_segments(self):
+        """Replay the segments flushed onto the loaded snapshot, oldest first"""
+        names = self.persister.segments
+        snapshot_rows = len(self.vector_store.docstore._dict)
+        segment_rows = 0
+        try:
+            for segment in read_segments(self.persister.store_dir, names):
+                docstore = self.vector_store.docstore._dict
+                removed = [doc_id for doc_id in segment['removed'] if doc_id in docstore]
+                if removed:
+                    self._delete_chunks(removed)
+                if segment['ids']:
+                    self._insert_embeddings(segment['texts'], segment['vectors'], segment['metadatas'], segment['ids'])
+                self._segment_papers.update(segment['papers'])
+                segment_rows += len(segment['ids']) + len(segment['removed'])
+        except Exception as e:
+            # Keep what was replayed; the paper index is rebuilt and the next flush rewrites the snapshot
+            print(f"Error applying store segments: {e}")
+            self._segment_papers = {}
+            self._mark_dirty()
+        if names:
+            print(f"Applied {len(names)} segments ({segment_rows} chunks added or removed)")
+        self._changes.reset(snapshot_rows, segment_rows, len(names), compact=self.persister.dirty)
+
+    def _serialize_store(self) -> Dict[str, FileData]:
+        """Serialize the store in FAISS.save_local's layout (or mmap_store's), plus the paper index"""
+        if isinstance(self.vector_store, MmapVectorStore):
+            files = self.vector_store.serialize()
+        else:
+            files = {
+                "index.faiss": faiss.serialize_index(self.vector_store.index).tobytes(),
+                "index.pkl": pickle.dumps((self.vector_store.docstore, self.vector_store.index_to_docstore_id))
+            }
+        files["paper_index.json"] = json.dumps(self.paper_index).encode('utf-8')
+        files["embedding_meta.json"] = json.dumps(self.embedding_signature).encode('utf-8')
+        self._changes.reset(len(self.vector_store.docstore._dict))
+        return files
+
+    def _serialize_segment(self) -> Optional[Dict[str, bytes]]:
+        """The chunks added and removed since the last flush, or None when the snapshot is due a rewrite"""
+        if not self._changes.segment_due(STORE_COMPACT_RATIO, STORE_MAX_SEGMENTS):
+            return None
+        added, removed, papers = self._changes.take()
+        docstore = self.vector_store.docstore._dict
+        docs = [docstore[doc_id] for doc_id in added]
+        if isinstance(self.vector_store, MmapVectorStore):
+            dimension = self.vector_store.dimension
+        else:
+            dimension = self.vector_store.index.d
+        return encode_segment(
+            dimension,
+            list(added),
+            np.asarray(list(added.values()), dtype=np.float32),
+            [doc.page_content for doc in docs],
+            [doc.metadata for doc in docs],
+            removed,
+            {paper_hash: self.paper_index.get(paper_hash) for paper_hash in papers}
+        )
+
+    def _on_snapshot_published(self, snapshot_dir: str):
+        """Switch a mapped store to the snapshot just written, so this process stops reading the previous one"""
+        with self._store_lock.writer:
+            if isinstance(self.vector_store, MmapVectorStore):
+                self.vector_store.rebase(snapshot_dir)
+
+    def _mark_dirty(self, incremental: bool = False):
+        """Schedule the store and paper index for the next background flush
+
+        `incremental` changes are the inserts and deletes _insert_embeddings and
+        _delete_chunks record, which the next flush can append as a segment; any
+        other change makes it rewrite the snapshot.
+        """
+        if not incremental:
+            self._changes.compact = True
+        self.persister.mark_dirty()
+        # Cached retrievals from the previous index version can never match again
+        with self._retrieval_cache_lock:
+            self.index_version += 1
+            self._retrieval_cache.clear()
+
+    def flush(self) -> bool:
+        """Write any pending changes to disk now"""
+        return self.persister.flush()
+
+    def close(self):
+        """Stop background persistence, flushing pending changes first"""
+        self.persister.close()
+        if isinstance(self.vector_store, MmapVectorStore):
+            self.vector_store.close()
+
+    def _index_chunks(self, ids: List[str], metadatas: List[Dict]):
+        """Record newly added chunk ids under their paper hash"""
+        docstore = self.vector_store.docstore._dict
+        added_at = datetime.now().isoformat()
+        for doc_id, metadata in zip(ids, metadatas):
+            paper_hash = metadata['hash']
+            if paper_hash not in self.paper_index:
+                self.paper_index[paper_hash] = self._new_index_entry(metadata.get('title', 'Unknown'), added_at)
+            entry = self.paper_index[paper_hash]
+            entry['ids'].append(doc_id)
+            entry['bytes'] += len(docstore[doc_id].page_content.encode('utf-8'))
+            self._changes.touch(paper_hash)
+
+    def _commit_embedded(self, texts: List[str], vectors: List[List[float]], metadatas: List[Dict],
+                         ids: List[str] = None) -> List[str]:
+        """Insert and index one embedded batch under the write lock, as a single FAISS insert"""
+        with self._store_lock.writer:
+            ids = self._insert_embeddings(texts, vectors, metadatas, ids)
+            self._index_chunks(ids, metadatas)
+            self._mark_dirty(incremental=True)
+        return ids
+
+    def _insert_embeddings(self, texts: List[str], vectors: List[List[float]], metadatas: List[Dict],
+                           ids: List[str] = None) -> List[str]:
+        """Add embedded texts to the index and docstore; the caller holds the write lock
+
+        Labels are assigned per index type (see faiss_index.next_label), which
+        LangChain's add_embeddings does not do for IVF or tombstoned HNSW indexes.
+        """
+        ids = ids or [str(uuid.uuid4()) for _ in texts]
+        # Reject clashing ids before the index is touched, so a failed insert leaves no orphan vector
+        docstore = self.vector_store.docstore._dict
+        seen = set()
+        clashing = [doc_id for doc_id in ids if doc_id in docstore or doc_id in seen or seen.add(doc_id)]
+        if clashing:
+            raise ValueError(f"Chunk ids already stored or repeated in the batch: {clashing}")
+        docs = {
+            doc_id: Document(page_content=text, metadata=metadata, id=doc_id)
+            for doc_id, text, metadata in zip(ids, texts, metadatas)
+        }
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if isinstance(self.vector_store, MmapVectorStore):
+            self.vector_store.add(vectors, docs)
+        else:
+            index = self.vector_store.index
+            labels = faiss_index.add_vectors(
+                index,
+                vectors,
+                faiss_index.next_label(index, self.vector_store.index_to_docstore_id)
+            )
+            self.vector_store.docstore.add(docs)
+            self.vector_store.index_to_docstore_id.update(zip(labels, ids))
+        self.lexical_index.add_many(zip(ids, texts))
+        self._changes.add(ids, vectors)
+        return ids
+
+    def _search_by_vector(self, vector: List[float], k: int):
+        """Search the store under a shared read lock, returning (document, distance) pairs"""
+        return [(doc, distance) for _, doc, distance in self._search_ids_by_vector(vector, k)]
+
+    def _search_ids_by_vector(self, vector: List[float], k: int):
+        """Search the store under a shared read lock, skipping tombstoned vectors; returns (id, document, distance)"""
+        with self._store_lock.reader:
+            return self._search_locked(np.asarray(vector, dtype=np.float32), k)
+
+    def _versioned_search(self, vector: List[float], k: int):
+        """Search like _search_by_vector, also returning the index_version the results were read at"""
+        with self._store_lock.reader:
+            results = self._search_locked(np.asarray(vector, dtype=np.float32), k)
+            return [(doc, distance) for _, doc, distance in results], self.index_version
+
+    def _search_locked(self, query: np.ndarray, k: int):
+        """(id, document, distance) for the k nearest chunks; the caller holds the store lock"""
+        if isinstance(self.vector_store, MmapVectorStore):
+            return self.vector_store.search(query, k)
+        index = self.vector_store.index
+        index_to_docstore_id = self.vector_store.index_to_docstore_id
+        docstore = self.vector_store.docstore._dict
+        tombstones = index.ntotal - len(index_to_docstore_id)
+        fetch = k
+        while True:
+            distances, labels = faiss_index.search(index, query, fetch)
+            results = [
+                (index_to_docstore_id[label], docstore[index_to_docstore_id[label]], float(distance))
+                for distance, label in zip(distances, labels)
+                if label in index_to_docstore_id
+            ]
+            # Deleted HNSW vectors can crowd out live ones; widen the search until k survive
+            if len(results) >= k or not tombstones or fetch >= index.ntotal:
+                return results[:k]
+            fetch = min(fetch * 4, index.ntotal)
+
+    def _add_texts_batched(self, texts: List[str], metadatas: List[Dict], ids: List[str] = None,
+                           progress: Callable[[Dict], None] = None) -> List[str]:
+        """Embed texts in token-budgeted batches outside the store lock, committing each batch as it is ready
+
+        `progress` is called after every batch with {'done', 'total'} chunk counts
+        and the ingest throughput (see IngestEmbedder.iter_batches).
+        """
+        added_ids = []
+        run = {}
+        for start, batch, vectors in self.ingest_embedder.iter_batches(texts, run):
+            end = start + len(batch)
+            added_ids.extend(self._commit_embedded(
+                batch,
+                vectors,
+                metadatas[start:end],
+                ids=ids[start:end] if ids else None
+            ))
+            if progress:
+                progress({'done': len(added_ids), 'total': len(texts), **run})
+        if texts:
+            print(f"Embedded {run['chunks']} chunks ({run['tokens']} tokens) in {run['batches']} batches: "
+                  f"{run['chunks_per_second']} chunks/s, {run['tokens_per_second']} tokens/s")
+        return added_ids
+
+    def _similarity_search_with_score(self, query: str, k: int):
+        """Embed the query outside the store lock, then search under a shared read lock"""
+        return self._search_by_vector(self.embeddings.embed_query(query), k)
+
+    def has_paper(self, paper_hash: str) -> bool:
+        """Check whether a paper is already stored"""
+        return paper_hash in self.paper_index
+
+    def _paper_summary(self, paper_hash: str, entry: Dict, preview_chars: int = 200) -> Dict:
+        first_chunk = self.vector_store.docstore._dict[entry['ids'][0]].page_content.strip()
+        preview = first_chunk[:preview_chars]
+        if len(first_chunk) > preview_chars:
+            preview += "..."
+        return {
+            'hash': paper_hash,
+            'title': entry['title'],
+            'chunk_count': len(entry['ids']),
+            'bytes': entry['bytes'],
+            'added_to_db': entry.get('added_at'),
+            'preview': preview
+        }
+
+    def get_paper_catalog(self, cursor: str = None, limit: int = 50) -> Dict:
+        """Return one summary per paper, newest first, a page at a time"""
+        with self._store_lock.reader:
+            entries = sorted(self.paper_index.items(), key=lambda item: item[1]['seq'], reverse=True)
+            if cursor:
+                # The cursor is the sequence number of the last paper on the previous page
+                last_seq = int(cursor)
+                entries = [item for item in entries if item[1]['seq'] < last_seq]
+
+            page = entries[:limit]
+            next_cursor = str(page[-1][1]['seq']) if len(entries) > limit else None
+            return {
+                'papers': [self._paper_summary(paper_hash, entry) for paper_hash, entry in page],
+                'next_cursor': next_cursor,
+                'total': len(self.paper_index)
+            }
+
+    def get_paper(self, paper_hash: str) -> Dict:
+        """Return a single paper with the full content of every chunk"""
+        with self._store_lock.reader:
+            entry = self.paper_index.get(paper_hash)
+            if entry is None:
+                return None
+
+            docstore = self.vector_store.docstore._dict
+            docs = [docstore[doc_id] for doc_id in entry['ids']]
+        docs.sort(key=lambda doc: doc.metadata.get('chunk_index', 0))
+        return {
+            'hash': paper_hash,
+            'title': entry['title'],
+            'added_to_db': entry.get('added_at'),
+            'chunks': [
+                {
+                    'chunk_index': doc.metadata.get('chunk_index', i),
+                    'content': doc.page_content
+                }
+                for i, doc in enumerate(docs)
+            ]
+        }
+
+    def _delete_chunks(self, ids: List[str]):
+        """Remove chunks from the index and docstore in place, without re-embedding the rest"""
+        docstore = self.vector_store.docstore._dict
+        removed = {
+            doc_id: (self._paper_hash_for(docstore[doc_id]), len(docstore[doc_id].page_content.encode('utf-8')))
+            for doc_id in ids
+        }
+        # mmap storage tombstones deleted rows until the next snapshot drops them
+        mmap = isinstance(self.vector_store, MmapVectorStore)
+        index = None if mmap else self.vector_store.index
+        if mmap or (faiss_index.supports_removal(index) and faiss_index.renumbers_on_removal(index)):
+            self.vector_store.delete(ids)
+        else:
+            # IVF keeps the labels it was given and HNSW cannot remove at all (the vector
+            # stays as a tombstone until the next rebuild), so neither is renumbered
+            doomed = set(ids)
+            labels = [label for label, doc_id in self.vector_store.index_to_docstore_id.items() if doc_id in doomed]
+            if faiss_index.supports_removal(index):
+                index.remove_ids(np.asarray(labels, dtype=np.int64))
+            for label in labels:
+                del self.vector_store.index_to_docstore_id[label]
+            self.vector_store.docstore.delete(ids)
+        for doc_id in ids:
+            self.lexical_index.remove(doc_id)
+        self._changes.remove(ids)
+
+        for doc_id, (paper_hash, size) in removed.items():
+            self._changes.touch(paper_hash)
+            entry = self.paper_index.get(paper_hash)
+            if entry is None:
+                continue
+            if doc_id in entry['ids']:
+                entry['ids'].remove(doc_id)
+                entry['bytes'] -= size
+            if not entry['ids']:
+                del self.paper_index[paper_hash]
+
+    def rebuild_index(self, index_type: str = None, nlist: int = None) -> Dict:
+        """Rebuild the FAISS index as `index_type` from the stored vectors, without re-embedding
+
+        Vectors are read back from the current index. A product-quantized index only
+        holds approximations, so exact vectors are taken from the embedding cache where
+        it still has them. The new index is built outside the store lock and swapped in
+        only if nothing changed the store meanwhile. Also compacts HNSW tombstones.
+        """
+        index_type = index_type or FAISS_INDEX_TYPE
+        if index_type not in faiss_index.INDEX_TYPES:
+            return {'status': 'error', 'message': f'Unknown index type: {index_type}'}
+        if isinstance(self.vector_store, MmapVectorStore):
+            return {'status': 'error', 'message': 'mmap storage is always searched exactly and has no FAISS index; '
+                                                  'set VECTOR_STORAGE=faiss to use FAISS index types'}
+
+        for _ in range(3):
+            started = time.perf_counter()
+            with self._store_lock.writer:
+                version = self.index_version
+                old_index = self.vector_store.index
+                index_to_docstore_id = dict(self.vector_store.index_to_docstore_id)
+                labels = sorted(index_to_docstore_id)
+                if labels:
+                    vectors, exact = faiss_index.reconstruct_vectors(old_index, labels)
+                else:
+                    vectors, exact = np.zeros((0, old_index.d), dtype=np.float32), True
+                docstore = self.vector_store.docstore._dict
+                texts = [] if exact else [docstore[index_to_docstore_id[label]].page_content for label in labels]
+
+            approximate = 0
+            if not exact:
+                for row, cached in enumerate(self.embeddings.lookup_documents(texts)):
+                    if cached is None:
+                        approximate += 1
+                    else:
+                        vectors[row] = cached
+
+            try:
+                new_index = faiss_index.build_from_vectors(index_type, np.ascontiguousarray(vectors), nlist=nlist)
+            except ValueError as e:
+                return {'status': 'error', 'message': str(e)}
+
+            with self._store_lock.writer:
+                if self.index_version != version:
+                    continue
+                self.vector_store.index = new_index
+                self.vector_store.index_to_docstore_id = {
+                    position: index_to_docstore_id[label] for position, label in enumerate(labels)
+                }
+                self._mark_dirty()
+
+            print(f"Rebuilt {len(labels)} vectors as {index_type} in {time.perf_counter() - started:.1f}s")
+            return {
+                'status': 'success',
+                'message': f'Rebuilt the {index_type} index from {len(labels)} stored vectors',
+                'approximate_vectors': approximate,
+                'seconds': round(time.perf_counter() - started, 2),
+                'index': faiss_index.describe(new_index, len(labels))
+            }
+
+        return {'status': 'error', 'message': 'The store kept changing during the rebuild; try again'}
+
+    def index_stats(self) -> Dict:
+        """Describe the FAISS index backing the store"""
+        with self._store_lock.reader:
+            if isinstance(self.vector_store, MmapVectorStore):
+                info = self.vector_store.describe()
+            else:
+                index = self.vector_store.index
+                info = faiss_index.describe(index, len(self.vector_store.index_to_docstore_id))
+                info['memory_bytes'] = faiss_index.index_memory_bytes(index)
+            info['storage'] = VECTOR_STORAGE
+            info['configured_type'] = FAISS_INDEX_TYPE
+            info['lexical'] = self.lexical_index.stats()
+            info['embedding'] = self.embedding_signature
+            info['ingest'] = self.ingest_embedder.stats()
+            return info
+
     def _migrate_papers(self):
         """Migrate existing papers to include hashes"""
         try:
@@ -202,8 +810,11 @@ class paperRag:
                 shutil.rmtree(self.db_location)
             
             # Create new database with migrated documents
-            self.vector_store = FAISS.from_documents(documents, self.embeddings)
-            self.vector_store.save_local(self.db_location)
+            with self._store_lock.writer:
+                self.vector_store = FAISS.from_documents(documents, self.embeddings)
+                self._rebuild_paper_index()
+                self._rebuild_lexical_index()
+                self._mark_dirty()
             
         except Exception as e:
             print(f"Migration error: {e}")
@@ -215,46 +826,42 @@ class paperRag:
                 self.embeddings
             )
 
-    def _add_papers_to_store(self, papers: List[Dict]):
-        """Add papers to the vector store"""
-        documents = []
+    def _add_papers_to_store(self, papers: List[Dict], progress: Callable[[Dict], None] = None) -> int:
+        """Add papers not already stored, deduplicated by hash, in embedding batches; returns the count added"""
+        seen = set()
         texts = []
         metadatas = []
         
         for paper in papers:
+            if paper['hash'] in seen or self.has_paper(paper['hash']):
+                continue
+            seen.add(paper['hash'])
             texts.append(paper['content'])
             metadatas.append({
                 "title": paper['title'],
                 "hash": paper['hash']
             })
-            
-        self.vector_store.add_texts(texts=texts, metadatas=metadatas)
-        self.vector_store.save_local(self.db_location)
+
+        self._add_texts_batched(texts, metadatas, progress=progress)
+        return len(texts)
 
     def get_all_papers(self) -> List[Dict]:
         """Get all papers currently in the database"""
         try:
-            # Get all documents from FAISS
-            docs = self.vector_store.docstore._dict.values()
+            docstore = self.vector_store.docstore._dict
             papers = []
-            
-            for doc in docs:
-                if isinstance(doc, Document):
-                    metadata = doc.metadata
-                    # Handle papers without hash
-                    if 'hash' not in metadata:
-                        title = metadata.get('title', 'Unknown')
-                        paper_hash = self._generate_paper_hash(title, doc.page_content)
-                    else:
-                        title = metadata['title']
-                        paper_hash = metadata['hash']
-                        
-                    papers.append({
-                        'title': title,
-                        'content': doc.page_content,
-                        'hash': paper_hash
-                    })
-            
+
+            # Walk the paper index so hashes are never recomputed from content
+            with self._store_lock.reader:
+                for paper_hash, entry in self.paper_index.items():
+                    for doc_id in entry['ids']:
+                        doc = docstore[doc_id]
+                        papers.append({
+                            'title': doc.metadata.get('title', entry['title']),
+                            'content': doc.page_content,
+                            'hash': paper_hash
+                        })
+
             print(f"Retrieved {len(papers)} papers from vector store")
             return papers
         except Exception as e:
@@ -266,126 +873,204 @@ class paperRag:
         paper_hash = self._generate_paper_hash(title, content)
         
         # Check if paper already exists
-        existing_papers = self.get_all_papers()
-        if any(p['hash'] == paper_hash for p in existing_papers):
+        if self.has_paper(paper_hash):
             return {'status': 'error', 'message': 'Paper already exists in database'}
         
-        # Split content into chunks
-        splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-        chunks = splitter.split_text(content)
-        
-        # Add new paper with metadata for each chunk
-        texts = []
-        metadatas = []
-        for i, chunk in enumerate(chunks):
-            texts.append(chunk)
-            metadatas.append({
-                "title": title,
-                "hash": paper_hash,
-                "chunk_index": i,
-                "total_chunks": len(chunks)
-            })
-        
         try:
-            # Add documents to the store
-            self.vector_store.add_texts(texts=texts, metadatas=metadatas)
-            # Save the store immediately after adding documents
-            self.vector_store.save_local(self.db_location)
-            print(f"Added {len(texts)} chunks and saved to {self.db_location}")
-            return {'status': 'success', 'message': 'Paper added successfully'}
+            return self.add_paper_stream(title, lambda: [content])
+        except ValueError as e:
+            return {'status': 'error', 'message': str(e)}
+
+    def add_paper_stream(self, title: str, read_blocks: Callable[[], Iterable[str]],
+                         progress: Callable[[Dict], None] = None) -> Dict:
+        """Add a document in two passes over its text blocks, with memory bounded by a batch
+
+        The paper hash is md5(title + content), so the first pass only hashes the
+        blocks `read_blocks()` yields: a stored paper, or one being ingested right
+        now, is rejected before anything is split or embedded, and the hash is
+        reserved so a concurrent upload of the same document is rejected too. The
+        second pass splits and embeds the text batch by batch into an EmbeddedSpool,
+        then the chunks are committed under one hold of the write lock, so readers
+        never see a partial paper. `progress` is called after every embedding batch
+        with characters read and the ingest throughput. ValueError (an unreadable or
+        empty document) is raised for the caller to report.
+        """
+        digest = hashlib.md5(title.encode('utf-8'))
+        has_text = False
+        for block in read_blocks():
+            digest.update(block.encode('utf-8'))
+            has_text = has_text or bool(block.strip())
+        if not has_text:
+            raise ValueError('Invalid file type or empty file')
+
+        paper_hash = digest.hexdigest()
+        with self._ingest_lock:
+            if self.has_paper(paper_hash) or paper_hash in self._ingesting:
+                return {'status': 'error', 'message': 'Paper already exists in database'}
+            self._ingesting.add(paper_hash)
+
+        stats = {'characters': 0}
+        reread = hashlib.md5(title.encode('utf-8'))
+
+        def hashed(blocks):
+            for block in blocks:
+                reread.update(block.encode('utf-8'))
+                stats['characters'] += len(block)
+                yield block
+
+        spool = EmbeddedSpool()
+        try:
+            texts = iter_chunks(hashed(read_blocks()), CHUNK_SIZE, CHUNK_OVERLAP)
+            for _, batch_texts, batch_vectors in self.ingest_embedder.iter_batches(texts, stats):
+                spool.append(batch_texts, batch_vectors)
+                if progress:
+                    progress(dict(stats))
+            if reread.hexdigest() != paper_hash:
+                raise ValueError('The document changed while it was being read')
+            ids = self._commit_spooled(spool, title, paper_hash)
         except Exception as e:
             print(f"Error adding paper: {e}")
             return {'status': 'error', 'message': f'Error adding paper: {str(e)}'}
+        finally:
+            spool.close()
+            with self._ingest_lock:
+                self._ingesting.discard(paper_hash)
+
+        print(f"Added {len(ids)} chunks to the vector store ({stats['chunks_per_second']} chunks/s, "
+              f"{stats['tokens_per_second']} tokens/s)")
+        return {
+            'status': 'success',
+            'message': 'Paper added successfully',
+            'chunks': len(ids),
+            'tokens': stats['tokens'],
+            'chunks_per_second': stats['chunks_per_second'],
+            'tokens_per_second': stats['tokens_per_second']
+        }
+
+    def _commit_spooled(self, spool: EmbeddedSpool, title: str, paper_hash: str) -> List[str]:
+        """Insert a spooled paper batch by batch under one hold of the write lock
+
+        Readers see all of the paper or none of it; if a batch fails, the batches
+        already inserted are removed again before the lock is released.
+        """
+        total = len(spool)
+        ids = []
+        with self._store_lock.writer:
+            try:
+                for texts, vectors in spool.batches():
+                    metadatas = [
+                        {"title": title, "hash": paper_hash, "chunk_index": len(ids) + i, "total_chunks": total}
+                        for i in range(len(texts))
+                    ]
+                    batch_ids = self._insert_embeddings(texts, vectors, metadatas)
+                    ids.extend(batch_ids)
+                    self._index_chunks(batch_ids, metadatas)
+            except Exception:
+                if ids:
+                    self._delete_chunks(ids)
+                raise
+            finally:
+                if ids:
+                    self._mark_dirty(incremental=True)
+        return ids
+
+    def add_chunked_papers(self, papers: List[Dict], progress: Callable[[Dict], None] = None) -> Dict:
+        """Add already split papers ({'title', 'hash', 'chunks'}) with one batched embed and insert
+
+        Papers already stored, or repeated within the batch, are skipped. Returns the
+        added and skipped papers.
+        """
+        seen = set()
+        added = []
+        skipped = []
+        texts = []
+        metadatas = []
 
-    def remove_duplicates(self) -> Dict:
-        """Remove duplicate papers based on hash"""
-        papers = self.get_all_papers()
-        seen_hashes = set()
-        unique_papers = []
-        
         for paper in papers:
-            if paper['hash'] not in seen_hashes:
-                seen_hashes.add(paper['hash'])
-                unique_papers.append(paper)
-        
-        if len(unique_papers) < len(papers):
-            # Create new store with only unique papers
-            texts = []
-            metadatas = []
-            for paper in unique_papers:
-                texts.append(paper['content'])
+            if paper['hash'] in seen or self.has_paper(paper['hash']):
+                skipped.append(paper)
+                continue
+            seen.add(paper['hash'])
+            added.append(paper)
+            for i, chunk in enumerate(paper['chunks']):
+                texts.append(chunk)
                 metadatas.append({
                     "title": paper['title'],
-                    "hash": paper['hash']
+                    "hash": paper['hash'],
+                    "chunk_index": i,
+                    "total_chunks": len(paper['chunks'])
                 })
-            
-            self.vector_store = FAISS.from_texts(texts=texts, metadatas=metadatas, embedding=self.embeddings)
-            self.vector_store.save_local(self.db_location)
-            
+
+        self._add_texts_batched(texts, metadatas, progress=progress)
+        print(f"Added {len(texts)} chunks from {len(added)} papers to the vector store")
+        return {'added': added, 'skipped': skipped}
+
+    def remove_duplicates(self) -> Dict:
+        """Remove duplicate chunks (same paper hash, chunk position and content) in place"""
+        with self._store_lock.writer:
+            docstore = self.vector_store.docstore._dict
+            seen = set()
+            duplicate_ids = []
+
+            for entry in self.paper_index.values():
+                for doc_id in entry['ids']:
+                    doc = docstore[doc_id]
+                    key = (self._paper_hash_for(doc), doc.metadata.get('chunk_index'), doc.page_content)
+                    if key in seen:
+                        duplicate_ids.append(doc_id)
+                    else:
+                        seen.add(key)
+
+            if duplicate_ids:
+                self._delete_chunks(duplicate_ids)
+                self._mark_dirty(incremental=True)
+
+        if duplicate_ids:
             return {
                 'status': 'success',
-                'message': f'Removed {len(papers) - len(unique_papers)} duplicate papers',
-                'removed_count': len(papers) - len(unique_papers)
+                'message': f'Removed {len(duplicate_ids)} duplicate chunks',
+                'removed_count': len(duplicate_ids)
             }
-        
+
         return {
             'status': 'success',
             'message': 'No duplicates found',
             'removed_count': 0
         }
 
-    def refresh_papers(self) -> Dict:
+    def _paper_from_entry(self, entry: Dict) -> Dict:
+        """Build the stored paper record for an arXiv entry"""
+        content = f"""
+                    Title: {entry['title']}
+                    Authors: {', '.join(entry['authors'])}
+                    Published: {entry['published']}
+                    
+                    Abstract:
+                    {entry['abstract']}
+                    """
+        return {
+            'title': entry['title'],
+            'content': content,
+            'hash': self._generate_paper_hash(entry['title'], content)
+        }
+
+    def download_papers(self, queries: List[str] = None, max_results: int = 10) -> List[Dict]:
+        """Fetch the newest papers for each query concurrently"""
+        pages = self.arxiv.search_many([
+            {"query": query, "max_results": max_results}
+            for query in (queries or self.DEFAULT_ARXIV_QUERIES)
+        ])
+        return [self._paper_from_entry(entry) for page in pages for entry in page]
+
+    def refresh_papers(self, progress: Callable[[Dict], None] = None) -> Dict:
         """Download new papers and add them to the database"""
-        new_papers = self.download_papers()
-        added_count = 0
-        
-        # Get existing paper hashes
-        existing_papers = self.get_all_papers()
-        existing_hashes = {p['hash'] for p in existing_papers}
-        
-        # Filter out papers that already exist
-        new_papers = [p for p in new_papers if p['hash'] not in existing_hashes]
-        
-        if new_papers:
-            self._add_papers_to_store(new_papers)
-            added_count = len(new_papers)
-            
+        added_count = self._add_papers_to_store(self.download_papers(), progress=progress)
+
         return {
             'status': 'success',
             'message': f'Added {added_count} new papers',
             'added_count': added_count
         }
-
-    def _fetch_arxiv_papers(self, query, max_results=5):
-        """Fetch papers from ArXiv API"""
-        base_url = "http://export.arxiv.org/api/query"
-        params = {
-            "search_query": f"all:{query}",
-            "start": 0,
-            "max_results": max_results,
-            "sortBy": "submittedDate",
-            "sortOrder": "descending"
-        }
-        
-        response = requests.get(base_url, params=params)
-        data = xmltodict.parse(response.content)
-        
-        papers = []
-        entries = data['feed'].get('entry', [])
-        if not isinstance(entries, list):
-            entries = [entries]
-        
-        for entry in entries:
-            paper = {
-                'title': entry.get('title', '').replace('\n', ' '),
-                'abstract': entry.get('summary', '').replace('\n', ' '),
-                'authors': entry.get('author', ''),
-                'published': entry.get('published', ''),
-                'link': entry.get('id', '')
-            }
-            papers.append(paper)
-            
-        return papers
     
     def get_relevant_papers_old(self, query, n_results=3):
         """Get papers relevant to the query"""
@@ -607,7 +1292,7 @@ class paperRag:
         
         try:
             # Perform similarity search with improved parameters
-            results = self.vector_store.similarity_search_with_score(
+            results = self._similarity_search_with_score(
                 enhanced_query,
                 k=5  # Get top 5 results initially
             )
@@ -634,10 +1319,7 @@ class paperRag:
         except Exception as e:
             print(f"Error in similarity search: {e}")
             # Fallback to basic search if advanced search fails
-            results = self.vector_store.similarity_search(
-                query,
-                k=3
-            )
+            results = [doc for doc, _ in self._similarity_search_with_score(query, k=3)]
             return [
                 {
                     'title': doc.metadata['title'],
@@ -648,38 +1330,63 @@ class paperRag:
                 for doc in results
             ]
 
-    def search_papers_by_keyword(self, keyword: str, limit: int = 5) -> List[Dict]:
-        """Search papers in the database by keyword with improved relevance"""
+    def _lexical_search(self, query: str, k: int):
+        """BM25 search over chunk text, answered locally without an embedding call; returns (id, document, score)"""
+        with self._store_lock.reader:
+            self._ensure_lexical_index()
+            docstore = self.vector_store.docstore._dict
+            return [(doc_id, docstore[doc_id], score) for doc_id, score in self.lexical_index.search(query, k)]
+
+    def search_papers_by_keyword(self, keyword: str, limit: int = 5, mode: str = SEARCH_MODE) -> List[Dict]:
+        """Search stored chunks by keyword
+
+        mode "keyword" ranks by BM25 alone and never leaves the process; "vector"
+        ranks by embedding similarity; "hybrid" fuses both rankings with reciprocal
+        rank fusion, so exact-term matches and paraphrases both surface.
+        """
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode: {mode} (expected one of {', '.join(SEARCH_MODES)})")
         try:
-            # Enhance the search query
-            enhanced_query = self._preprocess_query(keyword)
-            
-            # Perform similarity search with scores
-            results = self.vector_store.similarity_search_with_score(
-                enhanced_query,
-                k=limit * 2  # Get more results initially for better filtering
-            )
-            
-            # Process and filter results
+            # Get more results initially for better filtering
+            candidates = limit * 2
+            docs = {}
+            lexical_scores = {}
+            similarities = {}
+
+            if mode != "vector":
+                for doc_id, doc, score in self._lexical_search(keyword, candidates):
+                    docs[doc_id] = doc
+                    lexical_scores[doc_id] = score
+
+            if mode != "keyword":
+                vector = self.embeddings.embed_query(keyword)
+                for doc_id, doc, score in self._search_ids_by_vector(vector, candidates):
+                    # Convert score to similarity percentage
+                    similarity = (1 - score) * 100
+                    # Only include results with good similarity
+                    if similarity >= 60:  # 60% similarity threshold
+                        docs[doc_id] = doc
+                        similarities[doc_id] = similarity
+
+            fused = reciprocal_rank_fusion([list(lexical_scores), list(similarities)], k=RRF_K)
+
             processed_results = []
-            for doc, score in results:
-                # Convert score to similarity percentage
-                similarity = ((1 - score) * 100)
-                
-                # Only include results with good similarity
-                if similarity >= 60:  # 60% similarity threshold
-                    processed_results.append({
-                        'title': doc.metadata['title'],
-                        'content': doc.page_content,
-                        'hash': doc.metadata['hash'],
-                        'similarity': round(similarity, 2),  # Round to 2 decimal places
-                        'relevance_factors': self._get_relevance_factors(doc.page_content, keyword)
-                    })
-            
-            # Sort by similarity and return top results
-            processed_results.sort(key=lambda x: x['similarity'], reverse=True)
-            return processed_results[:limit]
-            
+            for doc_id, score in fused[:limit]:
+                doc = docs[doc_id]
+                result = {
+                    'title': doc.metadata['title'],
+                    'content': doc.page_content,
+                    'hash': doc.metadata['hash'],
+                    'score': round(score, 4),
+                    'relevance_factors': self._get_relevance_factors(doc.page_content, keyword)
+                }
+                if doc_id in similarities:
+                    result['similarity'] = round(similarities[doc_id], 2)  # Round to 2 decimal places
+                if doc_id in lexical_scores:
+                    result['bm25'] = round(lexical_scores[doc_id], 3)
+                processed_results.append(result)
+            return processed_results
+
         except Exception as e:
             print(f"Error searching papers: {e}")
             return []
@@ -690,75 +1397,32 @@ class paperRag:
         """Search for papers without adding them to the database"""
         papers = []
         
-        # Format date range for arXiv query
-        date_query = ""
-        if start_date and end_date:
-            date_query = f"+AND+submittedDate:[{start_date}+TO+{end_date}]"
-        
-        # Construct arXiv API query
-        url = (f"http://export.arxiv.org/api/query?"
-               f"search_query=all:{query}{date_query}"
-               f"&start={start_index}"
-               f"&max_results={max_results}"
-               f"&sortBy=submittedDate&sortOrder=descending")
-        
         try:
-            response = requests.get(url)
-            if response.status_code == 200:
-                # Parse the XML response
-                data = xmltodict.parse(response.text)
-                entries = data.get('feed', {}).get('entry', [])
-                
-                if not isinstance(entries, list):
-                    entries = [entries]
-                
-                # Get similarity scores for the papers
-                for entry in entries:
-                    title = entry.get('title', '')
-                    abstract = entry.get('summary', '')
-                    authors = entry.get('author', [])
-                    if isinstance(authors, dict):
-                        authors = [authors]
-                    author_names = [author.get('name', '') for author in authors]
-                    published = entry.get('published', '')
-                    
-                    content = f"""
-                    Title: {title}
-                    Authors: {', '.join(author_names)}
-                    Published: {published}
-                    
-                    Abstract:
-                    {abstract}
-                    """
-                    
-                    paper_hash = self._generate_paper_hash(title, content)
-                    
-                    # Calculate similarity score using the vector store
-                    try:
-                        results = self.vector_store.similarity_search_with_score(
-                            query,
-                            k=1
-                        )
-                        if results:
-                            _, score = results[0]
-                            similarity = round((1 - score) * 100, 2)
-                        else:
-                            similarity = 0.0
-                    except Exception:
-                        similarity = 0.0
-                    
-                    # Check if paper already exists
-                    existing_papers = self.get_all_papers()
-                    exists = any(p['hash'] == paper_hash for p in existing_papers)
-                    
-                    papers.append({
-                        'title': title,
-                        'content': content,
-                        'hash': paper_hash,
-                        'exists_in_db': exists,
-                        'similarity': similarity,
-                        'relevance_factors': self._get_relevance_factors(content, query)
-                    })
+            entries = self.arxiv.search(query, start=start_index, max_results=max_results,
+                                        start_date=start_date, end_date=end_date)
+
+            # The similarity of the query to the stored corpus is the same for every entry; search once
+            try:
+                results = self._similarity_search_with_score(
+                    query,
+                    k=1
+                )
+                if results:
+                    _, score = results[0]
+                    similarity = round((1 - score) * 100, 2)
+                else:
+                    similarity = 0.0
+            except Exception:
+                similarity = 0.0
+
+            for entry in entries:
+                paper = self._paper_from_entry(entry)
+                papers.append({
+                    **paper,
+                    'exists_in_db': self.has_paper(paper['hash']),
+                    'similarity': similarity,
+                    'relevance_factors': self._get_relevance_factors(paper['content'], query)
+                })
             
             # Sort papers by similarity score
             papers.sort(key=lambda x: x['similarity'], reverse=True)
@@ -771,7 +1435,15 @@ class paperRag:
     def add_selected_papers(self, paper_hashes: List[str], papers: List[Dict]) -> Dict:
         """Add selected papers to the database"""
         try:
-            papers_to_add = [p for p in papers if p['hash'] in paper_hashes and not p.get('exists_in_db', False)]
+            # The hash doubles as the chunk id, so skip stored papers and repeats in the batch
+            # rather than trusting the client's exists_in_db flag
+            selected = set(paper_hashes)
+            papers_to_add = []
+            seen = set()
+            for p in papers:
+                if p['hash'] in selected and p['hash'] not in seen and not self.has_paper(p['hash']):
+                    seen.add(p['hash'])
+                    papers_to_add.append(p)
             
             if not papers_to_add:
                 return {
@@ -794,7 +1466,11 @@ class paperRag:
                 documents.append(document)
                 ids.append(paper['hash'])
             
-            self.vector_store.add_documents(documents=documents, ids=ids)
+            self._add_texts_batched(
+                [doc.page_content for doc in documents],
+                [doc.metadata for doc in documents],
+                ids=ids
+            )
             
             return {
                 'status': 'success',
@@ -811,44 +1487,27 @@ class paperRag:
     def remove_paper(self, paper_hash: str) -> Dict:
         """Remove a specific paper from the database"""
         try:
-            # Get all documents from the vector store
-            docs = self.vector_store.docstore._dict.values()
-            print(f"Total documents before removal: {len(docs)}")
-            new_docs = []
-            
-            # Keep all documents except those with matching paper hash
-            for doc in docs:
-                if isinstance(doc, Document):
-                    metadata = doc.metadata
-                    # Skip documents with matching paper hash (including all chunks)
-                    if metadata.get('hash') == paper_hash:
-                        print(f"Skipping document with hash: {metadata.get('hash')}")
-                        continue
-                    new_docs.append(doc)
-            
-            print(f"Documents after filtering: {len(new_docs)}")
-            
-            if len(new_docs) == len(docs):
-                return {
-                    'status': 'error',
-                    'message': 'Paper not found in database'
-                }
-            
-            # If no documents remain, reinitialize an empty vector store
-            if not new_docs:
-                print("No documents remain, reinitializing empty vector store")
-                self.vector_store = FAISS.from_texts([], self.embeddings)
-                self.vector_store.save_local(self.db_location)
+            with self._store_lock.writer:
+                chunk_ids = list(self.paper_index.get(paper_hash, {}).get('ids', []))
+                print(f"Total documents before removal: {len(self.vector_store.docstore._dict)}")
+
+                if not chunk_ids:
+                    return {
+                        'status': 'error',
+                        'message': 'Paper not found in database'
+                    }
+
+                # Drop only this paper's vectors; the rest of the corpus is left untouched
+                self._delete_chunks(chunk_ids)
+                self._mark_dirty(incremental=True)
+            print(f"Documents after removal: {len(self.vector_store.docstore._dict)}")
+
+            if len(self.vector_store.docstore._dict) == 0:
                 return {
                     'status': 'success',
                     'message': 'Paper and all its chunks removed successfully (vector store is now empty)'
                 }
-            
-            # Otherwise, create new vector store with remaining documents
-            print("Creating new vector store with remaining documents")
-            self.vector_store = FAISS.from_documents(new_docs, self.embeddings)
-            self.vector_store.save_local(self.db_location)
-            
+
             return {
                 'status': 'success',
                 'message': 'Paper and all its chunks removed successfully'
@@ -862,67 +1521,19 @@ class paperRag:
 
     def download_papers_with_options(self, query: str, max_results: int = 10, 
                                    start_date: str = None, end_date: str = None,
-                                   start_index: int = 0) -> Dict:
+                                   start_index: int = 0, progress: Callable[[Dict], None] = None) -> Dict:
         """Download papers with advanced options using arXiv API"""
-        papers = []
-        
-        # Format date range for arXiv query
-        date_query = ""
-        if start_date and end_date:
-            date_query = f"+AND+submittedDate:[{start_date}+TO+{end_date}]"
-        
-        # Construct arXiv API query
-        url = (f"http://export.arxiv.org/api/query?"
-               f"search_query=all:{query}{date_query}"
-               f"&start={start_index}"
-               f"&max_results={max_results}"
-               f"&sortBy=submittedDate&sortOrder=descending")
-        
         try:
-            response = requests.get(url)
-            if response.status_code == 200:
-                # Parse the XML response
-                data = xmltodict.parse(response.text)
-                entries = data.get('feed', {}).get('entry', [])
-                
-                if not isinstance(entries, list):
-                    entries = [entries]
-                
-                for entry in entries:
-                    title = entry.get('title', '')
-                    abstract = entry.get('summary', '')
-                    authors = entry.get('author', [])
-                    if isinstance(authors, dict):
-                        authors = [authors]
-                    author_names = [author.get('name', '') for author in authors]
-                    published = entry.get('published', '')
-                    
-                    content = f"""
-                    Title: {title}
-                    Authors: {', '.join(author_names)}
-                    Published: {published}
-                    
-                    Abstract:
-                    {abstract}
-                    """
-                    
-                    paper_hash = self._generate_paper_hash(title, content)
-                    
-                    # Check if paper already exists
-                    existing_papers = self.get_all_papers()
-                    if not any(p['hash'] == paper_hash for p in existing_papers):
-                        papers.append({
-                            'title': title,
-                            'content': content,
-                            'hash': paper_hash
-                        })
-            
-            if papers:
-                self._add_papers_to_store(papers)
+            entries = self.arxiv.search(query, start=start_index, max_results=max_results,
+                                        start_date=start_date, end_date=end_date)
+            added_count = self._add_papers_to_store([self._paper_from_entry(entry) for entry in entries],
+                                                    progress=progress)
+
+            if added_count:
                 return {
                     'status': 'success',
-                    'message': f'Added {len(papers)} new papers',
-                    'added_count': len(papers)
+                    'message': f'Added {added_count} new papers',
+                    'added_count': added_count
                 }
             else:
                 return {
@@ -937,13 +1548,13 @@ class paperRag:
                 'message': f'Error downloading papers: {str(e)}'
             }
 
-    def _construct_feature_query(self) -> str:
+    def _construct_feature_query(self, top_features=None) -> str:
         """Construct a search query from top features"""
-        if not self.top_features:
+        if not top_features:
             return "fetal health cardiotocography"
             
         # Create a query focusing on the top features
-        feature_description = ", ".join(self.top_features[:3])  # Use top 3 features
+        feature_description = ", ".join(top_features[:3])  # Use top 3 features
         query = f"Analysis of fetal health using cardiotocography data focusing on features such as {feature_description}"
         return f"fetal health cardiotocography {query}"
 
@@ -966,11 +1577,114 @@ class paperRag:
 
         return True
 
-    def retrieve_relevant_chunks(self, top_k: int = 10, min_score: float = 0.3) -> List[Document]:  # Lowered threshold to 0.3
+    def _filter_results(self, results, top_k: int, min_score: float) -> List[Document]:
+        """Keep well-structured chunks above the similarity threshold, best first"""
+        filtered_chunks = []
+        for doc, score in results:
+            # Convert FAISS distance score to similarity score (0-1 range)
+            similarity_score = 1 / (1 + score)  # Convert distance to similarity
+            print(f"Document distance: {score}, similarity: {similarity_score}")
+            
+            if similarity_score >= min_score and self.is_structured_text(doc.page_content):
+                filtered_chunks.append((doc, similarity_score))
+                print(f"Added document with similarity {similarity_score}")
+        
+        print(f"Filtered to {len(filtered_chunks)} chunks")
+        
+        # Sort by similarity score and return top k
+        filtered_chunks.sort(key=lambda x: x[1], reverse=True)
+        return [doc for doc, _ in filtered_chunks[:top_k]]
+
+    def _retrieval_key(self, top_features, top_k: int, min_score: float, version: int = None):
+        version = self.index_version if version is None else version
+        return (tuple(top_features[:3]) if top_features else (), top_k, min_score, version)
+
+    def _cached_retrieval(self, key):
+        with self._retrieval_cache_lock:
+            chunks = self._retrieval_cache.get(key)
+            if chunks is None:
+                self.retrieval_misses += 1
+                return None
+            self.retrieval_hits += 1
+            self._retrieval_cache.move_to_end(key)
+            return list(chunks)
+
+    def _cache_retrieval(self, key, chunks: List[Document]):
+        """Cache chunks under a key whose version was read together with the search (_versioned_search)"""
+        with self._retrieval_cache_lock:
+            # Drop results computed against an index version that has since changed
+            if key[-1] != self.index_version:
+                return
+            self._retrieval_cache[key] = list(chunks)
+            self._retrieval_cache.move_to_end(key)
+            while len(self._retrieval_cache) > RETRIEVAL_CACHE_SIZE:
+                self._retrieval_cache.popitem(last=False)
+
+    def _retrieve(self, top_features, top_k: int, min_score: float) -> List[Document]:
+        key = self._retrieval_key(top_features, top_k, min_score)
+        cached = self._cached_retrieval(key)
+        if cached is not None:
+            return cached
+
+        # Construct query from top features
+        query = self._construct_feature_query(top_features)
+        print(f"Searching with query: {query}")
+        
+        # Perform similarity search, keyed by the index version it actually read
+        results, version = self._versioned_search(
+            self.embeddings.embed_query(query),
+            k=top_k * 2  # Get more results initially for filtering
+        )
+        print(f"Found {len(results)} initial results")
+
+        chunks = self._filter_results(results, top_k, min_score)
+        self._cache_retrieval(self._retrieval_key(top_features, top_k, min_score, version), chunks)
+        return chunks
+
+    def prewarm_retrieval_cache(self, feature_names: List[str], top_k: int = 10, min_score: float = 0.3) -> int:
+        """Fill the retrieval cache for every ordered top-3 combination of feature_names"""
+        if not self.vector_store or len(self.vector_store.docstore._dict) == 0:
+            return 0
+
+        with self._retrieval_cache_lock:
+            combinations = [
+                combo for combo in itertools.permutations(feature_names, 3)
+                if self._retrieval_key(combo, top_k, min_score) not in self._retrieval_cache
+            ]
+        if not combinations:
+            return 0
+
+        # Embed every query in one batched call, then search by vector
+        queries = [self._construct_feature_query(list(combo)) for combo in combinations]
+        vectors = self.embeddings.embed_documents(queries)
+        for combo, vector in zip(combinations, vectors):
+            results, version = self._versioned_search(vector, k=top_k * 2)
+            key = self._retrieval_key(combo, top_k, min_score, version)
+            self._cache_retrieval(key, self._filter_results(results, top_k, min_score))
+
+        print(f"Prewarmed retrieval cache with {len(combinations)} feature combinations")
+        return len(combinations)
+
+    def retrieval_cache_stats(self) -> Dict:
+        with self._retrieval_cache_lock:
+            return {
+                'entries': len(self._retrieval_cache),
+                'max_entries': RETRIEVAL_CACHE_SIZE,
+                'hits': self.retrieval_hits,
+                'misses': self.retrieval_misses,
+                'index_version': self.index_version
+            }
+
+    def retrieve_relevant_chunks(self, top_features: List[str] = None, top_k: int = 10,
+                                 min_score: float = 0.3) -> List[Document]:  # Lowered threshold to 0.3
         """
         Retrieve relevant chunks from the vector store based on top features
+
+        Safe to call from many threads at once; nothing on the instance is modified
+        apart from the retrieval cache.
         
         Args:
+            top_features (List[str]): Features to build the query from (defaults to self.top_features)
             top_k (int): Number of chunks to retrieve
             min_score (float): Minimum similarity score threshold
             
@@ -991,33 +1705,9 @@ class paperRag:
                     print("Error: Failed to add initial papers")
                     return []
             
-            # Construct query from top features
-            query = self._construct_feature_query()
-            print(f"Searching with query: {query}")
-            
-            # Perform similarity search
-            results = self.vector_store.similarity_search_with_score(
-                query,
-                k=top_k * 2  # Get more results initially for filtering
-            )
-            print(f"Found {len(results)} initial results")
-            
-            # Filter by relevance score and text quality
-            filtered_chunks = []
-            for doc, score in results:
-                # Convert FAISS distance score to similarity score (0-1 range)
-                similarity_score = 1 / (1 + score)  # Convert distance to similarity
-                print(f"Document distance: {score}, similarity: {similarity_score}")
-                
-                if similarity_score >= min_score and self.is_structured_text(doc.page_content):
-                    filtered_chunks.append((doc, similarity_score))
-                    print(f"Added document with similarity {similarity_score}")
-            
-            print(f"Filtered to {len(filtered_chunks)} chunks")
-            
-            # Sort by similarity score and return top k
-            filtered_chunks.sort(key=lambda x: x[1], reverse=True)
-            return [doc for doc, _ in filtered_chunks[:top_k]]
+            if top_features is None:
+                top_features = self.top_features
+            return self._retrieve(top_features, top_k, min_score)
             
         except Exception as e:
             print(f"Error retrieving relevant chunks: {e}")
@@ -1025,11 +1715,41 @@ class paperRag:
             traceback.print_exc()
             return []
 
-def generate_rag_response(query: str, context: str) -> str:
-    """Generate a response using RAG with the given query and context"""
-    
-    # Create the prompt template
-    template = """
+    async def aretrieve_relevant_chunks(self, top_features: List[str] = None, top_k: int = 10,
+                                        min_score: float = 0.3) -> List[Document]:
+        """Async retrieve_relevant_chunks: the query embedding is awaited and the FAISS search runs in a thread"""
+        try:
+            if not self.vector_store:
+                print("Error: Vector store not initialized")
+                return []
+
+            # Seeding an empty store is a one-off blocking job; leave it to the sync path
+            if len(self.vector_store.docstore._dict) == 0:
+                return await asyncio.to_thread(self.retrieve_relevant_chunks, top_features, top_k, min_score)
+
+            if top_features is None:
+                top_features = self.top_features
+            key = self._retrieval_key(top_features, top_k, min_score)
+            cached = self._cached_retrieval(key)
+            if cached is not None:
+                return cached
+
+            query = self._construct_feature_query(top_features)
+            vector = await self.embeddings.aembed_query(query)
+            results, version = await asyncio.to_thread(self._versioned_search, vector, top_k * 2)
+
+            chunks = self._filter_results(results, top_k, min_score)
+            self._cache_retrieval(self._retrieval_key(top_features, top_k, min_score, version), chunks)
+            return chunks
+
+        except Exception as e:
+            print(f"Error retrieving relevant chunks: {e}")
+            import traceback
+            traceback.print_exc()
+            return []
+
+# Prompt template for generate_rag_response
+RAG_PROMPT = PromptTemplate.from_template("""
     You are a medical AI assistant specializing in fetal health and CTG analysis.
     Use the following context to answer the question. If you cannot answer the question 
     based on the context, say so. Do not make up information.
@@ -1040,26 +1760,12 @@ def generate_rag_response(query: str, context: str) -> str:
     Question: {query}
 
     Answer:
-    """
-    
-    # Create prompt template
-    prompt = PromptTemplate.from_template(template)
-    
-    # Initialize OpenAI model
-    llm = ChatOpenAI(
-        model="gpt-4-turbo-preview",
-        temperature=0.5,
-        max_tokens=1000,
-        api_key=OPENAI_API_KEY
-    )
-    
-    # Create and run the chain
-    chain: Runnable = prompt | llm
-    
-    # Generate response
-    response = chain.invoke({"query": query, "context": context})
-    
-    return response.content
+    """)
+
+def generate_rag_response(query: str, context: str) -> str:
+    """Generate a response using RAG with the given query and context"""
+    # The shared client reuses its HTTP connection pool across calls
+    return get_llm_client().invoke(RAG_PROMPT.invoke({"query": query, "context": context}))
 
 if __name__ == "__main__":
     rag = paperRag()
\ No newline at end of file
@@ -0,0 +1,28 @@
+import argparse
+import json
+from paper_rag import paperRag
+from faiss_index import INDEX_TYPES
+
+# Rebuilds the paper store's FAISS index from its stored vectors, e.g. to migrate
+# a flat store to HNSW or IVF-PQ once the library has grown:
+#
+#   python rebuild_index.py --type ivfpq
+#
+# Run it while the server is stopped, or use POST /papers/index/rebuild instead.
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild the paper store's FAISS index without re-embedding")
+    parser.add_argument("--type", choices=INDEX_TYPES, help="Index type (defaults to FAISS_INDEX_TYPE)")
+    parser.add_argument("--nlist", type=int, help="Inverted lists for ivf/ivfpq (defaults to IVF_NLIST or ~4*sqrt(n))")
+    args = parser.parse_args()
+
+    rag = paperRag()
+    try:
+        print(json.dumps(rag.index_stats(), indent=2))
+        result = rag.rebuild_index(args.type, nlist=args.nlist)
+        print(json.dumps(result, indent=2))
+    finally:
+        rag.close()
+
+if __name__ == "__main__":
+    main()
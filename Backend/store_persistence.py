@@ -0,0 +1,401 @@
+import os
+import json
+import time
+import uuid
+import shutil
+import threading
+import numpy as np
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Union
+
+from jobs import process_token
+
+try:
+    import fcntl
+except ImportError:  # No flock on Windows; there only one process may use a store directory
+    fcntl = None
+
+CURRENT_FILE = "CURRENT"
+LOCK_FILE = "LOCK"
+SNAPSHOT_PREFIX = "snapshot-"
+SEGMENT_PREFIX = "segment-"
+READERS_DIR = "readers"
+
+# A segment holds the chunks one flush added and the ids it removed:
+#
+#   segment.json   {'count', 'dimension', 'removed': [ids], 'papers': {hash: paper index entry or null}}
+#   vectors.f32    row-major float32 matrix of the added chunks
+#   chunks.jsonl   one [id, text, metadata] line per added chunk, in row order
+SEGMENT_HEADER = "segment.json"
+SEGMENT_VECTORS = "vectors.f32"
+SEGMENT_CHUNKS = "chunks.jsonl"
+
+# A serialized file is its bytes, or a writer that creates it at the given path
+FileData = Union[bytes, Callable[[str], None]]
+
+def _fsync_dir(path: str):
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+def _write_files(directory: str, files: Dict[str, FileData]):
+    os.makedirs(directory)
+    for filename, data in files.items():
+        path = os.path.join(directory, filename)
+        if callable(data):
+            data(path)
+            with open(path, 'rb') as f:
+                os.fsync(f.fileno())
+            continue
+        with open(path, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+    _fsync_dir(directory)
+
+def resolve_store_dir(db_location: str) -> str:
+    """Return the directory holding the current snapshot, or db_location for the legacy flat layout"""
+    try:
+        with open(os.path.join(db_location, CURRENT_FILE), 'r') as f:
+            name = f.read().strip()
+    except FileNotFoundError:
+        return db_location
+    snapshot_dir = os.path.join(db_location, name)
+    return snapshot_dir if name and os.path.isdir(snapshot_dir) else db_location
+
+def list_segments(snapshot_dir: str) -> List[str]:
+    """Names of the segments appended to a snapshot, oldest first"""
+    try:
+        names = os.listdir(snapshot_dir)
+    except FileNotFoundError:
+        return []
+    return sorted(name for name in names if name.startswith(SEGMENT_PREFIX) and not name.endswith(".tmp"))
+
+def encode_segment(dimension: int, ids: List[str], vectors: np.ndarray, texts: List[str], metadatas: List[Dict],
+                   removed: Iterable[str], papers: Dict[str, Optional[Dict]]) -> Dict[str, bytes]:
+    """Files of a segment adding the given chunks and removing `removed`"""
+    chunks = "".join(
+        json.dumps([doc_id, text, metadata]) + "\n" for doc_id, text, metadata in zip(ids, texts, metadatas)
+    )
+    header = {'count': len(ids), 'dimension': dimension, 'removed': list(removed), 'papers': papers}
+    return {
+        SEGMENT_HEADER: json.dumps(header).encode('utf-8'),
+        SEGMENT_VECTORS: np.ascontiguousarray(vectors, dtype=np.float32).reshape(-1, dimension).tobytes(),
+        SEGMENT_CHUNKS: chunks.encode('utf-8')
+    }
+
+def read_segments(snapshot_dir: str, names: List[str]) -> Iterator[Dict]:
+    """Decode segments one at a time, as {'ids', 'texts', 'metadatas', 'vectors', 'removed', 'papers'}"""
+    for name in names:
+        path = os.path.join(snapshot_dir, name)
+        with open(os.path.join(path, SEGMENT_HEADER), 'r') as f:
+            header = json.load(f)
+        vectors = np.fromfile(os.path.join(path, SEGMENT_VECTORS), dtype=np.float32)
+        ids, texts, metadatas = [], [], []
+        with open(os.path.join(path, SEGMENT_CHUNKS), 'r', encoding='utf-8') as f:
+            for line in f:
+                doc_id, text, metadata = json.loads(line)
+                ids.append(doc_id)
+                texts.append(text)
+                metadatas.append(metadata)
+        yield {
+            'ids': ids,
+            'texts': texts,
+            'metadatas': metadatas,
+            'vectors': vectors.reshape(header['count'], header['dimension']),
+            'removed': header['removed'],
+            'papers': header['papers']
+        }
+
+class StoreChanges:
+    """Chunks added and removed since the store was last flushed, for the next segment
+
+    `compact` is set by changes a segment cannot describe (a rebuilt index, a
+    converted store), so the next flush rewrites the snapshot instead.
+    """
+
+    def __init__(self):
+        self.added = {}
+        self.removed = set()
+        self.papers = set()
+        self.compact = True
+        # Chunks in the snapshot, and chunks added or removed by the segments on top of it
+        self.snapshot_rows = 0
+        self.segment_rows = 0
+        self.segment_count = 0
+
+    def add(self, ids: List[str], vectors: np.ndarray):
+        self.added.update(zip(ids, vectors))
+
+    def remove(self, ids: Iterable[str]):
+        for doc_id in ids:
+            if doc_id in self.added:
+                # Never flushed, so no segment needs to mention it
+                del self.added[doc_id]
+            else:
+                self.removed.add(doc_id)
+
+    def touch(self, paper_hash: str):
+        self.papers.add(paper_hash)
+
+    def segment_due(self, ratio: float, max_segments: int) -> bool:
+        """Whether the pending changes go in a segment rather than a rewritten snapshot"""
+        rows = self.segment_rows + len(self.added) + len(self.removed)
+        return not self.compact and self.segment_count < max_segments and rows <= ratio * self.snapshot_rows
+
+    def take(self):
+        """(added id -> vector, removed ids, touched paper hashes) for a segment, counted against the snapshot"""
+        taken = (self.added, self.removed, self.papers)
+        self.segment_rows += len(self.added) + len(self.removed)
+        self.segment_count += 1
+        self.added, self.removed, self.papers = {}, set(), set()
+        return taken
+
+    def reset(self, snapshot_rows: int, segment_rows: int = 0, segment_count: int = 0, compact: bool = False):
+        """Start over from a snapshot of `snapshot_rows` chunks with the given segments on it"""
+        self.added, self.removed, self.papers = {}, set(), set()
+        self.compact = compact
+        self.snapshot_rows = snapshot_rows
+        self.segment_rows = segment_rows
+        self.segment_count = segment_count
+
+class StorePersister:
+    """Coalesces vector store writes and flushes them in the background
+
+    Mutations only mark the store dirty. A background thread flushes at most once
+    per `interval` seconds. When `serialize_segment` returns files, they are
+    appended to the current snapshot as a segment, so a flush costs what changed
+    since the last one; when it returns None (the store decides when segments have
+    grown enough to compact), `serialize` writes the whole store to a fresh
+    snapshot directory, published by atomically replacing the CURRENT pointer
+    file. Both serialize under `lock` and are written outside it; a large file
+    can be returned as a writer instead of bytes, which must then only read
+    state it copied under the lock. A crash mid-write leaves the previous
+    snapshot and its segments in place.
+
+    Several processes may share db_location. Each registers as a reader of the
+    snapshot it loaded (`open_snapshot`), and a superseded snapshot is only
+    removed once no live process reads it. Flushes take an exclusive lock on
+    db_location/LOCK; a process only appends a segment to the snapshot it has
+    loaded with every segment on it, and otherwise writes a full snapshot of its
+    own view, so the last process to flush wins as before.
+
+    Storage that keeps reading files from its snapshot (mmap storage) must move
+    to a new snapshot in `on_publish(snapshot_dir)`. If that raises, the process
+    stays registered on the previous snapshot and its next flush is a full one.
+    """
+
+    def __init__(self, db_location: str, serialize: Callable[[], Dict[str, FileData]],
+                 lock, interval: float = 5.0, on_publish: Callable[[str], None] = None,
+                 serialize_segment: Callable[[], Optional[Dict[str, FileData]]] = None):
+        self.db_location = db_location
+        self.serialize = serialize
+        self.serialize_segment = serialize_segment
+        self.lock = lock
+        self.interval = interval
+        self.on_publish = on_publish
+
+        # The snapshot this process reads and the segments of it that its store holds
+        self.snapshot_dir = None
+        self.segments = []
+        self._reader_name = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+        self._dirty = False
+        # Set when the next flush must write a full snapshot, e.g. after a failed write
+        self._compact = False
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="store-persister", daemon=True)
+        self._thread.start()
+
+    @contextmanager
+    def _file_lock(self, exclusive: bool):
+        os.makedirs(self.db_location, exist_ok=True)
+        with open(os.path.join(self.db_location, LOCK_FILE), 'a') as f:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            yield
+
+    @property
+    def store_dir(self) -> str:
+        """Directory the store was loaded from: its snapshot, or db_location for the legacy flat layout"""
+        return self.snapshot_dir or self.db_location
+
+    def open_snapshot(self) -> str:
+        """Register as a reader of the current snapshot and return its directory
+
+        `segments` then lists the segments to apply on top of it, in order.
+        """
+        with self._file_lock(exclusive=False):
+            snapshot_dir = resolve_store_dir(self.db_location)
+            self._attach(snapshot_dir)
+            self.segments = list_segments(snapshot_dir) if self.snapshot_dir else []
+        return snapshot_dir
+
+    def _attach(self, snapshot_dir: str):
+        previous = self.snapshot_dir
+        if snapshot_dir == self.db_location:
+            self.snapshot_dir = None
+        else:
+            readers = os.path.join(snapshot_dir, READERS_DIR)
+            os.makedirs(readers, exist_ok=True)
+            with open(os.path.join(readers, self._reader_name), 'w') as f:
+                f.write(process_token(os.getpid()))
+            self.snapshot_dir = snapshot_dir
+        if previous and previous != self.snapshot_dir:
+            self._detach(previous)
+
+    def _detach(self, snapshot_dir: str):
+        try:
+            os.remove(os.path.join(snapshot_dir, READERS_DIR, self._reader_name))
+        except FileNotFoundError:
+            pass
+
+    def mark_dirty(self):
+        self._dirty = True
+
+    @property
+    def dirty(self) -> bool:
+        return self._dirty
+
+    def flush(self) -> bool:
+        """Write a segment or snapshot now if there are unsaved changes"""
+        with self._flush_lock, self._file_lock(exclusive=True):
+            with self.lock:
+                if not self._dirty:
+                    return False
+                current = resolve_store_dir(self.db_location)
+                segment = None
+                if (self.serialize_segment and not self._compact and self.snapshot_dir == current
+                        and list_segments(current) == self.segments):
+                    segment = self.serialize_segment()
+                files = segment if segment is not None else self.serialize()
+                self._dirty = False
+
+            try:
+                if segment is not None:
+                    self._write_segment(current, segment)
+                else:
+                    self._write_snapshot(files)
+                    self._compact = False
+            except Exception:
+                # The changes taken by the serializer are only on disk once a full snapshot holds them
+                self._dirty = True
+                self._compact = True
+                raise
+            return True
+
+    def _write_segment(self, snapshot_dir: str, files: Dict[str, FileData]):
+        name = f"{SEGMENT_PREFIX}{time.time_ns():020d}-{os.getpid()}"
+        tmp_dir = os.path.join(snapshot_dir, f"{name}.tmp")
+        _write_files(tmp_dir, files)
+        os.rename(tmp_dir, os.path.join(snapshot_dir, name))
+        _fsync_dir(snapshot_dir)
+        self.segments.append(name)
+        self._collect()
+
+    def _write_snapshot(self, files: Dict[str, FileData]):
+        os.makedirs(self.db_location, exist_ok=True)
+        name = f"{SNAPSHOT_PREFIX}{time.time_ns()}-{os.getpid()}"
+        tmp_dir = os.path.join(self.db_location, f"{name}.tmp")
+        _write_files(tmp_dir, files)
+
+        snapshot_dir = os.path.join(self.db_location, name)
+        os.rename(tmp_dir, snapshot_dir)
+
+        previous_dir = resolve_store_dir(self.db_location)
+
+        # Publish the snapshot by swapping the pointer file
+        pointer_tmp = os.path.join(self.db_location, f"{CURRENT_FILE}.tmp")
+        with open(pointer_tmp, 'w') as f:
+            f.write(name)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(pointer_tmp, os.path.join(self.db_location, CURRENT_FILE))
+        _fsync_dir(self.db_location)
+
+        if self.on_publish:
+            try:
+                self.on_publish(snapshot_dir)
+            except Exception as e:
+                # The store may still be reading the snapshot it is registered on, which keeps it on disk
+                print(f"Error switching to snapshot {name}: {e}")
+                self._compact = True
+                return
+        self._attach(snapshot_dir)
+        self.segments = []
+        if previous_dir == self.db_location:
+            # First snapshot after the legacy flat layout; the root files are now superseded
+            for filename in files:
+                path = os.path.join(self.db_location, filename)
+                if os.path.isfile(path):
+                    os.remove(path)
+        self._collect()
+
+    def _collect(self):
+        """Remove superseded snapshots no live process reads; the caller holds the exclusive lock"""
+        current = resolve_store_dir(self.db_location)
+        # Half-written segments are left behind by a crash, since appends hold the lock
+        for entry in os.listdir(current):
+            if entry.startswith(SEGMENT_PREFIX) and entry.endswith(".tmp"):
+                shutil.rmtree(os.path.join(current, entry), ignore_errors=True)
+
+        cutoff = time.time() - 3600
+        for entry in os.listdir(self.db_location):
+            path = os.path.join(self.db_location, entry)
+            if not entry.startswith(SNAPSHOT_PREFIX) or path == current:
+                continue
+            if entry.endswith(".tmp"):
+                # Drop half-written snapshots left behind by a crash
+                if os.path.getmtime(path) < cutoff:
+                    shutil.rmtree(path, ignore_errors=True)
+            elif not self._in_use(path):
+                shutil.rmtree(path, ignore_errors=True)
+
+    @staticmethod
+    def _in_use(snapshot_dir: str) -> bool:
+        """Whether a live process reads the snapshot; registrations of exited processes are dropped"""
+        readers = os.path.join(snapshot_dir, READERS_DIR)
+        try:
+            names = os.listdir(readers)
+        except FileNotFoundError:
+            return False
+        in_use = False
+        for name in names:
+            path = os.path.join(readers, name)
+            try:
+                with open(path, 'r') as f:
+                    token = f.read()
+                alive = process_token(int(name.split('-', 1)[0])) == token
+            except (OSError, ValueError):
+                continue
+            if alive:
+                in_use = True
+            else:
+                os.remove(path)
+        return in_use
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            if not self._dirty:
+                continue
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Error flushing vector store: {e}")
+
+    def close(self):
+        """Stop the background thread, flush anything still pending and stop reading the snapshot"""
+        self._stop.set()
+        try:
+            self.flush()
+        finally:
+            if self.snapshot_dir:
+                self._detach(self.snapshot_dir)
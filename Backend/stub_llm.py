@@ -0,0 +1,57 @@
+import re
+import time
+import asyncio
+from typing import Any, AsyncIterator, Iterator, List, Optional
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+# Canned response, streamed back word by word
+STUB_EXPLANATION = (
+    "<p>This is a placeholder <strong>clinical explanation</strong>. "
+    "It was produced by the local stub chat model and does not "
+    "reflect any clinical literature.</p>"
+)
+
+class StubChatModel(BaseChatModel):
+    """Local stand-in for ChatOpenAI that returns a canned response after a fixed delay
+
+    The sync paths block with time.sleep and the async paths with asyncio.sleep,
+    so the stub reproduces how a remote model ties up threads versus the event loop.
+    """
+
+    response: str = STUB_EXPLANATION
+    latency: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "stub"
+
+    def _result(self) -> ChatResult:
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self.response))])
+
+    def _tokens(self) -> List[str]:
+        return [token for token in re.split(r"(\s+)", self.response) if token]
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager=None, **kwargs: Any) -> ChatResult:
+        time.sleep(self.latency)
+        return self._result()
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager=None, **kwargs: Any) -> ChatResult:
+        await asyncio.sleep(self.latency)
+        return self._result()
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager=None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        # The latency is time to first token
+        time.sleep(self.latency)
+        for token in self._tokens():
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager=None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        await asyncio.sleep(self.latency)
+        for token in self._tokens():
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
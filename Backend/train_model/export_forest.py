@@ -0,0 +1,75 @@
+import pickle
+import numpy as np
+from pathlib import Path
+
+FORMAT_VERSION = 1
+
+def export_forest(model, export_path):
+    """Flatten a fitted RandomForestClassifier into contiguous node arrays saved as .npz"""
+    n_classes = len(model.classes_)
+    trees = [estimator.tree_ for estimator in model.estimators_]
+
+    # sklearn < 1.4 stores raw class counts in tree_.value and normalizes them in
+    # predict_proba; newer versions store fractions. Bake in whichever it does.
+    normalize = not all(
+        np.allclose(tree.value[:, 0, :n_classes].sum(axis=1), 1.0) for tree in trees
+    )
+
+    features, thresholds, lefts, rights, missing_left, values, roots = [], [], [], [], [], [], []
+    offset = 0
+    max_depth = 0
+    for tree in trees:
+        n_nodes = tree.node_count
+        is_leaf = tree.children_left == -1
+        node_ids = np.arange(offset, offset + n_nodes, dtype=np.int64)
+
+        # Leaves point back at themselves so every row can take the same number of steps
+        left = np.where(is_leaf, node_ids, tree.children_left + offset)
+        right = np.where(is_leaf, node_ids, tree.children_right + offset)
+        feature = np.where(is_leaf, 0, tree.feature)
+        threshold = np.where(is_leaf, np.inf, tree.threshold)
+
+        if hasattr(tree, "missing_go_to_left"):
+            go_left = np.asarray(tree.missing_go_to_left, dtype=bool)
+        else:
+            go_left = np.zeros(n_nodes, dtype=bool)
+
+        value = np.array(tree.value[:, 0, :n_classes], dtype=np.float64)
+        if normalize:
+            normalizer = value.sum(axis=1)[:, np.newaxis]
+            normalizer[normalizer == 0.0] = 1.0
+            value /= normalizer
+
+        features.append(feature)
+        thresholds.append(threshold)
+        lefts.append(left)
+        rights.append(right)
+        missing_left.append(go_left)
+        values.append(value)
+        roots.append(offset)
+        offset += n_nodes
+        max_depth = max(max_depth, tree.max_depth)
+
+    feature_names = getattr(model, "feature_names_in_", None)
+    np.savez(
+        export_path,
+        format_version=np.int64(FORMAT_VERSION),
+        feature=np.concatenate(features).astype(np.int64),
+        threshold=np.concatenate(thresholds).astype(np.float64),
+        left=np.concatenate(lefts).astype(np.int64),
+        right=np.concatenate(rights).astype(np.int64),
+        missing_left=np.concatenate(missing_left),
+        value=np.concatenate(values),
+        roots=np.array(roots, dtype=np.int64),
+        classes=np.asarray(model.classes_),
+        max_depth=np.int64(max_depth),
+        n_features=np.int64(model.n_features_in_),
+        feature_names=np.array([] if feature_names is None else list(feature_names), dtype=str)
+    )
+    print(f"✅ Exported {len(trees)} trees ({offset} nodes) to: {export_path}")
+
+if __name__ == "__main__":
+    artifacts_path = Path(__file__).resolve().parent
+    with open(artifacts_path / "best_random_forest.pkl", "rb") as f:
+        forest = pickle.load(f)
+    export_forest(forest, artifacts_path / "best_random_forest.npz")
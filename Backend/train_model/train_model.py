@@ -6,6 +6,7 @@ from pathlib import Path
 import optuna
 import mlflow
 from model import FoetalHealthModel
+from export_forest import export_forest
 from sklearn.metrics import roc_auc_score, accuracy_score
 
 def objective(trial, df):
@@ -91,5 +92,8 @@ def train_and_save_model():
 
     print(f"✅ Model saved to: {model_save_path}")
 
+    # === Export Flat Node Arrays for the Compiled Inference Engine ===
+    export_forest(final_model_wrapper.model, artifacts_path / "best_random_forest.npz")
+
 if __name__ == "__main__":
     train_and_save_model()
@@ -50,6 +50,84 @@ export const predictFetalHealth = async (formData) => {
   }
 };
 
+// Parses a text/event-stream response body, calling onEvent(event, payload) for each event
+const readServerSentEvents = async (response, onEvent) => {
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  for (;;) {
+    const { value, done } = await reader.read();
+    if (done) {
+      break;
+    }
+    buffer += decoder.decode(value, { stream: true });
+
+    // Events are separated by a blank line
+    let boundary;
+    while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+      const rawEvent = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+      let event = 'message';
+      let data = '';
+      rawEvent.split('\n').forEach(line => {
+        if (line.startsWith('event: ')) {
+          event = line.slice(7);
+        } else if (line.startsWith('data: ')) {
+          data += line.slice(6);
+        }
+      });
+      onEvent(event, data ? JSON.parse(data) : {});
+    }
+  }
+};
+
+// Streams /predict/stream; onEvent receives ('prediction' | 'token' | 'done' | 'error', payload)
+export const streamFetalHealthPrediction = async (formData, onEvent) => {
+  const headers = { 'Content-Type': 'application/json' };
+  const token = localStorage.getItem('jwt');
+  if (token) {
+    headers.Authorization = `Bearer ${token}`;
+  }
+
+  const response = await fetch(`${API_BASE_URL}/predict/stream`, {
+    method: 'POST',
+    credentials: 'include',
+    headers,
+    body: JSON.stringify(formData),
+  });
+  if (!response.ok) {
+    const data = await response.json().catch(() => ({}));
+    throw new Error(data.message || data.error || 'Prediction request failed');
+  }
+
+  await readServerSentEvents(response, onEvent);
+};
+
+export const predictFetalHealthAsync = async (formData) => {
+  try {
+    const response = await api.post('/predict/async', formData);
+    return response.data;
+  } catch (error) {
+    if (error.response && error.response.data && error.response.data.message) {
+      throw new Error(error.response.data.message);
+    }
+    console.error('Prediction request failed:', error);
+    throw error;
+  }
+};
+
+export const getPredictionExplanation = async (jobId, wait = 25) => {
+  try {
+    const response = await api.get(`/predict/${jobId}/explanation`, {
+      params: { wait }
+    });
+    return response.data;
+  } catch (error) {
+    console.error('Failed to get explanation:', error);
+    throw error;
+  }
+};
+
 export const getAllPapers = async () => {
   try {
     const response = await api.get('/papers');
@@ -60,6 +138,30 @@ export const getAllPapers = async () => {
   }
 };
 
+export const getPaperCatalog = async (cursor = null, limit = 50) => {
+  try {
+    const params = { limit };
+    if (cursor) {
+      params.cursor = cursor;
+    }
+    const response = await api.get('/papers/catalog', { params });
+    return response.data;
+  } catch (error) {
+    console.error('Failed to get paper catalog:', error);
+    throw error;
+  }
+};
+
+export const getPaper = async (paperHash) => {
+  try {
+    const response = await api.get(`/papers/${paperHash}`);
+    return response.data;
+  } catch (error) {
+    console.error('Failed to get paper:', error);
+    throw error;
+  }
+};
+
 export const uploadPaper = async (file, title) => {
   const formData = new FormData();
   formData.append('file', file);
@@ -97,6 +199,58 @@ export const uploadPaper = async (file, title) => {
   }
 };
 
+export const uploadPapersBulk = async (files) => {
+  const formData = new FormData();
+  for (const file of files) {
+    formData.append('files', file);
+  }
+
+  try {
+    const response = await api.post('/papers/upload/bulk', formData, {
+      headers: {
+        'Content-Type': 'multipart/form-data',
+      }
+    });
+    return response.data;
+  } catch (error) {
+    if (error.response && error.response.data && error.response.data.message) {
+      throw new Error(error.response.data.message);
+    }
+    console.error('Failed to upload papers:', error);
+    throw error;
+  }
+};
+
+export const getJob = async (jobId) => {
+  try {
+    const response = await api.get(`/jobs/${jobId}`);
+    return response.data;
+  } catch (error) {
+    console.error('Failed to get job:', error);
+    throw error;
+  }
+};
+
+// Follows /jobs/<id>/events; onEvent receives ('progress' | 'done' | 'failed' | 'interrupted', job)
+export const watchJob = async (jobId, onEvent) => {
+  const headers = {};
+  const token = localStorage.getItem('jwt');
+  if (token) {
+    headers.Authorization = `Bearer ${token}`;
+  }
+
+  const response = await fetch(`${API_BASE_URL}/jobs/${jobId}/events`, {
+    credentials: 'include',
+    headers,
+  });
+  if (!response.ok) {
+    const data = await response.json().catch(() => ({}));
+    throw new Error(data.message || 'Failed to follow job');
+  }
+
+  await readServerSentEvents(response, onEvent);
+};
+
 export const addCustomPaper = async (paperData) => {
   try {
     const response = await api.post('/papers/add', paperData);